@@ -0,0 +1,100 @@
+# benchmarks/import_time.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+# === 2. IMPORT-TIME GUARD ===
+
+# module -> {"budget_ms": cumulative import time allowed, "forbidden": heavy modules it must not pull in}
+BUDGET_PATH = Path(__file__).parent / "import_budget.json"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# "import time:   self [us] | cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)\s*$")
+
+def measure_import(module: str, repeat: int = 3) -> Tuple[float, List[str]]:
+    """
+    Measures the cumulative import time of a module in a fresh interpreter with `python -X importtime`.
+    Args:
+        module (str): Dotted module name (e.g. "src.fetch_insideairbnb").
+        repeat (int): Fresh interpreters to start (the fastest is kept, the first one warms the bytecode cache).
+    Returns:
+        Tuple[float, List[str]]: Best cumulative import time in ms, and every top-level package imported along the way.
+    """
+    best_ms = float("inf")
+    packages: List[str] = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, cwd=REPO_ROOT
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"!! Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+        cumulative_us = None
+        packages = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            if not match:
+                continue
+            packages.append(match.group(4).split(".")[0])
+            if match.group(4) == module:
+                cumulative_us = int(match.group(2))
+        if cumulative_us is None:
+            raise RuntimeError(f"!! No importtime line for {module} (already imported by the interpreter?).")
+        best_ms = min(best_ms, cumulative_us / 1000)
+
+    return best_ms, sorted(set(packages))
+
+def check_imports(budgets: Dict[str, Dict[str, Any]], repeat: int = 3) -> List[str]:
+    """
+    Checks every module against its import-time budget and its list of forbidden heavy dependencies.
+    Args:
+        budgets (Dict[str, Dict[str, Any]]): Budgets per module (see import_budget.json).
+        repeat (int): Fresh interpreters per module.
+    Returns:
+        List[str]: Violations (empty if every module is within budget).
+    """
+    violations = []
+    print(f"{'module':<28} {'import_ms':>10} {'budget_ms':>10}  heavy imports")
+    for module, budget in budgets.items():
+        elapsed_ms, packages = measure_import(module, repeat)
+        heavy = [pkg for pkg in budget.get('forbidden', []) if pkg in packages]
+        over = elapsed_ms > budget['budget_ms']
+        flag = " !! OVER BUDGET" if over else ""
+        print(f"{module:<28} {elapsed_ms:>10.1f} {budget['budget_ms']:>10}  {heavy or '-'}{flag}")
+
+        if over:
+            violations.append(f"{module} imports in {elapsed_ms:.0f} ms (budget {budget['budget_ms']} ms)")
+        if heavy:
+            violations.append(f"{module} imports heavy dependencies at import time: {heavy}")
+
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time budget for the pipeline entry points (python -X importtime).")
+    parser.add_argument("modules", nargs="*", help="Modules to check. Defaults to every module in import_budget.json.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module (fastest is kept).")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, "r") as f:
+        budgets = json.load(f)
+    if args.modules:
+        budgets = {module: budgets.get(module, {'budget_ms': float("inf")}) for module in args.modules}
+
+    violations = check_imports(budgets, args.repeat)
+    for violation in violations:
+        print(f"!! {violation}")
+    if violations:
+        raise SystemExit(1)
+    print("-> All imports within budget.")
@@ -0,0 +1,167 @@
+# benchmarks/overpass_stub.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+import json
+import random
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# third party
+import numpy as np
+import shapely
+
+
+# === 2. STUB OVERPASS SERVER ===
+
+# the subset of Overpass QL written by src/overpass.py: nwr["key"], nwr["key"="value"], nwr["key"~"^(a|b)$"],
+# optionally (newer:"timestamp"), with (poly:"lat lon ..."), then "out center tags" or "out ids"
+STATEMENT = re.compile(r'nwr\["([^"]+)"(?:(=|~)"([^"]*)")?\](?:\(newer:"([^"]+)"\))?\(poly:"([^"]+)"\);')
+START_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+def _iso(t: datetime) -> str:
+    return t.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _matches(tags: Dict[str, str], key: str, op: Optional[str], value: Optional[str]) -> bool:
+    if key not in tags:
+        return False
+    if op == "=":
+        return tags[key] == value
+    if op == "~":
+        return re.fullmatch(value, tags[key]) is not None
+    return True
+
+class StubOverpass:
+    """
+    In-memory Overpass stand-in: answers tile queries from a list of elements, optionally failing with 429s.
+    Elements can be added, edited and deleted (edit/delete), each change advancing the database timestamp by one second,
+    so incremental refreshes (newer: filters, ids-only queries) can be tested.
+    """
+
+    def __init__(self, elements: List[Dict[str, Any]], fail_rate: float = 0.0, seed: int = 0):
+        self.clock = START_TIME
+        self.elements = {(e["type"], e["id"]): {"timestamp": _iso(self.clock), **e} for e in elements}
+        self._index()
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def _index(self) -> None:
+        self.element_list = list(self.elements.values())
+        self.coords = np.array(
+            [[e["lon"], e["lat"]] if "lat" in e else [e["center"]["lon"], e["center"]["lat"]] for e in self.element_list]
+        ).reshape(-1, 2)
+
+    @property
+    def timestamp(self) -> str:
+        return _iso(self.clock)
+
+    def edit(self, element: Dict[str, Any]) -> None:
+        """
+        Creates or replaces an element (matched by type and id), stamped with a new database timestamp.
+        """
+        with self.lock:
+            self.clock += timedelta(seconds=1)
+            self.elements[(element["type"], element["id"])] = {**element, "timestamp": _iso(self.clock)}
+            self._index()
+
+    def delete(self, element_type: str, element_id: int) -> None:
+        with self.lock:
+            self.clock += timedelta(seconds=1)
+            self.elements.pop((element_type, element_id), None)
+            self._index()
+
+    def answer(self, query: str) -> Tuple[int, Dict[str, Any]]:
+        with self.lock:
+            self.requests += 1
+            if self.rng.random() < self.fail_rate:
+                self.failures += 1
+                return 429, {"remark": "rate limited"}
+            elements, coords, timestamp = self.element_list, self.coords, self.timestamp
+
+        selected = {}
+        for key, op, value, newer, poly in STATEMENT.findall(query):
+            latlon = np.array(poly.split(), dtype=float).reshape(-1, 2)
+            inside = shapely.contains_xy(shapely.Polygon(latlon[:, ::-1]), coords[:, 0], coords[:, 1]) if len(coords) else []
+            for i in np.flatnonzero(inside):
+                if newer and elements[i]["timestamp"] <= newer:
+                    continue
+                if _matches(elements[i].get("tags", {}), key, op or None, value or None):
+                    selected[i] = elements[i]
+
+        result = list(selected.values())
+        if "out ids;" in query:
+            result = [{"type": e["type"], "id": e["id"]} for e in result]
+        return 200, {"version": 0.6, "generator": "stub", "osm3s": {"timestamp_osm_base": timestamp}, "elements": result}
+
+def make_handler(stub: StubOverpass):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+            status, payload = stub.answer(parse_qs(body).get("data", [""])[0])
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def serve(stub: StubOverpass, port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Starts the stub in a background thread.
+    Args:
+        stub (StubOverpass): The stub to serve.
+        port (int): Port (0 = any free port).
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server (call shutdown() when done) and its endpoint URL.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stub))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/api/interpreter"
+
+def synthetic_elements(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Overpass elements built from the synthetic Milan POIs (nodes, plus every 10th point as a way with a center).
+    """
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+
+    points = generate_points(n, load_boundary_fixture(), seed=seed).reset_index(drop=True)
+    elements = []
+    for i, (name, sub_category, geom) in enumerate(zip(points['name'], points['sub_category'], points.geometry)):
+        tags = {"name": name, "amenity": sub_category}
+        if i % 10 == 0:
+            elements.append({"type": "way", "id": i + 1, "center": {"lat": geom.y, "lon": geom.x}, "tags": tags})
+        else:
+            elements.append({"type": "node", "id": i + 1, "lat": geom.y, "lon": geom.x, "tags": tags})
+    return elements
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub Overpass server with synthetic Milan POIs.")
+    parser.add_argument("--size", type=int, default=10_000, help="Number of synthetic elements.")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with HTTP 429.")
+    args = parser.parse_args()
+
+    stub = StubOverpass(synthetic_elements(args.size), fail_rate=args.fail_rate)
+    server, endpoint = serve(stub, args.port)
+    print(f"-> Stub Overpass server listening at: {endpoint} (set fetch.overpass.endpoint to it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
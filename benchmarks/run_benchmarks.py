@@ -0,0 +1,269 @@
+# benchmarks/run_benchmarks.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# internal
+from src.instrument import peak_rss_mb
+
+
+# === 2. BENCHMARK CASES ===
+
+# every case builds its inputs (untimed) and returns a zero-argument callable to time
+RESULTS_DIR = Path(__file__).parent / "results"
+METRIC_CRS = "EPSG:32632"
+
+def _setup_deduplicate(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+    from src.utils import deduplicate_points
+
+    points = generate_points(size, load_boundary_fixture())
+    return lambda: deduplicate_points(points, 20, METRIC_CRS, similarity_threshold=0.7, semantic_clustering=True)
+
+def _setup_deduplicate_partitioned(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+    from src.entities import partitioned_deduplicate
+
+    # serial partitions: cases run inside daemonic pool processes, which cannot start a process pool of their own
+    points = generate_points(size, load_boundary_fixture())
+    return lambda: partitioned_deduplicate(points, 20, METRIC_CRS, similarity_threshold=0.7, semantic_clustering=True, partition_resolution=7, workers=1)
+
+def _setup_assign_h3(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+    from src.utils import assign_h3
+
+    points = generate_points(size, load_boundary_fixture())
+    df = points.drop(columns='geometry').assign(latitude=points.geometry.y, longitude=points.geometry.x)
+    return lambda: assign_h3(df, 'latitude', 'longitude', 10)
+
+def _setup_generate_grid(resolution: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture
+    from src.utils import buffer_boundary
+    from src.grid import generate_h3_grid
+
+    area = buffer_boundary(load_boundary_fixture(), 5000, METRIC_CRS).geometry.values[0]
+    return lambda: generate_h3_grid(area, resolution)
+
+def _setup_build_features(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points, generate_transport
+    from src.utils import load_config
+    from src.features import build_features
+    from src.utils import buffer_boundary
+    from src.grid import generate_h3_grid
+    from src.layer_io import PartitionedLayerWriter
+
+    boundary = load_boundary_fixture()
+    config = load_config()
+    config['paths'] = {key: str(tmp_dir / key) for key in config['paths']}
+    processed = Path(config['paths']['processed'])
+    processed.mkdir(parents=True, exist_ok=True)
+    points = generate_points(size, boundary).reset_index(drop=True)
+    with PartitionedLayerWriter(processed / "l2_poi") as writer:
+        for category, group in points.groupby('category'):
+            writer.write(group.drop(columns='category'), category=category)
+    generate_transport(max(10, size // 50), boundary).to_parquet(processed / "l1_transport.parquet")
+    area = buffer_boundary(boundary, config['grid']['buffer_dist_m'], METRIC_CRS).geometry.values[0]
+    generate_h3_grid(area, config['grid']['resolution']).to_parquet(processed / "l0_grid.parquet")
+    return lambda: build_features(config)
+
+def _setup_build_accessibility(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_transport
+    from src.utils import load_config, buffer_boundary
+    from src.grid import generate_h3_grid
+    from src.accessibility import build_accessibility
+
+    boundary = load_boundary_fixture()
+    config = load_config()
+    config['paths'] = {key: str(tmp_dir / key) for key in config['paths']}
+    processed = Path(config['paths']['processed'])
+    processed.mkdir(parents=True, exist_ok=True)
+    generate_transport(size, boundary).to_parquet(processed / "l1_transport.parquet")
+    area = buffer_boundary(boundary, config['grid']['buffer_dist_m'], METRIC_CRS).geometry.values[0]
+    generate_h3_grid(area, config['grid']['resolution']).to_parquet(processed / "l0_grid.parquet")
+    return lambda: build_accessibility(config)
+
+def _setup_lookup(size: int, tmp_dir: Path) -> Callable:
+    import numpy as np
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+    from src.utils import buffer_boundary
+    from src.grid import generate_h3_grid
+    from src.hexes import cells_to_int
+    from src.lookup import LookupTable, LookupService
+
+    # every other grid hexagon labelled, queries at synthetic POI positions (half of them resolved by the parent fallback)
+    boundary = load_boundary_fixture()
+    cells = cells_to_int(generate_h3_grid(buffer_boundary(boundary, 500, METRIC_CRS).geometry.values[0], 10)['h3_index'])
+    labels = np.arange(len(cells)) % 8
+    service = LookupService([LookupTable("clusters", cells[::2], {'cluster': labels[::2]}, parent_levels=2)])
+    points = generate_points(size, boundary)
+    lats, lons = points.geometry.y.to_numpy(), points.geometry.x.to_numpy()
+    return lambda: service.query(lats, lons)
+
+def _setup_plot_poi(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+    from src.viz_layer2 import plot_poi
+
+    boundary = load_boundary_fixture()
+    points = generate_points(size, boundary)
+    return lambda: plot_poi(boundary, points, save_path=tmp_dir / "layer2_map.html")
+
+def _setup_plot_transport(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_transport
+    from src.viz_layer1 import plot_transport
+
+    boundary = load_boundary_fixture()
+    stops = generate_transport(size, boundary)
+    return lambda: plot_transport(boundary, stops, save_path=tmp_dir / "layer1_map.html")
+
+def _setup_write_geojson(size: int, tmp_dir: Path) -> Callable:
+    from benchmarks.synthetic import load_boundary_fixture, generate_points
+
+    points = generate_points(size, load_boundary_fixture()).reset_index(drop=True)
+    return lambda: points.to_file(tmp_dir / "l2_poi.geojson", driver="GeoJSON")
+
+# name -> (setup function, parameter name, default parameter values)
+CASES: Dict[str, Tuple[Callable, str, List[int]]] = {
+    'deduplicate_points': (_setup_deduplicate, 'size', [10_000, 100_000, 1_000_000]),
+    'deduplicate_partitioned': (_setup_deduplicate_partitioned, 'size', [10_000, 100_000, 1_000_000]),
+    'assign_h3': (_setup_assign_h3, 'size', [10_000, 100_000, 1_000_000]),
+    'generate_h3_grid': (_setup_generate_grid, 'resolution', [9, 10, 11, 12]),
+    'build_features': (_setup_build_features, 'size', [10_000, 100_000, 1_000_000]),
+    'build_accessibility': (_setup_build_accessibility, 'size', [100, 1_000, 10_000]),
+    'lookup': (_setup_lookup, 'size', [10_000, 100_000, 1_000_000]),
+    'plot_poi': (_setup_plot_poi, 'size', [10_000, 100_000, 1_000_000]),
+    'plot_transport': (_setup_plot_transport, 'size', [10_000, 100_000, 1_000_000]),
+    'write_geojson': (_setup_write_geojson, 'size', [10_000, 100_000, 1_000_000]),
+}
+
+
+# === 3. RUNNER ===
+
+def _run_case(name: str, param: int, repeat: int) -> Dict[str, Any]:
+    """
+    Runs one case in the current (fresh) process: untimed setup, then the best of `repeat` timed calls.
+    """
+    setup, _, _ = CASES[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        func = setup(param, Path(tmp))
+        rss_setup = peak_rss_mb()
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - t0)
+
+    return {
+        "wall_s": round(min(timings), 4),
+        "wall_all_s": [round(t, 4) for t in timings],
+        "peak_rss_mb": peak_rss_mb(),
+        "setup_rss_mb": rss_setup
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _latest_previous(current: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    For every case key, the most recent earlier result (with the commit it was measured on).
+    """
+    latest: Dict[str, Dict[str, Any]] = {}
+    for path in sorted(p for p in RESULTS_DIR.glob("*.json") if p != current):
+        with open(path, "r") as f:
+            run = json.load(f)
+        for key, res in run["results"].items():
+            latest[key] = dict(res, commit=run["commit"])
+    return latest
+
+def run_benchmarks(
+    cases: Optional[List[str]] = None,
+    params: Optional[List[int]] = None,
+    repeat: int = 1,
+    threshold: float = 1.2
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Runs the benchmark suite, saves the results as JSON and compares them with the previous run.
+    Args:
+        cases (Optional[List[str]]): Cases to run. Defaults to all.
+        params (Optional[List[int]]): Override of the sizes (or resolutions for generate_h3_grid).
+        repeat (int): Timed calls per case (the best one is kept).
+        threshold (float): Slowdown ratio vs the previous run that counts as a regression.
+    Returns:
+        Tuple[Dict[str, Any], List[str]]: The results and the list of regressions.
+    Logic:
+        1. Each (case, parameter) runs in a fresh process so peak RSS is measured per case.
+        2. Inputs are synthetic and seeded, and the boundary comes from a saved fixture, so no network is needed.
+        3. Results are saved as benchmarks/results/<timestamp>_<commit>.json and compared with the latest earlier file.
+    """
+    cases = cases or list(CASES)
+    commit = _git_commit()
+    results = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": {}
+    }
+
+    ctx = mp.get_context("spawn")
+    for name in cases:
+        setup, param_name, defaults = CASES[name]
+        for param in params or defaults:
+            key = f"{name}[{param_name}={param}]"
+            print(f"-> Running {key}...")
+            with ctx.Pool(1, maxtasksperchild=1) as pool:
+                results["results"][key] = pool.apply(_run_case, (name, param, repeat))
+            print(f"-> {key}: {results['results'][key]['wall_s']:.3f}s, peak {results['results'][key]['peak_rss_mb']:.0f} MB")
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out_path = RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}_{commit}.json"
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"-> Saved benchmark results at: {out_path}")
+
+    # compare with the previous run
+    regressions = []
+    previous = _latest_previous(out_path)
+    compared = [key for key in results["results"] if key in previous]
+    if not compared:
+        print("-> No previous results to compare with.")
+        return results, regressions
+
+    print("\n-> Comparison with the previous results:")
+    print(f"{'case':<44} {'commit':>9} {'before_s':>9} {'after_s':>9} {'ratio':>6}")
+    for key in compared:
+        before, res = previous[key], results["results"][key]
+        ratio = res["wall_s"] / max(before["wall_s"], 1e-9)
+        flag = " !! REGRESSION" if ratio > threshold else ""
+        print(f"{key:<44} {before['commit']:>9} {before['wall_s']:>9.3f} {res['wall_s']:>9.3f} {ratio:>6.2f}{flag}")
+        if flag:
+            regressions.append(key)
+
+    return results, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite on synthetic Milan-scale data.")
+    parser.add_argument("cases", nargs="*", help=f"Cases to run {list(CASES)}. Defaults to all.")
+    parser.add_argument("--params", type=int, nargs="+", default=None, help="Sizes (or H3 resolutions for generate_h3_grid).")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed calls per case (best is kept).")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio flagged as a regression.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with code 1 if any case regressed.")
+    args = parser.parse_args()
+
+    _, regressions = run_benchmarks(args.cases or None, args.params, args.repeat, args.threshold)
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
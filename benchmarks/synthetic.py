@@ -0,0 +1,172 @@
+# benchmarks/synthetic.py
+
+# === 1. IMPORTS ===
+
+# general
+from pathlib import Path
+
+# third party
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+
+# === 2. FIXTURES ===
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+METRIC_CRS = "EPSG:32632"
+
+# Duomo di Milano, centre of the synthetic density
+CENTER_LAT, CENTER_LON = 45.4642, 9.1900
+
+# name building blocks: prefix -> (sub_category, category)
+PREFIXES = {
+    "Bar": ("bar", "food_nighlife"),
+    "Caffè": ("cafe", "food_nighlife"),
+    "Pizzeria": ("fast_food", "food_nighlife"),
+    "Trattoria": ("restaurant", "food_nighlife"),
+    "Farmacia": ("pharmacy", "public_services"),
+    "Scuola": ("school", "public_services"),
+    "Hotel": ("hotel", "business_economy"),
+    "Banca": ("bank", "business_economy"),
+    "Panificio": ("bakery", "retail_shopping"),
+    "Libreria": ("books", "retail_shopping"),
+    "Teatro": ("theatre", "culture_leisure"),
+    "Palestra": ("fitness_centre", "culture_leisure"),
+}
+ROOTS = [
+    "Roma", "Duomo", "Brera", "Navigli", "Garibaldi", "Porta Venezia", "Sempione", "Isola", "Centrale", "Ticinese",
+    "Lambrate", "Bicocca", "Loreto", "Città Studi", "Porta Romana", "San Siro", "Niguarda", "Corvetto", "Lorenteggio", "Bovisa"
+]
+
+def load_boundary_fixture() -> gpd.GeoDataFrame:
+    """
+    Loads the saved Milan boundary (simplified OSM relation, EPSG:4326), so benchmarks never need Nominatim.
+    Returns:
+        gpd.GeoDataFrame: The boundary.
+    """
+    return gpd.read_file(FIXTURES_DIR / "milan_boundary.geojson")
+
+
+# === 3. SYNTHETIC POINTS ===
+
+def _sample_locations(n: int, boundary: gpd.GeoDataFrame, rng: np.random.Generator) -> np.ndarray:
+    """
+    Samples (lon, lat) locations with a Milan-like density: a dense centre decaying outwards plus a uniform background.
+    """
+    area = boundary.union_all()
+    minx, miny, maxx, maxy = area.bounds
+    out = np.empty((0, 2))
+
+    while len(out) < n:
+        batch = 2 * (n - len(out)) + 100
+        n_centre = int(batch * 0.6)
+        # ~2.5km spread around the centre (degrees of lat/lon at Milan's latitude)
+        centre = np.column_stack([
+            rng.normal(CENTER_LON, 2500 / 78000, n_centre),
+            rng.normal(CENTER_LAT, 2500 / 111320, n_centre)
+        ])
+        background = np.column_stack([
+            rng.uniform(minx, maxx, batch - n_centre),
+            rng.uniform(miny, maxy, batch - n_centre)
+        ])
+        candidates = np.vstack([centre, background])
+        candidates = candidates[shapely.contains_xy(area, candidates[:, 0], candidates[:, 1])]
+        out = np.vstack([out, candidates])
+
+    return out[rng.permutation(len(out))[:n]]
+
+def _name_variant(name: str, rng: np.random.Generator) -> str:
+    """
+    Returns a realistic OSM duplicate of a name: same, different case, suffix, missing prefix or a typo.
+    """
+    kind = rng.integers(5)
+    if kind == 0:
+        return name
+    if kind == 1:
+        return name.upper() if rng.random() < 0.5 else name.lower()
+    if kind == 2:
+        return f"{name} Milano"
+    if kind == 3 and " " in name:
+        return name.split(" ", 1)[1]
+    # swap two adjacent characters
+    i = int(rng.integers(1, max(2, len(name) - 1)))
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+def generate_points(
+    n: int,
+    boundary: gpd.GeoDataFrame,
+    duplicate_rate: float = 0.15,
+    jitter_m: float = 8.0,
+    seed: int = 42
+) -> gpd.GeoDataFrame:
+    """
+    Generates synthetic OSM-like POIs with a Milan-like density and realistic duplication (the same place mapped twice).
+    Args:
+        n (int): Total number of points (duplicates included).
+        boundary (gpd.GeoDataFrame): Area to sample from (EPSG:4326).
+        duplicate_rate (float): Share of extra points that duplicate an existing one (e.g. a node and a building centroid).
+        jitter_m (float): Standard deviation in meters of the duplicates' offset from the original point.
+        seed (int): Random seed (same seed -> same points).
+    Returns:
+        gpd.GeoDataFrame: Points with name, sub_category, category and geometry, indexed by (element, id) like OSMNX.
+    """
+    rng = np.random.default_rng(seed)
+    n_unique = max(1, int(round(n / (1 + duplicate_rate))))
+    n_dupes = n - n_unique
+
+    # unique places
+    coords = _sample_locations(n_unique, boundary, rng)
+    prefixes = np.array(list(PREFIXES))[rng.integers(len(PREFIXES), size=n_unique)]
+    roots = np.array(ROOTS)[rng.integers(len(ROOTS), size=n_unique)]
+    numbers = rng.integers(1, 200, size=n_unique)
+    names = [f"{p} {r} {k}" if k > 20 else f"{p} {r}" for p, r, k in zip(prefixes, roots, numbers)]
+
+    # duplicates: jittered copies with name variants
+    src = rng.integers(n_unique, size=n_dupes)
+    jitter = rng.normal(0, jitter_m, size=(n_dupes, 2))
+    dupe_coords = coords[src] + jitter / np.array([111320 * np.cos(np.radians(CENTER_LAT)), 111320])
+    dupe_names = [_name_variant(names[i], rng) for i in src]
+
+    all_coords = np.vstack([coords, dupe_coords])
+    all_prefixes = np.concatenate([prefixes, prefixes[src]])
+    order = rng.permutation(n)
+
+    gdf = gpd.GeoDataFrame(
+        {
+            'name': np.array(names + dupe_names, dtype=object)[order],
+            'sub_category': [PREFIXES[p][0] for p in all_prefixes[order]],
+            'category': [PREFIXES[p][1] for p in all_prefixes[order]],
+        },
+        geometry = gpd.points_from_xy(all_coords[order, 0], all_coords[order, 1]),
+        crs = "EPSG:4326",
+        index = pd.MultiIndex.from_arrays([np.full(n, "node"), np.arange(1, n + 1)], names=["element", "id"])
+    )
+    return gdf
+
+def generate_transport(n: int, boundary: gpd.GeoDataFrame, seed: int = 7) -> gpd.GeoDataFrame:
+    """
+    Generates synthetic transport stops (metro/train/tram) shaped like the Layer 1 output.
+    Args:
+        n (int): Number of stops.
+        boundary (gpd.GeoDataFrame): Area to sample from (EPSG:4326).
+        seed (int): Random seed.
+    Returns:
+        gpd.GeoDataFrame: Stops with name, sub_category, type, node_count and geometry.
+    """
+    rng = np.random.default_rng(seed)
+    coords = _sample_locations(n, boundary, rng)
+    modes = np.array(['metro', 'train', 'tram'])[rng.choice(3, size=n, p=[0.15, 0.05, 0.8])]
+    sub_categories = {'metro': 'subway', 'train': 'station', 'tram': 'tram_stop'}
+
+    return gpd.GeoDataFrame(
+        {
+            'name': [f"Fermata {ROOTS[i % len(ROOTS)]} {i}" for i in range(n)],
+            'sub_category': [sub_categories[m] for m in modes],
+            'node_count': 1,
+            'type': modes,
+        },
+        geometry = gpd.points_from_xy(coords[:, 0], coords[:, 1]),
+        crs = "EPSG:4326"
+    )
@@ -0,0 +1,78 @@
+# main_batch.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+from typing import Any, Dict
+
+# internal
+from src.config import load_config
+from src.batch import run_batch
+from src.pipeline import run_dag
+from src.instrument import start_run, print_summary, end_run
+from main_pipeline import build_steps, default_targets, state_path_for
+
+
+# === 2. PER-CITY PIPELINE ===
+
+def run_city(config: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Runs the pipeline DAG for one city config (outputs and pipeline state are already namespaced per city).
+    Args:
+        config (Dict[str, Any]): City configuration built by src.batch.city_config.
+    Returns:
+        Dict[str, str]: Status of each step.
+    """
+    steps = build_steps(config)
+    status = run_dag(
+        steps,
+        config,
+        state_path = state_path_for(config),
+        targets = default_targets(steps, config),
+        max_workers = config.get('batch', {}).get('steps_per_city', 1)
+    )
+
+    failed = [name for name, s in status.items() if s in ("failed", "blocked")]
+    if failed:
+        raise RuntimeError(f"!! Steps failed for {config['project']['city_name']}: {failed}")
+    return status
+
+
+# === 3. MAIN BATCH ===
+
+def main_batch():
+    """
+    Runs the layer pipelines for every city profile in batch.cities (or the --cities subset), a bounded number of cities at a time.
+    All cities share the raw inputs and the OSM request cache, every other output goes to <path>/<slug>.
+    """
+    parser = argparse.ArgumentParser(description="Run the layer pipelines for several cities.")
+    parser.add_argument("--config", default="config/settings.yaml", help="Path to the settings file.")
+    parser.add_argument("--cities", nargs="*", default=None, help="Slugs of the cities to run. Defaults to all profiles.")
+    parser.add_argument("--workers", type=int, default=None, help="Cities processed at the same time.")
+    args = parser.parse_args()
+
+    print("-> STARTING BATCH...")
+
+    config = load_config(args.config)
+    profiles = config.get('batch', {}).get('cities', [])
+    if args.cities:
+        profiles = [p for p in profiles if p.get('slug') in args.cities]
+        missing = set(args.cities) - {p.get('slug') for p in profiles}
+        if missing:
+            raise ValueError(f"!! Unknown city slugs: {sorted(missing)}")
+
+    owns_run = start_run(config['paths']['logs'], run_name="batch")
+    status = run_batch(config, run_city, profiles = profiles, max_workers = args.workers)
+    if owns_run:
+        print_summary()
+        end_run()
+
+    if any(s != "ok" for s in status.values()):
+        raise SystemExit(1)
+
+    print("-> BATCH COMPLETED.")
+
+
+if __name__ == "__main__":
+    main_batch()
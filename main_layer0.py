@@ -4,34 +4,41 @@
 
 # general
 from pathlib import Path
-
-# third party
-import geopandas as gpd
+from typing import Any, Dict, Optional
 
 # internal
-from src.utils import load_config, fetch_boundary, buffer_boundary
+from src.utils import load_config, configure_osm_cache, fetch_boundary, buffer_boundary
 from src.grid import generate_h3_grid
-from src.viz_layer0 import plot_boundary_and_grid
+from src.hexes import CompactCellSet
+from src.exports import run_exports
+from src.instrument import start_run, print_summary, end_run
 
 
 # === 2. MAIN LAYER 0 PIPELINE ===
 
-def main_layer0():
+def main_layer0(config: Optional[Dict[str, Any]] = None, export: Optional[bool] = None):
     """
     Main pipeline for Layer 0 generation - fetches city boundary, buffers it, generates H3 grid, and saves the results.
-    Results are saved as: GeoJSON, HTML, Parquet.
+    Results are saved as: Parquet (+ GeoJSON, HTML and tiles when exports are enabled).
     Logic:
         1. Load settings from YAML config file.
         2. Fetch the city boundary from OpenStreetMap using OSMNX.
         3. Buffer the boundary by a specified distance in meters.
         4. Generate an H3 hexagon grid covering the buffered area at a specified respolution.
-        5. Save the boundary and grid as GeoJSON and Parquet files.
-        6. Save a Folium HTML map visualising the boundary and grid.
+        5. Save the buffered boundary and grid as Parquet files, and the grid as a compacted cell set (fast point-in-area tests).
+        6. Optionally run the export stage (GeoJSON, tiles, Folium HTML map) from the Parquet artifacts.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+        export (Optional[bool]): Whether to run the exports. Defaults to exports.enabled in settings.yaml.
     """
     print("-> STARTING LAYER O PIPELINE...")
 
-    # load settings.yaml
-    config = load_config()
+    # load settings.yaml (unless a config is passed in, e.g. by the pipeline runner)
+    if config is None:
+        config = load_config()
+
+    # instrumentation (spans are written to a JSON-lines run log)
+    owns_run = start_run(config['paths']['logs'], run_name="layer0")
     
     # define and create output directories (extra safety)
     paths = config["paths"]
@@ -42,6 +49,9 @@ def main_layer0():
     for dir_path in dirs:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
 
+    # shared OSM request cache
+    configure_osm_cache(paths.get('cache', "cache"))
+
     # fetch the city boundary from OSMNX
     city_name = config['project']['city_name']
     simple_boundary_gdf = fetch_boundary(city_name)
@@ -52,14 +62,17 @@ def main_layer0():
         simple_boundary_gdf, 
         buffer_meters,
         metric_crs = config['crs']['metric'],
-        target_crs = config['crs']['global']
+        target_crs = config['crs']['global'],
+        simplify_tolerance_m = config['grid'].get('simplify_tolerance_m')
     )
 
     # grid generation
     res = config['grid']['resolution']
     h3_grid_gdf = generate_h3_grid(
         buffered_boundary_gdf.geometry.values[0],
-        res
+        res,
+        workers = config['grid'].get('workers', 1),
+        partitions = config['grid'].get('partitions')
     )
 
     # save Parquet
@@ -67,19 +80,26 @@ def main_layer0():
     h3_grid_gdf.to_parquet(parquet_path, compression = "brotli")
     print(f"-> Saved H3 grid as Parquet at: {parquet_path}")
 
-    # save GeoJSON
-    geojson_path = viz_dir / "l0_grid.geojson"
-    h3_grid_gdf.to_file(geojson_path, driver="GeoJSON")
-    print(f"-> Saved H3 grid as GeoJSON at: {geojson_path}")
-
-    # save Folium HTML map
-    map_path = maps_dir / "layer0_map.html"
-    plot_boundary_and_grid(
-        buffered_boundary_gdf,
-        h3_grid_gdf,
-        save_path = map_path
-    )
-    print(f"-> Saved Folium map at: {map_path}")
+    # save the buffered boundary (reused by the exports of every layer)
+    boundary_path = processed_dir / "l0_boundary.parquet"
+    buffered_boundary_gdf[['geometry']].to_parquet(boundary_path)
+    print(f"-> Saved buffered boundary as Parquet at: {boundary_path}")
+
+    # save the study area as compacted H3 cells (containment by parent lookups instead of polygon tests)
+    area_path = processed_dir / "l0_area_cells.npy"
+    area_cells = CompactCellSet.from_cells(h3_grid_gdf['h3_index'])
+    area_cells.save(area_path)
+    print(f"-> Saved study area as {len(area_cells)} compacted H3 cells (from {len(h3_grid_gdf)}) at: {area_path}")
+
+    # optional exports (GeoJSON, tiles, HTML)
+    if export is None:
+        export = config.get('exports', {}).get('enabled', False)
+    if export:
+        run_exports(config, layers = ['l0'])
+
+    if owns_run:
+        print_summary()
+        end_run()
 
     print("-> LAYER 0 PIPELINE COMPLETED.")
 
@@ -4,42 +4,52 @@
 
 # general
 from pathlib import Path
+from typing import Any, Dict, Optional
 
 # thrid party
 import pandas as pd
-import geopandas as gpd
 
 # internal
 from src.utils import (
     load_config, 
+    configure_osm_cache,
     names_are_similar,
     fetch_boundary, 
     buffer_boundary, 
-    fetch_osmnx_points, 
-    deduplicate_points
+    fetch_points
 )
-from src.viz_layer1 import plot_transport, plot_cleaned_comparison
+from src.entities import deduplicate_layer_points
+from src.schema import compact_frame
+from src.exports import run_exports
+from src.instrument import start_run, print_summary, end_run
 
 
 # === 2. MAIN LAYER 1 PIPELINE ===
 
-def main_layer1():
+def main_layer1(config: Optional[Dict[str, Any]] = None, export: Optional[bool] = None):
     """
     Main pipeline for Layer 1 generation - fetches city boundary, buffers it, extracts transport points inside the city area, cleans them, and saves the results.
-    Results are saved as: GeoJSON, HTML, Parquet.
+    Results are saved as: Parquet (+ GeoJSON and HTML when exports are enabled).
     Logic:
         1. Load settings from YAML config file.
         2. Fetch the city boundary from OpenStreetMap using OSMNX.
         3. Buffer the boundary by a specified distance in meters.
         4. Fetches OSM transport points afferent to specific tags. Trains should not include points already tagged as metro.
         5. Cleans the transport points by removing duplicates based on a specified distance threshold and name similarity.
-        5. Save the boundary and points as GeoJSON and Parquet files.
-        6. Save a Folium HTML map visualising the cleaning comparison and the final set of points.
+        5. Save the raw and cleaned points as Parquet files.
+        6. Optionally run the export stage (GeoJSON, Folium HTML maps of the cleaning comparison and the final set of points).
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+        export (Optional[bool]): Whether to run the exports. Defaults to exports.enabled in settings.yaml.
     """
     print("-> STARTING LAYER 1 PIPELINE...")
 
-    # load settings.yaml
-    config = load_config()
+    # load settings.yaml (unless a config is passed in, e.g. by the pipeline runner)
+    if config is None:
+        config = load_config()
+
+    # instrumentation (spans are written to a JSON-lines run log)
+    owns_run = start_run(config['paths']['logs'], run_name="layer1")
     
     # define and create output directories (extra safety)
     paths = config["paths"]
@@ -50,6 +60,9 @@ def main_layer1():
     for dir_path in dirs:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
 
+    # shared OSM request cache
+    configure_osm_cache(paths.get('cache', "cache"))
+
     # fetch the city boundary from OSMNX
     city_name = config['project']['city_name']
     simple_boundary_gdf = fetch_boundary(city_name)
@@ -62,7 +75,8 @@ def main_layer1():
         simple_boundary_gdf, 
         buffer_meters,
         metric_crs = config['crs']['metric'],
-        target_crs = config['crs']['global']
+        target_crs = config['crs']['global'],
+        simplify_tolerance_m = config['grid'].get('simplify_tolerance_m')
     )
 
     # fetch OSM transport settings from config
@@ -76,9 +90,9 @@ def main_layer1():
 
     # extract points 
     print(f"-> Fetching OSM transport points within buffered boundary...")
-    metro_raw_gdf = fetch_osmnx_points(buffered_boundary_gdf, metro_tags)
-    train_raw_gdf = fetch_osmnx_points(buffered_boundary_gdf, train_tags)
-    tram_raw_gdf = fetch_osmnx_points(buffered_boundary_gdf, tram_tags)
+    metro_raw_gdf = fetch_points(buffered_boundary_gdf, metro_tags, config)
+    train_raw_gdf = fetch_points(buffered_boundary_gdf, train_tags, config)
+    tram_raw_gdf = fetch_points(buffered_boundary_gdf, tram_tags, config)
 
     # make sure trains do not include metro points
     print("-> Removing metro points from train dataset...")
@@ -92,8 +106,10 @@ def main_layer1():
     # deduplicate metro 
     print("-> Deduplicating metro points...")
 
-    metro_gdf = deduplicate_points(
-        metro_raw_gdf, 
+    metro_gdf = deduplicate_layer_points(
+        metro_raw_gdf,
+        "l1_metro",
+        config,
         distance_threshold_m = metro_dist_m, 
         metric_crs = crs_metric, 
         similarity_threshold = sim_threshold, 
@@ -101,13 +117,14 @@ def main_layer1():
     )
 
     cleaned_datasets['metro'] = metro_gdf
-    plot_cleaned_comparison(metro_raw_gdf, metro_gdf, buffered_boundary_gdf, "Metro", save_path = maps_dir / "cleaned_metro_comparison_map.html")
 
     # deduplicate tram
     print("-> Deduplicating tram points...")
 
-    tram_gdf = deduplicate_points(
-        tram_raw_gdf, 
+    tram_gdf = deduplicate_layer_points(
+        tram_raw_gdf,
+        "l1_tram",
+        config,
         distance_threshold_m = tram_dist_m, 
         metric_crs = crs_metric, 
         similarity_threshold = sim_threshold, 
@@ -115,13 +132,14 @@ def main_layer1():
     )
 
     cleaned_datasets['tram'] = tram_gdf
-    plot_cleaned_comparison(tram_raw_gdf, tram_gdf, buffered_boundary_gdf, "Tram", save_path = maps_dir / "cleaned_tram_comparison_map.html")
 
     # deduplicate train
     print("-> Deduplicating train points...")
 
-    train_gdf = deduplicate_points(
-        train_raw_gdf, 
+    train_gdf = deduplicate_layer_points(
+        train_raw_gdf,
+        "l1_train",
+        config,
         distance_threshold_m = train_dist_m, 
         metric_crs = crs_metric, 
         similarity_threshold = sim_threshold, 
@@ -129,33 +147,38 @@ def main_layer1():
     )
 
     cleaned_datasets['train'] = train_gdf
-    plot_cleaned_comparison(train_raw_gdf, train_gdf, buffered_boundary_gdf, "Train", save_path = maps_dir / "cleaned_train_comparison_map.html")
 
     # save outputs
     print("-> Saving outputs...")
     metro_gdf['type'] = 'metro'
     train_gdf['type'] = 'train'
     tram_gdf['type'] = 'tram'
-    transport_gdf = pd.concat([metro_gdf, train_gdf, tram_gdf], ignore_index=True)
+    transport_gdf = compact_frame(pd.concat([metro_gdf, train_gdf, tram_gdf], ignore_index=True), report="transport points")
+
+    # raw points are kept for the cleaning comparison maps
+    metro_raw_gdf = metro_raw_gdf.assign(type='metro')
+    train_raw_gdf = train_raw_gdf.assign(type='train')
+    tram_raw_gdf = tram_raw_gdf.assign(type='tram')
+    transport_raw_gdf = pd.concat([metro_raw_gdf, train_raw_gdf, tram_raw_gdf])
 
     # save Parquet files
     parquet_path = processed_dir / "l1_transport.parquet"
     transport_gdf.to_parquet(parquet_path, compression = "brotli")
     print(f"-> Saved transport points as Parquet at: {parquet_path}")
 
-    # save GeoJSON
-    geojson_path = viz_dir / "l1_transport.geojson"
-    transport_gdf.to_file(geojson_path, driver="GeoJSON")
-    print(f"-> Saved transport points as GeoJSON at: {geojson_path}")
-
-    # save Folium HTML map
-    map_path = maps_dir / "layer1_map.html"
-    plot_transport(
-        buffered_boundary_gdf,
-        transport_gdf,
-        save_path = map_path
-    )
-    print(f"-> Saved Folium map at: {map_path}")
+    raw_parquet_path = processed_dir / "l1_transport_raw.parquet"
+    transport_raw_gdf.to_parquet(raw_parquet_path, compression = "brotli")
+    print(f"-> Saved raw transport points as Parquet at: {raw_parquet_path}")
+
+    # optional exports (GeoJSON, HTML)
+    if export is None:
+        export = config.get('exports', {}).get('enabled', False)
+    if export:
+        run_exports(config, layers = ['l1'])
+
+    if owns_run:
+        print_summary()
+        end_run()
 
     print("-> LAYER 1 PIPELINE COMPLETED.")
 
@@ -4,42 +4,48 @@
 
 # general
 from pathlib import Path
-from typing import Union
-
-# third party
-import geopandas as gpd
-import pandas as pd
+from typing import Any, Dict, Optional, Union
 
 # internal
 from src.utils import (
     load_config,
+    configure_osm_cache,
     fetch_boundary, 
     buffer_boundary, 
-    fetch_osmnx_points,
-    deduplicate_points
+    fetch_points
 )
-from src.viz_layer2 import plot_poi
+from src.entities import deduplicate_layer_points
+from src.layer_io import PartitionedLayerWriter
+from src.exports import run_exports
+from src.instrument import start_run, print_summary, end_run
 
 
 # === 2. MAIN LAYER 2 PIPELINE ===
 
-def main_layer2():
+def main_layer2(config: Optional[Dict[str, Any]] = None, export: Optional[bool] = None):
     """
     Main pipeline for Layer 2 generation - fetches city boundary, buffers it, extracts POI points inside the city area, cleans them, and saves the results.
-    Results are saved as: GeoJSON, HTML, Parquet.
+    Results are saved as: a GeoParquet dataset partitioned by H3 parent (+ GeoJSON and HTML when exports are enabled).
     Logic:
         1. Load settings from YAML config file.
         2. Fetch the city boundary from OpenStreetMap using OSMNX.
         3. Buffer the boundary by a specified distance in meters.
         4. Fetches OSM POI points afferent to specific tags. 
         5. Cleans the POI points by removing duplicates based on a specified distance threshold and name similarity.
-        5. Save the boundary and points as GeoJSON and Parquet files.
-        6. Save a Folium HTML map visualising the points in layers for each category.
+        6. Stream each category into the partitioned Parquet dataset as soon as it is cleaned (one row group per partition).
+        7. Optionally run the export stage (GeoJSON, Folium HTML map visualising the points in layers for each category).
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+        export (Optional[bool]): Whether to run the exports. Defaults to exports.enabled in settings.yaml.
     """
     print("-> STARTING LAYER 2 PIPELINE...")
 
-    # load settings.yaml
-    config = load_config()
+    # load settings.yaml (unless a config is passed in, e.g. by the pipeline runner)
+    if config is None:
+        config = load_config()
+
+    # instrumentation (spans are written to a JSON-lines run log)
+    owns_run = start_run(config['paths']['logs'], run_name="layer2")
     
     # define and create output directories (extra safety)
     paths = config["paths"]
@@ -50,6 +56,9 @@ def main_layer2():
     for dir_path in dirs:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
 
+    # shared OSM request cache
+    configure_osm_cache(paths.get('cache', "cache"))
+
     # fetch the city boundary from OSMNX
     city_name = config['project']['city_name']
     simple_boundary_gdf = fetch_boundary(city_name)
@@ -62,70 +71,77 @@ def main_layer2():
         simple_boundary_gdf, 
         buffer_meters,
         metric_crs = config['crs']['metric'],
-        target_crs = config['crs']['global']
+        target_crs = config['crs']['global'],
+        simplify_tolerance_m = config['grid'].get('simplify_tolerance_m')
     )
 
     # fetch OSM POI settings from config
     sim_threshold = config["poi"]["deduplication"]["similarity_threshold"]
     clustering_dist_m = config["poi"]["deduplication"]["distance_m"]
     categories = config["poi"]["categories"]
-    all_pois = []
+    storage = config.get('storage', {})
 
     # extract points 
     print(f"-> Fetching OSM POI points within buffered boundary for {len(categories)} categories...")
 
-    for category, tags in categories.items():
-        # fetch points in this category
-        print(f"-> Fetching category: {category}...")
-        poi_raw_gdf = fetch_osmnx_points(buffered_boundary_gdf, tags)
-
-        # check if any points were found
-        if len(poi_raw_gdf) == 0:
-            print(f"-> No points found for category: {category}. Skipping deduplication.")
-            continue
-
-        print(f"-> {len(poi_raw_gdf)} raw points found for category: {category}.") 
-
-        print(f"-> Deduplicating category: {category}...")
-        poi_gdf = deduplicate_points(
-            poi_raw_gdf,
-            distance_threshold_m = clustering_dist_m,
-            metric_crs = crs_metric,
-            similarity_threshold = sim_threshold,
-            semantic_clustering=True
-        )
-        poi_gdf['category'] = category
-        all_pois.append(poi_gdf)
-
-    # combine all categories
-    if not all_pois:
+    # each category is written as soon as it is cleaned, nothing is concatenated in memory
+    dataset_path = processed_dir / "l2_poi"
+    writer = PartitionedLayerWriter(
+        dataset_path,
+        partition_resolution = storage.get('partition_resolution', 6),
+        compression = storage.get('compression', "brotli")
+    )
+
+    try:
+        for category, tags in categories.items():
+            # fetch points in this category
+            print(f"-> Fetching category: {category}...")
+            poi_raw_gdf = fetch_points(buffered_boundary_gdf, tags, config)
+
+            # check if any points were found
+            if len(poi_raw_gdf) == 0:
+                print(f"-> No points found for category: {category}. Skipping deduplication.")
+                continue
+
+            print(f"-> {len(poi_raw_gdf)} raw points found for category: {category}.") 
+
+            print(f"-> Deduplicating category: {category}...")
+            poi_gdf = deduplicate_layer_points(
+                poi_raw_gdf,
+                f"l2_{category}",
+                config,
+                distance_threshold_m = clustering_dist_m,
+                metric_crs = crs_metric,
+                similarity_threshold = sim_threshold,
+                semantic_clustering=True
+            )
+            writer.write(poi_gdf, category = category)
+    except BaseException:
+        writer.abort()
+        raise
+
+    # no category returned points: keep the previous output (if any)
+    if writer.rows_written == 0:
+        writer.abort()
         print("-> No POI points found in any category. Exiting pipeline.")
+        if owns_run:
+            print_summary()
+            end_run()
         return
-    
-    print("-> Combining all categories into a single GeoDataFrame...")
-    poi_gdf = pd.concat(all_pois, ignore_index=True)
 
     # save outputs
     print("-> Saving outputs...")
+    writer.close()
 
-    # save Parquet files
-    parquet_path = processed_dir / "l2_poi.parquet"
-    poi_gdf.to_parquet(parquet_path, compression = "brotli")
-    print(f"-> Saved POI points as Parquet at: {parquet_path}")
-
-    # save GeoJSON
-    geojson_path = viz_dir / "l2_poi.geojson"
-    poi_gdf.to_file(geojson_path, driver="GeoJSON")
-    print(f"-> Saved POI points as GeoJSON at: {geojson_path}")
-
-    # save Folium HTML map
-    map_path = maps_dir / "layer2_map.html"
-    plot_poi(
-        buffered_boundary_gdf,
-        poi_gdf,
-        save_path = map_path
-    )
-    print(f"-> Saved Folium map at: {map_path}")
+    # optional exports (GeoJSON, HTML)
+    if export is None:
+        export = config.get('exports', {}).get('enabled', False)
+    if export:
+        run_exports(config, layers = ['l2'])
+
+    if owns_run:
+        print_summary()
+        end_run()
 
     print("-> LAYER 2 PIPELINE COMPLETED.")
 
@@ -0,0 +1,203 @@
+# main_pipeline.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+# internal
+from src.config import load_config
+from src.pipeline import Step, run_dag
+from src.instrument import start_run, print_summary, end_run
+from src.features import build_features
+from src.accessibility import build_accessibility, build_walk_access
+from src.price_surface import build_price_surface
+from src.fetch_insideairbnb import process_str_data
+from src.exports import run_exports
+from main_layer0 import main_layer0
+from main_layer1 import main_layer1
+from main_layer2 import main_layer2
+
+
+# === 2. STEP WRAPPERS ===
+
+def run_airbnb(config: Dict[str, Any]) -> None:
+    """
+    Runs the Inside Airbnb processing with the file and resolution taken from the config.
+    """
+    process_str_data(
+        file_path = config['data_sources']['inside_airbnb']['filename'],
+        h3_resolution = config['grid']['resolution'],
+        config = config
+    )
+
+def run_layer0(config: Dict[str, Any]) -> None:
+    main_layer0(config, export = False)
+
+def run_layer1(config: Dict[str, Any]) -> None:
+    main_layer1(config, export = False)
+
+def run_layer2(config: Dict[str, Any]) -> None:
+    main_layer2(config, export = False)
+
+def run_all_exports(config: Dict[str, Any]) -> None:
+    run_exports(config)
+
+
+# === 3. PIPELINE DAG ===
+
+def build_steps(config: Dict[str, Any]) -> List[Step]:
+    """
+    Declares the layer pipelines as a DAG with their config sections, inputs and outputs.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary (used to resolve the file paths).
+    Returns:
+        List[Step]: The pipeline steps.
+    """
+    paths = config['paths']
+    processed = Path(paths['processed'])
+    viz = Path(paths['viz'])
+    maps = Path(paths['maps'])
+    raw = Path(paths['raw'])
+
+    # sections shared by every step that fetches the buffered boundary
+    boundary_keys = ['project.city_name', 'crs', 'grid.buffer_dist_m', 'grid.simplify_tolerance_m']
+
+    return [
+        Step(
+            name = "l0_grid",
+            func = run_layer0,
+            config_keys = boundary_keys + ['grid.resolution'],
+            outputs = [str(processed / "l0_grid.parquet"), str(processed / "l0_boundary.parquet"), str(processed / "l0_area_cells.npy")]
+        ),
+        Step(
+            name = "l1_transport",
+            func = run_layer1,
+            config_keys = boundary_keys + ['transport', 'fetch.backend'],
+            outputs = [str(processed / "l1_transport.parquet"), str(processed / "l1_transport_raw.parquet")]
+        ),
+        Step(
+            name = "l2_poi",
+            func = run_layer2,
+            config_keys = boundary_keys + ['poi', 'storage', 'fetch.backend'],
+            outputs = [str(processed / "l2_poi")]
+        ),
+        Step(
+            name = "airbnb",
+            func = run_airbnb,
+            config_keys = ['grid.resolution', 'data_sources.inside_airbnb.filename', 'data_sources.inside_airbnb.filters'],
+            inputs = [str(raw / config['data_sources']['inside_airbnb']['filename']), str(processed / "l0_area_cells.npy")],
+            outputs = [str(processed / "insideairbnb_h3.csv"), str(processed / "insideairbnb_h3.parquet"), str(processed / "insideairbnb_listings.parquet")],
+            deps = ["l0_grid"]
+        ),
+        Step(
+            name = "price_surface",
+            func = build_price_surface,
+            config_keys = ['crs', 'data_sources.inside_airbnb.surface'],
+            inputs = [str(processed / name) for name in ["l0_grid.parquet", "insideairbnb_h3.parquet", "insideairbnb_listings.parquet"]],
+            outputs = [str(processed / "insideairbnb_price_surface.parquet")],
+            deps = ["l0_grid", "airbnb"]
+        ),
+        Step(
+            name = "features",
+            func = build_features,
+            config_keys = ['grid.resolution', 'features'],
+            inputs = [str(processed / "l0_grid.parquet"), str(processed / "l1_transport.parquet"), str(processed / "l2_poi")],
+            outputs = [str(processed / name) for name in [
+                "l3_features_tfidf.parquet", "l3_features_raw.parquet", "l3_features_tfidf.arrow", "l3_features_raw.arrow",
+                "l3_features_tfidf_sparse.npz", "l3_features_raw_sparse.npz", "l3_point_index.arrow"
+            ]],
+            deps = ["l0_grid", "l1_transport", "l2_poi"]
+        ),
+        Step(
+            name = "accessibility",
+            func = build_accessibility,
+            config_keys = ['crs', 'features.accessibility'],
+            inputs = [str(processed / "l0_grid.parquet"), str(processed / "l1_transport.parquet")],
+            outputs = [str(processed / "l3_transit_access.parquet")],
+            deps = ["l0_grid", "l1_transport"]
+        ),
+        Step(
+            name = "walk_access",
+            func = build_walk_access,
+            config_keys = ['crs', 'features.walk', 'features.accessibility.modes'],
+            inputs = [str(processed / name) for name in ["l0_grid.parquet", "l0_boundary.parquet", "l1_transport.parquet"]],
+            outputs = [str(processed / "l3_transit_walk.parquet")],
+            deps = ["l0_grid", "l1_transport"]
+        ),
+        # opt-in: only selected when requested or when exports.enabled is set
+        Step(
+            name = "exports",
+            func = run_all_exports,
+            config_keys = ['tiles'],
+            inputs = [str(processed / name) for name in ["l0_grid.parquet", "l0_boundary.parquet", "l1_transport.parquet", "l1_transport_raw.parquet", "l2_poi"]],
+            outputs = [str(viz / "l0_grid.geojson"), str(maps / "layer0_map.html"), str(viz / "l1_transport.geojson"), str(maps / "layer1_map.html"), str(viz / "l2_poi.geojson"), str(maps / "layer2_map.html")],
+            deps = ["l0_grid", "l1_transport", "l2_poi"]
+        ),
+    ]
+
+
+def default_targets(steps: List[Step], config: Dict[str, Any]) -> List[str]:
+    """
+    Steps run when none are requested explicitly: all of them, except the opt-in exports unless exports.enabled is set.
+    """
+    export_enabled = config.get('exports', {}).get('enabled', False)
+    return [step.name for step in steps if export_enabled or step.name != "exports"]
+
+def state_path_for(config: Dict[str, Any]) -> Path:
+    """
+    Location of the pipeline state file (fingerprints of the last successful runs).
+    """
+    return Path(config['paths']['processed']) / config.get('pipeline', {}).get('state_file', ".pipeline_state.json")
+
+
+# === 4. MAIN PIPELINE ===
+
+def main_pipeline():
+    """
+    Runs all layer pipelines as one DAG. Steps whose config sections and inputs did not change since their last run are skipped,
+    independent steps (L0 grid, L1, L2, Airbnb) run concurrently. The exports step only runs when requested or enabled in settings.yaml.
+    """
+    parser = argparse.ArgumentParser(description="Run the layer pipelines, skipping fresh steps.")
+    parser.add_argument("steps", nargs="*", help="Steps to run (with their upstream steps). Defaults to all.")
+    parser.add_argument("--config", default="config/settings.yaml", help="Path to the settings file.")
+    parser.add_argument("--force", action="store_true", help="Re-run the selected steps even if fresh.")
+    parser.add_argument("--workers", type=int, default=None, help="Maximum number of steps running at the same time.")
+    args = parser.parse_args()
+
+    print("-> STARTING PIPELINE...")
+
+    config = load_config(args.config)
+    pipeline_cfg = config.get('pipeline', {})
+    state_path = state_path_for(config)
+
+    # one run log shared by all the worker processes
+    owns_run = start_run(config['paths']['logs'], run_name="pipeline")
+
+    # exports are a separate, opt-in stage
+    steps = build_steps(config)
+    targets = args.steps or default_targets(steps, config)
+
+    status = run_dag(
+        steps,
+        config,
+        state_path = state_path,
+        targets = targets,
+        force = args.force,
+        max_workers = args.workers or pipeline_cfg.get('max_workers', 4)
+    )
+
+    if owns_run:
+        print_summary()
+        end_run()
+
+    if any(s in ("failed", "blocked") for s in status.values()):
+        raise SystemExit(1)
+
+    print("-> PIPELINE COMPLETED.")
+
+
+if __name__ == "__main__":
+    main_pipeline()
@@ -0,0 +1,362 @@
+# src/accessibility.py
+
+# === 1. IMPORTS ===
+
+# general
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# third party (scipy and pyproj are imported inside the functions)
+import numpy as np
+import pandas as pd
+import h3
+
+# internal
+from src.config import load_config, file_fingerprint
+from src.hexes import cells_to_latlng
+from src.features import load_grid_cells
+from src.layer_io import read_points
+from src.instrument import instrumented, span, start_run, print_summary, end_run
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+# === 2. METRIC COORDINATES ===
+
+def to_metric(lons: np.ndarray, lats: np.ndarray, metric_crs: str) -> np.ndarray:
+    """
+    Projects (Lon, Lat) arrays to an (n, 2) array of metric coordinates in one pyproj call.
+    """
+    from pyproj import Transformer
+
+    x, y = Transformer.from_crs("EPSG:4326", metric_crs, always_xy=True).transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.column_stack([x, y])
+
+def grid_centroids(processed_dir: Path, metric_crs: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The L0 grid cells (sorted uint64) and their centres in the metric CRS.
+    """
+    cells = load_grid_cells(processed_dir)
+    lats, lons = cells_to_latlng(cells)
+    return cells, to_metric(lons, lats, metric_crs)
+
+
+# === 3. NEAREST-TRANSIT FEATURES ===
+
+def nearest_transit_features(
+    centroids: np.ndarray,
+    stops: np.ndarray,
+    mode: str,
+    k: int = 3,
+    radii_m: Sequence[float] = (500, 1000)
+) -> Dict[str, np.ndarray]:
+    """
+    Distances to the k nearest stops of one mode and stop counts within each radius, for every centroid at once.
+    Args:
+        centroids (np.ndarray): (n, 2) metric coordinates of the hexagon centres.
+        stops (np.ndarray): (m, 2) metric coordinates of the stops of the mode.
+        mode (str): Transport mode, used as the column prefix.
+        k (int): Number of nearest stops.
+        radii_m (Sequence[float]): Radii (in meters) of the stop counts.
+    Returns:
+        Dict[str, np.ndarray]: '{mode}_dist_{i}_m' (NaN when the mode has fewer than i stops) and '{mode}_count_{r}m' columns.
+    Logic:
+        1. Build one KD-tree over the stops.
+        2. One batch k-nearest query and one batch ball query per radius, over all the centroids (no per-cell loop).
+    """
+    from scipy.spatial import cKDTree
+
+    n = len(centroids)
+    columns: Dict[str, np.ndarray] = {}
+
+    if len(stops) == 0:
+        for i in range(1, k + 1):
+            columns[f"{mode}_dist_{i}_m"] = np.full(n, np.nan)
+        for radius in radii_m:
+            columns[f"{mode}_count_{int(radius)}m"] = np.zeros(n, dtype=np.int32)
+        return columns
+
+    tree = cKDTree(stops)
+    distances, _ = tree.query(centroids, k=k)
+    distances = distances.reshape(n, k)
+    distances[np.isinf(distances)] = np.nan # fewer than k stops
+    for i in range(k):
+        columns[f"{mode}_dist_{i + 1}_m"] = distances[:, i]
+
+    for radius in radii_m:
+        columns[f"{mode}_count_{int(radius)}m"] = tree.query_ball_point(centroids, r=radius, return_length=True).astype(np.int32)
+
+    return columns
+
+
+# === 4. ACCESSIBILITY PIPELINE ===
+
+@instrumented()
+def build_accessibility(config: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Builds the transit accessibility features of every L0 hexagon: distances to the nearest metro/train/tram stops and stop counts within radii.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+    Returns:
+        pd.DataFrame: One row per L0 hexagon indexed by h3_index (joinable with the feature matrices).
+    Logic:
+        1. Load the L0 cell centres and the Layer 1 stops (coordinates and mode only) and project them to the metric CRS.
+        2. Query a KD-tree per mode with all the centres at once (see nearest_transit_features).
+        3. Save the features as Parquet.
+    """
+    print("-> Starting transit accessibility features...")
+
+    if config is None:
+        config = load_config()
+    processed_dir = Path(config['paths']['processed'])
+    metric_crs = config['crs']['metric']
+    access_cfg = config.get('features', {}).get('accessibility', {})
+    modes: List[str] = access_cfg.get('modes', ['metro', 'train', 'tram'])
+    k = access_cfg.get('k', 3)
+    radii_m = access_cfg.get('radii_m', [500, 1000])
+
+    with span("accessibility.load") as record:
+        cells, centroids = grid_centroids(processed_dir, metric_crs)
+        stops_df = read_points(processed_dir / "l1_transport.parquet", columns=['type'])
+        stops_xy = to_metric(stops_df['lon'].to_numpy(), stops_df['lat'].to_numpy(), metric_crs)
+        record['rows_out'] = len(cells)
+    print(f"-> {len(cells)} hexagons, {len(stops_df)} transport stops.")
+
+    columns: Dict[str, np.ndarray] = {}
+    with span("accessibility.kdtree", rows_in=len(cells)) as record:
+        stop_modes = stops_df['type'].to_numpy()
+        for mode in modes:
+            mode_stops = stops_xy[stop_modes == mode]
+            print(f"-> Querying {len(mode_stops)} {mode} stops (k={k}, radii={radii_m} m)...")
+            columns.update(nearest_transit_features(centroids, mode_stops, mode, k=k, radii_m=radii_m))
+        record['rows_out'] = len(cells)
+
+    index = pd.Index([h3.int_to_str(int(cell)) for cell in cells], name="h3_index")
+    access_df = pd.DataFrame(columns, index=index)
+
+    out_path = processed_dir / "l3_transit_access.parquet"
+    access_df.to_parquet(out_path)
+    print(f"-> Saved transit accessibility features {access_df.shape} at: {out_path}")
+    return access_df
+
+
+# === 5. WALK NETWORK ===
+
+@dataclass
+class WalkGraph:
+    """
+    A street network as plain arrays: node coordinates (metric CRS) and symmetric edges (u, v, length in meters).
+    """
+    node_xy: np.ndarray # (n_nodes, 2)
+    u: np.ndarray # int32 edge sources
+    v: np.ndarray # int32 edge targets
+    length: np.ndarray # float64 edge lengths (m)
+    source: str = "" # key of the inputs the graph was built from (boundary + graph source)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, node_xy=self.node_xy, u=self.u, v=self.v, length=self.length, source=np.array(self.source))
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "WalkGraph":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(npz['node_xy'], npz['u'], npz['v'], npz['length'], str(npz['source']))
+
+    def csgraph(self, extra_nodes: int = 0, extra_edges: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None):
+        """
+        CSR adjacency matrix for scipy.sparse.csgraph, optionally with extra nodes and (directed) edges appended.
+        """
+        from scipy import sparse
+
+        u, v, length = self.u, self.v, self.length
+        if extra_edges is not None:
+            u, v, length = (np.concatenate([a, b]) for a, b in zip((u, v, length), extra_edges))
+        n = len(self.node_xy) + extra_nodes
+        # explicit zero-length edges are kept by csgraph (they are real edges)
+        return sparse.csr_matrix((length, (u, v)), shape=(n, n))
+
+def graph_to_arrays(graph: "nx.MultiDiGraph", metric_crs: str, source: str = "") -> WalkGraph:
+    """
+    Converts an OSMNX graph to a WalkGraph.
+    Logic:
+        1. Number the nodes and project their (x, y) lon/lat to the metric CRS.
+        2. Make the edges symmetric (walking ignores one-ways) and keep the shortest of parallel edges.
+    """
+    node_ids = list(graph.nodes)
+    position = {node: i for i, node in enumerate(node_ids)}
+    lons = np.fromiter((graph.nodes[node]['x'] for node in node_ids), dtype=float, count=len(node_ids))
+    lats = np.fromiter((graph.nodes[node]['y'] for node in node_ids), dtype=float, count=len(node_ids))
+
+    edges = np.array([(position[a], position[b], length) for a, b, length in graph.edges(data="length", default=0.0)], dtype=float).reshape(-1, 3)
+    u = np.concatenate([edges[:, 0], edges[:, 1]]).astype(np.int32)
+    v = np.concatenate([edges[:, 1], edges[:, 0]]).astype(np.int32)
+    length = np.concatenate([edges[:, 2], edges[:, 2]])
+
+    # shortest parallel edge: sort by (u, v, length) and keep the first of each pair
+    order = np.lexsort((length, v, u))
+    u, v, length = u[order], v[order], length[order]
+    first = np.ones(len(u), dtype=bool)
+    first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+
+    return WalkGraph(to_metric(lons, lats, metric_crs), u[first], v[first], length[first], source)
+
+@instrumented()
+def load_walk_graph(config: Dict[str, Any]) -> WalkGraph:
+    """
+    Loads the walking network of the buffered boundary, from the array cache when its inputs didn't change.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary (features.walk, paths, crs).
+    Returns:
+        WalkGraph: The network in the metric CRS.
+    Logic:
+        1. The cache key combines the boundary file content and the graph source (GraphML file or OSMNX network type).
+        2. On a miss, load the GraphML extract or download the network with OSMNX, convert it and save the arrays (.npz).
+    """
+    walk_cfg = config.get('features', {}).get('walk', {})
+    processed_dir = Path(config['paths']['processed'])
+    boundary_path = processed_dir / "l0_boundary.parquet"
+    if not boundary_path.exists():
+        raise FileNotFoundError(f"!! Buffered boundary not found at: {boundary_path}. Run Layer 0 first.")
+
+    graphml = walk_cfg.get('graphml')
+    network_type = walk_cfg.get('network_type', "walk")
+    source = f"{file_fingerprint(boundary_path)}|{file_fingerprint(graphml) if graphml else network_type}|{config['crs']['metric']}"
+    cache_path = Path(config['paths'].get('cache', "cache")) / "walk_graph.npz"
+
+    if cache_path.exists():
+        cached = WalkGraph.load(cache_path)
+        if cached.source == source:
+            print(f"-> Loaded cached walk network ({len(cached.node_xy)} nodes, {len(cached.u)} edges) from: {cache_path}")
+            return cached
+
+    import osmnx as ox
+
+    if graphml:
+        print(f"-> Loading walk network from GraphML: {graphml}...")
+        graph = ox.load_graphml(graphml)
+    else:
+        import geopandas as gpd
+
+        from src.utils import configure_osm_cache
+        configure_osm_cache(config['paths'].get('cache', "cache"))
+        print(f"-> Downloading '{network_type}' network of the buffered boundary from OSMNX...")
+        boundary = gpd.read_parquet(boundary_path).to_crs("EPSG:4326").union_all()
+        graph = ox.graph_from_polygon(boundary, network_type=network_type)
+
+    walk_graph = graph_to_arrays(graph, config['crs']['metric'], source)
+    walk_graph.save(cache_path)
+    print(f"-> Cached walk network ({len(walk_graph.node_xy)} nodes, {len(walk_graph.u)} edges) at: {cache_path}")
+    return walk_graph
+
+
+# === 6. WALKING-TIME FEATURES ===
+
+def nearest_stop_walk(
+    walk_graph: WalkGraph,
+    origins: np.ndarray,
+    stops: np.ndarray,
+    max_dist_m: Optional[float] = None
+) -> np.ndarray:
+    """
+    Walking distance from every origin to its nearest stop, with one shortest-path pass for all the stops.
+    Args:
+        walk_graph (WalkGraph): The street network.
+        origins (np.ndarray): (n, 2) metric coordinates (e.g. hexagon centres).
+        stops (np.ndarray): (m, 2) metric coordinates of the stops.
+        max_dist_m (Optional[float]): Search limit, farther origins get NaN.
+    Returns:
+        np.ndarray: Distances in meters (snap distance of the origin + network distance + snap distance of the stop).
+    Logic:
+        1. Snap origins and stops to their nearest network nodes with one KD-tree query each.
+        2. Add a virtual source node linked to every stop node by its snap distance, so a single Dijkstra from it
+        gives each node the distance to its nearest stop (multi-source shortest path).
+        3. Read the distance at each origin's node and add the origin's snap distance.
+    """
+    from scipy.spatial import cKDTree
+    from scipy.sparse.csgraph import dijkstra
+
+    if len(stops) == 0 or len(walk_graph.node_xy) == 0:
+        return np.full(len(origins), np.nan)
+
+    tree = cKDTree(walk_graph.node_xy)
+    origin_snap, origin_nodes = tree.query(origins)
+    stop_snap, stop_nodes = tree.query(stops)
+
+    # one edge per stop node (stops snapped to the same node keep the shortest snap, the CSR would sum duplicates)
+    stop_nodes, inverse = np.unique(stop_nodes, return_inverse=True)
+    snap = np.full(len(stop_nodes), np.inf)
+    np.minimum.at(snap, inverse, stop_snap)
+
+    n_nodes = len(walk_graph.node_xy)
+    super_source = np.full(len(stop_nodes), n_nodes, dtype=np.int32)
+    graph = walk_graph.csgraph(extra_nodes=1, extra_edges=(super_source, stop_nodes.astype(np.int32), snap))
+
+    node_dist = dijkstra(graph, directed=True, indices=n_nodes, limit=np.inf if max_dist_m is None else max_dist_m)
+    dist = node_dist[origin_nodes] + origin_snap
+    if max_dist_m is not None:
+        dist[dist > max_dist_m] = np.inf
+    dist[np.isinf(dist)] = np.nan
+    return dist
+
+@instrumented()
+def build_walk_access(config: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Builds the walking time from every L0 hexagon to the nearest metro/train/tram stop over the street network.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+    Returns:
+        pd.DataFrame: '{mode}_walk_min' columns, one row per L0 hexagon indexed by h3_index (NaN beyond features.walk.max_minutes).
+    Logic:
+        1. Load the walk network once (cached arrays, see load_walk_graph), the L0 cell centres and the Layer 1 stops.
+        2. One multi-source Dijkstra per mode (see nearest_stop_walk), converted to minutes at the configured walking speed.
+        3. Save the features as Parquet.
+    """
+    print("-> Starting walking-time accessibility features...")
+
+    if config is None:
+        config = load_config()
+    processed_dir = Path(config['paths']['processed'])
+    metric_crs = config['crs']['metric']
+    walk_cfg = config.get('features', {}).get('walk', {})
+    modes: List[str] = config.get('features', {}).get('accessibility', {}).get('modes', ['metro', 'train', 'tram'])
+    speed_m_min = walk_cfg.get('speed_kmh', 4.8) * 1000 / 60
+    max_minutes = walk_cfg.get('max_minutes', 30)
+
+    with span("walk_access.load") as record:
+        walk_graph = load_walk_graph(config)
+        cells, centroids = grid_centroids(processed_dir, metric_crs)
+        stops_df = read_points(processed_dir / "l1_transport.parquet", columns=['type'])
+        stops_xy = to_metric(stops_df['lon'].to_numpy(), stops_df['lat'].to_numpy(), metric_crs)
+        record['rows_out'] = len(cells)
+
+    columns: Dict[str, np.ndarray] = {}
+    with span("walk_access.dijkstra", rows_in=len(cells)) as record:
+        stop_modes = stops_df['type'].to_numpy()
+        for mode in modes:
+            mode_stops = stops_xy[stop_modes == mode]
+            print(f"-> Walking distances to {len(mode_stops)} {mode} stops (one multi-source pass)...")
+            dist = nearest_stop_walk(walk_graph, centroids, mode_stops, max_dist_m=max_minutes * speed_m_min if max_minutes else None)
+            columns[f"{mode}_walk_min"] = dist / speed_m_min
+        record['rows_out'] = len(cells)
+
+    index = pd.Index([h3.int_to_str(int(cell)) for cell in cells], name="h3_index")
+    walk_df = pd.DataFrame(columns, index=index)
+
+    out_path = processed_dir / "l3_transit_walk.parquet"
+    walk_df.to_parquet(out_path)
+    print(f"-> Saved walking-time features {walk_df.shape} at: {out_path}")
+    return walk_df
+
+
+if __name__ == '__main__':
+    config = load_config()
+    owns_run = start_run(config['paths']['logs'], run_name="accessibility")
+    build_accessibility(config)
+    build_walk_access(config)
+    if owns_run:
+        print_summary()
+        end_run()
@@ -0,0 +1,102 @@
+# src/batch.py
+
+# === 1. IMPORTS ===
+
+# general
+import copy
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+# === 2. CITY PROFILES ===
+
+# paths shared by every city (raw inputs and the OSM cache), all the others are namespaced per city
+SHARED_PATHS = ('raw', 'cache')
+
+def city_slug(city_name: str) -> str:
+    """
+    Builds a filesystem-friendly slug from a city name, e.g. "Milan, Italy" -> "milan".
+    """
+    return re.sub(r"[^a-z0-9]+", "_", city_name.split(",")[0].strip().lower()).strip("_")
+
+def city_config(base_config: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Derives the configuration of one city from the base settings and a city profile.
+    Args:
+        base_config (Dict[str, Any]): The base configuration (settings.yaml).
+        profile (Dict[str, Any]): City profile with 'city_name' and optionally 'slug', 'metric_crs', 'buffer_dist_m', 'airbnb_filename'.
+    Returns:
+        Dict[str, Any]: A new configuration for the city, with its outputs namespaced under <path>/<slug>.
+    """
+    if 'city_name' not in profile:
+        raise ValueError(f"!! City profile without 'city_name': {profile}")
+
+    config = copy.deepcopy(base_config)
+    slug = profile.get('slug') or city_slug(profile['city_name'])
+
+    config['project']['city_name'] = profile['city_name']
+    config['project']['slug'] = slug
+    if 'metric_crs' in profile:
+        config['crs']['metric'] = profile['metric_crs']
+    if 'buffer_dist_m' in profile:
+        config['grid']['buffer_dist_m'] = profile['buffer_dist_m']
+    if 'airbnb_filename' in profile:
+        config['data_sources']['inside_airbnb']['filename'] = profile['airbnb_filename']
+
+    # namespace outputs per city, keep shared inputs/cache where they are
+    config['paths'] = {
+        key: value if key in SHARED_PATHS else str(Path(value) / slug)
+        for key, value in config['paths'].items()
+    }
+    return config
+
+
+# === 3. BATCH RUNNER ===
+
+def run_batch(
+    base_config: Dict[str, Any],
+    run_city: Callable[[Dict[str, Any]], Any],
+    profiles: Optional[List[Dict[str, Any]]] = None,
+    max_workers: Optional[int] = None
+) -> Dict[str, str]:
+    """
+    Runs the same pipeline for several cities in a process pool with bounded concurrency.
+    Args:
+        base_config (Dict[str, Any]): The base configuration (settings.yaml).
+        run_city (Callable[[Dict[str, Any]], Any]): Top-level (picklable) function running the pipeline for one city config.
+        profiles (Optional[List[Dict[str, Any]]]): City profiles. Defaults to batch.cities in settings.yaml.
+        max_workers (Optional[int]): Cities processed at the same time. Defaults to batch.max_workers.
+    Returns:
+        Dict[str, str]: Status per city slug ("ok" or the error message).
+    """
+    batch_cfg = base_config.get('batch', {})
+    profiles = profiles if profiles is not None else batch_cfg.get('cities', [])
+    if not profiles:
+        raise ValueError("!! No city profiles given (batch.cities in settings.yaml is empty).")
+
+    configs = [city_config(base_config, profile) for profile in profiles]
+    slugs = [config['project']['slug'] for config in configs]
+    if len(set(slugs)) != len(slugs):
+        raise ValueError(f"!! Duplicate city slugs in batch: {slugs}")
+
+    workers = max_workers or batch_cfg.get('max_workers', 2)
+    print(f"-> Running batch for {len(configs)} cities ({workers} at a time): {slugs}")
+
+    status: Dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_city, config): config['project']['slug'] for config in configs}
+        for future in as_completed(futures):
+            slug = futures[future]
+            try:
+                future.result()
+                status[slug] = "ok"
+                print(f"-> City {slug} completed.")
+            except Exception as e:
+                # one failing city must not stop the others
+                status[slug] = f"failed: {e!r}"
+                print(f"!! City {slug} failed: {e!r}")
+
+    print(f"-> Batch finished: {status}")
+    return status
@@ -0,0 +1,158 @@
+# src/cluster_shapes.py
+
+# === 1. IMPORTS ===
+
+# general
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+# third party (geopandas and shapely are imported inside the functions)
+import numpy as np
+import pandas as pd
+import h3
+
+# internal
+from src.config import load_config
+from src.instrument import instrumented, span, start_run, print_summary, end_run
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+
+# === 2. H3 OUTLINES ===
+
+def _cells_to_patches(cells: Sequence[str]) -> List[Tuple[Any, int, List[str]]]:
+    """
+    Contiguous patches of a set of same-resolution cells: one (polygon, number of cells, compacted cells) tuple per patch.
+    Logic:
+        1. cells_to_h3shape traces the outer ring and holes of every connected set of cells (no polygon union).
+        2. Each cell belongs to the patch holding its centre (patches are disjoint), queried at once with an STRtree.
+        3. The cells of each patch are compacted (children replaced by their parent when all 7 are in), an exact and
+        small membership list kept next to the outline.
+    """
+    import shapely
+    from shapely.geometry import shape
+
+    outline = shape(h3.cells_to_h3shape(cells).__geo_interface__)
+    patches = list(outline.geoms) if outline.geom_type == "MultiPolygon" else [outline]
+
+    centres = np.array([h3.cell_to_latlng(cell) for cell in cells], dtype=float).reshape(-1, 2)
+    cell_idx, patch_idx = shapely.STRtree(patches).query(shapely.points(centres[:, 1], centres[:, 0]), predicate="intersects")
+    cells = np.asarray(cells, dtype=object)
+    members = [cells[cell_idx[patch_idx == i]].tolist() for i in range(len(patches))]
+    return [(patch, len(patch_cells), h3.compact_cells(patch_cells)) for patch, patch_cells in zip(patches, members)]
+
+def _cluster_job(clusters: List[Any], cell_sets: List[List[str]]) -> List[Tuple[Any, Any, int, List[str]]]:
+    # one worker call per batch of clusters (runs in the worker processes)
+    return [(cluster, *patch) for cluster, cells in zip(clusters, cell_sets) for patch in _cells_to_patches(cells)]
+
+@instrumented()
+def cluster_outlines(
+    h3_cells: Sequence[str],
+    labels: Sequence[Any],
+    per_patch: bool = True,
+    workers: int = 1
+) -> "gpd.GeoDataFrame":
+    """
+    Outlines of the clusters of a hexagon labelling, traced from the H3 cell sets instead of a polygon dissolve.
+    Args:
+        h3_cells (Sequence[str]): Labelled hexagons (same resolution).
+        labels (Sequence[Any]): Cluster of every hexagon (missing labels are skipped).
+        per_patch (bool): One row per contiguous patch of a cluster (True) or one MultiPolygon per cluster (False).
+        workers (int): Processes tracing the clusters (1 = serial, in this process).
+    Returns:
+        gpd.GeoDataFrame: cluster, patch, n_cells, cells (compacted H3 cells of the row) and geometry, in EPSG:4326.
+    """
+    import geopandas as gpd
+    import shapely
+
+    labelled = pd.DataFrame({'h3_index': np.asarray(h3_cells, dtype=object), 'cluster': np.asarray(labels, dtype=object)}).dropna()
+    groups = labelled.groupby('cluster', sort=True)['h3_index']
+    clusters = list(groups.groups)
+    cell_sets = [groups.get_group(cluster).tolist() for cluster in clusters]
+    print(f"-> Tracing the outlines of {len(clusters)} clusters ({len(labelled)} hexagons) with {workers} workers...")
+
+    if workers <= 1 or len(clusters) <= 1:
+        rows = _cluster_job(clusters, cell_sets)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # round-robin batches, so the large clusters are spread over the workers
+        batches = [(clusters[i::workers], cell_sets[i::workers]) for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_cluster_job, *batch) for batch in batches if batch[0]]
+            rows = [row for future in futures for row in future.result()]
+
+    outlines = pd.DataFrame(rows, columns=['cluster', 'geometry', 'n_cells', 'cells'])
+    outlines = outlines.sort_values('cluster', kind="stable").reset_index(drop=True)
+
+    if per_patch:
+        outlines['patch'] = outlines.groupby('cluster').cumcount()
+    else:
+        # patches of a cluster as one MultiPolygon (patch = -1)
+        merged = outlines.groupby('cluster', sort=True)['geometry'].agg(lambda geoms: shapely.MultiPolygon(list(geoms)))
+        outlines = pd.DataFrame({
+            'cluster': clusters,
+            'patch': -1,
+            'n_cells': [len(cells) for cells in cell_sets],
+            'cells': [h3.compact_cells(cells) for cells in cell_sets],
+            'geometry': merged.loc[clusters].to_numpy()
+        })
+
+    print(f"-> Traced {len(outlines)} outlines.")
+    return gpd.GeoDataFrame(outlines[['cluster', 'patch', 'n_cells', 'cells', 'geometry']], geometry='geometry', crs="EPSG:4326")
+
+
+# === 3. CLUSTER SHAPES EXPORT ===
+
+@instrumented()
+def export_cluster_shapes(config: Optional[Dict[str, Any]] = None, labels_path: Optional[Path] = None) -> "gpd.GeoDataFrame":
+    """
+    Writes the cluster outlines as GeoParquet (with the compacted cells) and as a small GeoJSON for the Folium maps.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+        labels_path (Optional[Path]): Hexagon labels (h3_index index or column, plus the label column). Defaults to clusters.shapes.labels.
+    Returns:
+        gpd.GeoDataFrame: The outlines (see cluster_outlines).
+    """
+    if config is None:
+        config = load_config()
+    paths = config['paths']
+    shapes_cfg = config.get('clusters', {}).get('shapes', {})
+    column = shapes_cfg.get('column', "cluster")
+
+    labels_path = Path(labels_path or Path(paths['processed']) / shapes_cfg.get('labels', "l4_clusters.parquet"))
+    if not labels_path.exists():
+        raise FileNotFoundError(f"!! Cluster labels not found at: {labels_path}. Run the clustering first.")
+
+    with span("cluster_shapes.load") as record:
+        labels = pd.read_parquet(labels_path)
+        labels = labels.reset_index() if 'h3_index' not in labels.columns else labels
+        if column not in labels.columns:
+            raise ValueError(f"!! No column {column} in {labels_path}. Available columns: {list(labels.columns)}.")
+        record['rows_out'] = len(labels)
+
+    outlines = cluster_outlines(
+        labels['h3_index'].astype(str).to_numpy(),
+        labels[column].to_numpy(),
+        per_patch = shapes_cfg.get('per_patch', True),
+        workers = shapes_cfg.get('workers', 1)
+    )
+
+    parquet_path = Path(paths['processed']) / "l4_cluster_shapes.parquet"
+    geojson_path = Path(paths['viz']) / "l4_cluster_shapes.geojson"
+    geojson_path.parent.mkdir(parents=True, exist_ok=True)
+    with span("cluster_shapes.save", rows_in=len(outlines)):
+        outlines.to_parquet(parquet_path)
+        outlines.drop(columns='cells').to_file(geojson_path, driver="GeoJSON")
+    print(f"-> Saved cluster outlines at: {parquet_path} and {geojson_path}")
+    return outlines
+
+
+if __name__ == '__main__':
+    config = load_config()
+    owns_run = start_run(config['paths']['logs'], run_name="cluster_shapes")
+    export_cluster_shapes(config)
+    if owns_run:
+        print_summary()
+        end_run()
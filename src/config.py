@@ -0,0 +1,89 @@
+# src/config.py
+
+# === 1. IMPORTS ===
+
+# general
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# third party
+import yaml
+
+
+# === 2. CONFIGURATION UTILS ===
+
+def load_config(config_path: Union[str, Path] = "config/settings.yaml") -> Dict[str, Any]:
+    """
+    Loads the project configuration from a YAML file.
+    Args:
+        config_path (Union[str, Path]): Path to the YAML file containing the settings.
+    Returns:
+        Dict[str, Any]: The configuration dictionary.
+    """
+    # convert string to Path object
+    path_obj = Path(config_path)
+
+    # check if file exists
+    if not path_obj.exists():
+        raise FileNotFoundError(f"!! Config file not found at: {config_path}")
+    
+    # load the YAML file
+    with open(path_obj, "r") as f:
+        config = yaml.safe_load(f)
+    
+    return config
+
+def get_config_value(config: Dict[str, Any], key: str) -> Any:
+    """
+    Reads a (possibly nested) value from the configuration using a dotted key, e.g. "grid.buffer_dist_m".
+    Args:
+        config (Dict[str, Any]): The configuration dictionary.
+        key (str): Dotted path of the value.
+    Returns:
+        Any: The value, or None if any part of the path is missing.
+    """
+    value = config
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def config_fingerprint(config: Dict[str, Any], keys: List[str]) -> str:
+    """
+    Computes a stable hash of the selected config sections, so a step can tell whether its settings changed.
+    Args:
+        config (Dict[str, Any]): The configuration dictionary.
+        keys (List[str]): Dotted keys of the sections the step depends on.
+    Returns:
+        str: SHA-256 hex digest of the selected sections.
+    """
+    selected = {key: get_config_value(config, key) for key in sorted(keys)}
+    payload = json.dumps(selected, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def file_fingerprint(path: Union[str, Path], chunk_size: int = 1 << 20) -> Optional[str]:
+    """
+    Computes the SHA-256 of a file's content (None if the file doesn't exist).
+    For a directory (e.g. a partitioned dataset) the relative paths and contents of all of its files are hashed.
+    Args:
+        path (Union[str, Path]): Path of the file or directory.
+        chunk_size (int): Read size in bytes.
+    Returns:
+        Optional[str]: Hex digest of the file content.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for file_path in files:
+        if path.is_dir():
+            digest.update(file_path.relative_to(path).as_posix().encode())
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,282 @@
+# src/crosswalk.py
+
+# === 1. IMPORTS ===
+
+# general
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+# third party (geopandas, shapely and scipy are imported inside the functions)
+import numpy as np
+import pandas as pd
+import h3
+
+# internal
+from src.config import load_config, file_fingerprint
+from src.hexes import cells_to_int
+from src.feature_store import SparseFeatures, load_sparse_features
+from src.instrument import instrumented, span, start_run, print_summary, end_run
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+
+# === 2. CROSSWALK ===
+
+@dataclass
+class Crosswalk:
+    """
+    Area weights between the L0 grid and a set of admin units (e.g. Milan's NIL or municipi), as a sparse (units x grid cells) matrix:
+    entry (u, h) is the share of hexagon h's area inside unit u. Columns follow the sorted uint64 grid (see load_grid_cells),
+    so grid-aligned features roll up without any join.
+    """
+    h3: np.ndarray # sorted uint64 H3 cells of the grid
+    unit_ids: np.ndarray # unit ids (strings)
+    unit: np.ndarray # int32 row (unit) of every weight
+    cell: np.ndarray # int32 column (grid cell) of every weight
+    area_fraction: np.ndarray # float64 share of the cell's area inside the unit
+    source: str = "" # key of the inputs the crosswalk was built from (grid + units + CRS)
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            path,
+            h3 = self.h3,
+            unit_ids = self.unit_ids.astype(str),
+            unit = self.unit,
+            cell = self.cell,
+            area_fraction = self.area_fraction,
+            source = np.array(self.source)
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Crosswalk":
+        with np.load(path, allow_pickle=False) as npz:
+            return cls(npz['h3'], npz['unit_ids'], npz['unit'], npz['cell'], npz['area_fraction'], str(npz['source']))
+
+    def matrix(self):
+        """
+        CSR weights (n_units, n_grid_cells).
+        """
+        from scipy import sparse
+
+        return sparse.csr_matrix((self.area_fraction, (self.unit, self.cell)), shape=(len(self.unit_ids), len(self.h3)))
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        The crosswalk table: h3_index, unit_id, area_fraction.
+        """
+        return pd.DataFrame({
+            'h3_index': [h3.int_to_str(int(c)) for c in self.h3[self.cell]],
+            'unit_id': self.unit_ids[self.unit],
+            'area_fraction': self.area_fraction
+        })
+
+    def align(self, values: Union[pd.Series, pd.DataFrame]) -> np.ndarray:
+        """
+        Per-hexagon values indexed by h3_index (hex strings or uint64) as a grid-aligned (n_grid_cells, n_columns) array,
+        NaN for the grid cells without a value (hexagons outside the grid are ignored).
+        """
+        frame = values.to_frame() if isinstance(values, pd.Series) else values
+        cells = cells_to_int(frame.index)
+        rows = np.searchsorted(self.h3, cells)
+        in_grid = self.h3[np.minimum(rows, len(self.h3) - 1)] == cells
+        aligned = np.full((len(self.h3), frame.shape[1]), np.nan)
+        aligned[rows[in_grid]] = frame.to_numpy(dtype=float)[in_grid]
+        return aligned
+
+    def rollup(self, values: Union[pd.Series, pd.DataFrame, SparseFeatures], how: str = "sum") -> pd.DataFrame:
+        """
+        Rolls per-hexagon metrics up to the units with sparse products (no overlay).
+        Args:
+            values (Union[pd.Series, pd.DataFrame, SparseFeatures]): Metrics indexed by h3_index, or grid-aligned sparse features.
+            how (str): "sum" for counts (each hexagon split by area) or "mean" for intensive values
+            (area-weighted mean of the hexagons with a value, NaN ignored).
+        Returns:
+            pd.DataFrame: One row per unit (indexed by unit_id), one column per metric.
+        """
+        if how not in ("sum", "mean"):
+            raise ValueError(f"!! Unknown rollup: {how}. Choose from ['sum', 'mean'].")
+        weights = self.matrix()
+
+        if isinstance(values, SparseFeatures):
+            if len(values.h3) != len(self.h3) or not np.array_equal(values.h3, self.h3):
+                raise ValueError("!! The sparse features are not aligned to the crosswalk grid. Rebuild the crosswalk or the features.")
+            columns = values.columns
+            totals = np.asarray((weights @ values.matrix).todense(), dtype=float)
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    totals = totals / np.asarray(weights.sum(axis=1)) # empty hexagons are zero rows, not missing values
+        else:
+            columns = [values.name] if isinstance(values, pd.Series) else list(values.columns)
+            aligned = self.align(values)
+            present = ~np.isnan(aligned)
+            totals = weights @ np.where(present, aligned, 0.0)
+            if how == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    totals = totals / (weights @ present.astype(float))
+
+        return pd.DataFrame(totals, index=pd.Index(self.unit_ids, name="unit_id"), columns=columns)
+
+@instrumented()
+def build_crosswalk(
+    grid_gdf: "gpd.GeoDataFrame",
+    units_gdf: "gpd.GeoDataFrame",
+    id_column: str,
+    metric_crs: str,
+    source: str = ""
+) -> Crosswalk:
+    """
+    Overlays the grid hexagons with the admin units once.
+    Args:
+        grid_gdf (gpd.GeoDataFrame): L0 grid (h3_index, geometry).
+        units_gdf (gpd.GeoDataFrame): Admin units (id_column, geometry).
+        id_column (str): Unit id column.
+        metric_crs (str): Local metric system (areas are measured there).
+        source (str): Cache key stored with the crosswalk.
+    Returns:
+        Crosswalk: The area weights.
+    Logic:
+        1. One STRtree query of all the hexagons against the units gives the candidate (hexagon, unit) pairs.
+        2. Hexagons with a single candidate that covers them get weight 1 without any intersection (most of them).
+        3. The remaining (border) pairs are intersected in one vectorised call, weights = intersection area / hexagon area.
+    """
+    import shapely
+
+    if id_column not in units_gdf.columns:
+        raise ValueError(f"!! No column {id_column} in the admin units. Available columns: {list(units_gdf.columns)}.")
+
+    cells = cells_to_int(grid_gdf['h3_index'])
+    order = np.argsort(cells, kind="stable")
+    cells = cells[order]
+    hexes = grid_gdf.geometry.to_crs(metric_crs).values[order]
+    units = units_gdf.geometry.to_crs(metric_crs).values
+    unit_ids = units_gdf[id_column].astype(str).to_numpy()
+
+    cell_idx, unit_idx = shapely.STRtree(units).query(hexes, predicate="intersects")
+    candidates = np.bincount(cell_idx, minlength=len(cells))
+    single = candidates[cell_idx] == 1
+    inside = np.zeros(len(cell_idx), dtype=bool)
+    inside[single] = shapely.covers(units[unit_idx[single]], hexes[cell_idx[single]])
+
+    fraction = np.ones(len(cell_idx))
+    border = ~inside
+    fraction[border] = shapely.area(shapely.intersection(hexes[cell_idx[border]], units[unit_idx[border]])) / shapely.area(hexes[cell_idx[border]])
+    keep = fraction > 1e-9
+
+    print(f"-> Crosswalk: {len(cells)} hexagons x {len(unit_ids)} units, {int(inside.sum())} hexagons inside one unit, {int(border.sum())} border pairs intersected.")
+    return Crosswalk(
+        h3 = cells,
+        unit_ids = unit_ids,
+        unit = unit_idx[keep].astype(np.int32),
+        cell = cell_idx[keep].astype(np.int32),
+        area_fraction = fraction[keep],
+        source = source
+    )
+
+def load_crosswalk(config: Dict[str, Any], unit: str) -> Crosswalk:
+    """
+    Crosswalk between the L0 grid and one set of admin units of settings.yaml (crosswalk.units), from the cache when its inputs didn't change.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary (crosswalk, paths, crs, grid.resolution).
+        unit (str): Unit set name (e.g. "nil", "municipio").
+    Returns:
+        Crosswalk: The area weights.
+    """
+    units_cfg = config.get('crosswalk', {}).get('units', {})
+    if unit not in units_cfg:
+        raise ValueError(f"!! Unknown admin units: {unit}. Choose from {list(units_cfg)}.")
+    unit_cfg = units_cfg[unit]
+
+    grid_path = Path(config['paths']['processed']) / "l0_grid.parquet"
+    units_path = Path(config['paths']['raw']) / unit_cfg['path']
+    for path, hint in ((grid_path, "Run Layer 0 first."), (units_path, f"Download the {unit} boundaries first.")):
+        if not path.exists():
+            raise FileNotFoundError(f"!! Crosswalk input not found at: {path}. {hint}")
+
+    # one cache per grid resolution and unit set, rebuilt when the grid, the boundaries or the CRS change
+    resolution = config['grid']['resolution']
+    source = f"{file_fingerprint(grid_path)}|{file_fingerprint(units_path)}|{unit_cfg['id_column']}|{config['crs']['metric']}"
+    cache_path = Path(config['paths'].get('cache', "cache")) / f"crosswalk_{unit}_r{resolution}.npz"
+    if cache_path.exists():
+        cached = Crosswalk.load(cache_path)
+        if cached.source == source:
+            print(f"-> Loaded cached {unit} crosswalk ({len(cached.area_fraction)} weights) from: {cache_path}")
+            return cached
+
+    import geopandas as gpd
+
+    with span("crosswalk.build") as record:
+        grid_gdf = gpd.read_parquet(grid_path)
+        units_gdf = gpd.read_parquet(units_path) if units_path.suffix == ".parquet" else gpd.read_file(units_path)
+        crosswalk = build_crosswalk(grid_gdf, units_gdf, unit_cfg['id_column'], config['crs']['metric'], source)
+        record['rows_out'] = len(crosswalk.area_fraction)
+    crosswalk.save(cache_path)
+    print(f"-> Cached {unit} crosswalk at: {cache_path}")
+    return crosswalk
+
+
+# === 3. ROLLUPS ===
+
+@instrumented()
+def build_rollups(config: Optional[Dict[str, Any]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Rolls the hexagon outputs up to every admin unit set of settings.yaml and saves one table per unit set.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+    Returns:
+        Dict[str, pd.DataFrame]: Unit set name -> rollup (indexed by unit_id).
+    Logic:
+        1. Load (or build) the crosswalk of each unit set.
+        2. Raw feature counts (build_features) are summed, Airbnb listings summed and prices averaged (process_str_data, price surface).
+        3. Save rollup_<unit>.parquet and the crosswalk table crosswalk_<unit>.parquet in paths.processed.
+    """
+    if config is None:
+        config = load_config()
+    processed_dir = Path(config['paths']['processed'])
+
+    rollups = {}
+    for unit in config.get('crosswalk', {}).get('units', {}):
+        crosswalk = load_crosswalk(config, unit)
+        parts = []
+
+        with span(f"crosswalk.rollup_{unit}") as record:
+            features_path = processed_dir / "l3_features_raw_sparse.npz"
+            if features_path.exists():
+                parts.append(crosswalk.rollup(load_sparse_features(features_path), how="sum"))
+
+            airbnb_path = processed_dir / "insideairbnb_h3.parquet"
+            if airbnb_path.exists():
+                airbnb = pd.read_parquet(airbnb_path, columns=['h3_index', 'listings_count', 'avg_price_pp']).set_index('h3_index')
+                parts.append(crosswalk.rollup(airbnb[['listings_count']], how="sum"))
+                parts.append(crosswalk.rollup(airbnb[['avg_price_pp']], how="mean"))
+
+            surface_path = processed_dir / "insideairbnb_price_surface.parquet"
+            if surface_path.exists():
+                surface = pd.read_parquet(surface_path, columns=['avg_price_pp'])
+                parts.append(crosswalk.rollup(surface['avg_price_pp'].rename('surface_price_pp'), how="mean"))
+            record['rows_out'] = len(crosswalk.unit_ids)
+
+        if not parts:
+            print(f"!! No hexagon outputs to roll up to {unit}. Run build_features or process_str_data first.")
+            continue
+
+        rollup = pd.concat(parts, axis=1)
+        rollup.to_parquet(processed_dir / f"rollup_{unit}.parquet")
+        crosswalk.to_frame().to_parquet(processed_dir / f"crosswalk_{unit}.parquet", index=False)
+        print(f"-> Saved {unit} rollup ({rollup.shape[0]} units x {rollup.shape[1]} metrics) at: {processed_dir / f'rollup_{unit}.parquet'}")
+        rollups[unit] = rollup
+
+    return rollups
+
+
+if __name__ == '__main__':
+    config = load_config()
+    owns_run = start_run(config['paths']['logs'], run_name="crosswalk")
+    build_rollups(config)
+    if owns_run:
+        print_summary()
+        end_run()
@@ -0,0 +1,399 @@
+# src/entities.py
+
+# === 1. IMPORTS ===
+
+# general
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+# third party (geopandas and scipy are imported inside the functions)
+import numpy as np
+import pandas as pd
+
+# internal
+from src.utils import deduplicate_points, member_keys
+from src.schema import compact_frame
+from src.instrument import instrumented
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+
+# === 2. DEDUPLICATION STATE ===
+
+MEMBER_COLUMNS = ['member', 'x', 'y', 'name', 'sub_category', 'entity_id']
+ENTITY_COLUMNS = ['entity_id', 'name', 'sub_category', 'node_count', 'lon', 'lat']
+
+class DedupState:
+    """
+    The last deduplication of a point set: its member points (metric coordinates and attributes) with their entity,
+    the entities themselves and the parameters they were computed with. Stored as two Parquet files and a JSON file.
+    """
+
+    def __init__(self, members: pd.DataFrame, entities: pd.DataFrame, params: Dict[str, Any]):
+        self.members = members
+        self.entities = entities
+        self.params = params
+
+    @classmethod
+    def load(cls, state_dir: Union[str, Path]) -> Optional["DedupState"]:
+        state_dir = Path(state_dir)
+        paths = [state_dir / "members.parquet", state_dir / "entities.parquet", state_dir / "params.json"]
+        if not all(path.exists() for path in paths):
+            return None
+        return cls(pd.read_parquet(paths[0]), pd.read_parquet(paths[1]), json.loads(paths[2].read_text()))
+
+    def save(self, state_dir: Union[str, Path]) -> None:
+        # params last: an interrupted save leaves a state that fails the params check and triggers a full run
+        state_dir = Path(state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        (state_dir / "params.json").unlink(missing_ok=True)
+        self.members[MEMBER_COLUMNS].to_parquet(state_dir / "members.parquet", index=False)
+        self.entities[ENTITY_COLUMNS].to_parquet(state_dir / "entities.parquet", index=False)
+        (state_dir / "params.json").write_text(json.dumps(self.params, sort_keys=True))
+
+def _member_frame(points_gdf: "gpd.GeoDataFrame", metric_crs: str) -> pd.DataFrame:
+    """
+    Members of a point set in input order: OSM key, metric coordinates, name and sub-category.
+    """
+    metric = points_gdf.geometry.to_crs(metric_crs)
+    return pd.DataFrame({
+        'member': member_keys(points_gdf),
+        'x': metric.x.to_numpy(),
+        'y': metric.y.to_numpy(),
+        'name': points_gdf['name'].astype(object).to_numpy(),
+        'sub_category': points_gdf['sub_category'].astype(object).to_numpy() if 'sub_category' in points_gdf else "unknown"
+    })
+
+def _entities_frame(entities_gdf: "gpd.GeoDataFrame") -> pd.DataFrame:
+    return pd.DataFrame({
+        'entity_id': entities_gdf['entity_id'].to_numpy(),
+        'name': entities_gdf['name'].to_numpy(),
+        'sub_category': entities_gdf['sub_category'].to_numpy(),
+        'node_count': entities_gdf['node_count'].to_numpy(),
+        'lon': entities_gdf.geometry.x.to_numpy(),
+        'lat': entities_gdf.geometry.y.to_numpy()
+    })
+
+def _to_points(entities: pd.DataFrame, members: pd.DataFrame, eps: float) -> "gpd.GeoDataFrame":
+    """
+    Entities as the GeoDataFrame deduplicate_points returns, in the same order: spatial clusters by the input position
+    of their first point (DBSCAN label order), then the entities of a cluster by the position of their first member.
+    """
+    import geopandas as gpd
+    from scipy import sparse
+    from scipy.spatial import cKDTree
+    from scipy.sparse.csgraph import connected_components
+
+    # eps-graph components = DBSCAN (min_samples=1) clusters, only used for ordering
+    members = members.reset_index(drop=True)
+    pairs = cKDTree(members[['x', 'y']].to_numpy()).query_pairs(r=eps, output_type="ndarray") if len(members) else np.empty((0, 2), dtype=np.int64)
+    graph = sparse.coo_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(len(members), len(members)))
+    _, labels = connected_components(graph, directed=False)
+    positions = np.arange(len(members))
+    cluster_first = pd.Series(positions).groupby(labels).min().to_numpy()[labels]
+
+    order = pd.DataFrame({'entity_id': members['entity_id'], 'cluster': cluster_first, 'first': positions}).groupby('entity_id')[['cluster', 'first']].min()
+    entities = entities.join(order, on='entity_id').sort_values(['cluster', 'first'], kind="stable")
+    return compact_frame(gpd.GeoDataFrame(
+        {
+            'name': entities['name'].to_numpy(),
+            'sub_category': entities['sub_category'].to_numpy(),
+            'node_count': entities['node_count'].to_numpy(),
+            'entity_id': entities['entity_id'].to_numpy()
+        },
+        geometry = gpd.points_from_xy(entities['lon'], entities['lat']),
+        crs = "EPSG:4326"
+    )[['name', 'geometry', 'sub_category', 'node_count', 'entity_id']])
+
+
+# === 3. LOCALIZED RE-DEDUPLICATION ===
+
+def _eps_closure(xy: np.ndarray, seeds: np.ndarray, eps: float) -> np.ndarray:
+    """
+    Every point connected to the seeds by hops of at most eps (the DBSCAN min_samples=1 clusters holding them),
+    expanded breadth-first so the work is proportional to the size of those clusters.
+    """
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(xy)
+    visited = np.zeros(len(xy), dtype=bool)
+    frontier = np.unique(seeds)
+    while len(frontier):
+        visited[frontier] = True
+        neighbours = tree.query_ball_point(xy[frontier], r=eps)
+        found = np.unique(np.concatenate([np.asarray(n, dtype=np.int64) for n in neighbours])) if len(neighbours) else np.empty(0, dtype=np.int64)
+        frontier = found[~visited[found]]
+    return np.flatnonzero(visited)
+
+@instrumented()
+def incremental_deduplicate(
+    points_gdf: "gpd.GeoDataFrame",
+    state_dir: Union[str, Path],
+    distance_threshold_m: float,
+    metric_crs: str,
+    similarity_threshold: float = 0.6,
+    semantic_clustering: bool = True
+) -> "gpd.GeoDataFrame":
+    """
+    deduplicate_points with a persisted state: only the clusters within eps of added, removed, moved or renamed points are recomputed.
+    Args:
+        points_gdf (gpd.GeoDataFrame): Points indexed by (element, id) (see fetch_points).
+        state_dir (Union[str, Path]): Folder of the DedupState of this point set.
+        distance_threshold_m (float): Distance threshold in meters for spatial clustering (eps).
+        metric_crs (str): Local metric system.
+        similarity_threshold (float): Similarity threshold for semantic clustering.
+        semantic_clustering (bool): Whether to perform semantic clustering after spatial clustering.
+    Returns:
+        gpd.GeoDataFrame: Same rows, order and entity ids as deduplicate_points on the whole set.
+    Logic:
+        1. No state (or other parameters): full deduplicate_points, then save the state.
+        2. Diff the members against the state by OSM key: added or edited points are seeds, and so are the points
+        within eps of the old position of removed or edited ones (their old clusters may split).
+        3. With min_samples=1 the DBSCAN clusters are the connected components of the eps-graph, so the clusters holding
+        the seeds are found by expanding from them only (see _eps_closure) and re-deduplicated on their own.
+        4. Every other entity is kept as stored, with the same id (ids are derived from the member OSM keys).
+    """
+    state_dir = Path(state_dir)
+    params = {
+        'distance_threshold_m': distance_threshold_m,
+        'metric_crs': metric_crs,
+        'similarity_threshold': similarity_threshold,
+        'semantic_clustering': semantic_clustering
+    }
+    new = _member_frame(points_gdf, metric_crs)
+    state = DedupState.load(state_dir)
+
+    def dedup(points: "gpd.GeoDataFrame"):
+        return deduplicate_points(points, distance_threshold_m, metric_crs, similarity_threshold, semantic_clustering, return_members=True)
+
+    if state is None or state.params != params:
+        print(f"-> No deduplication state for these parameters at {state_dir}, deduplicating all {len(new)} points...")
+        entities_gdf, mapping = dedup(points_gdf)
+        members = new.assign(entity_id=new['member'].map(mapping.set_index('member')['entity_id']).to_numpy())
+        DedupState(members, _entities_frame(entities_gdf), params).save(state_dir)
+        return entities_gdf
+
+    # diff by OSM key (NaN names compare equal)
+    old = state.members
+    joined = new.merge(old, on='member', how='left', suffixes=('', '_old'))
+    unchanged = (
+        (joined['x'] == joined['x_old']) & (joined['y'] == joined['y_old'])
+        & ((joined['name'] == joined['name_old']) | (joined['name'].isna() & joined['name_old'].isna()))
+        & (joined['sub_category'] == joined['sub_category_old'])
+    ).to_numpy()
+    unchanged_keys = set(new['member'].to_numpy()[unchanged])
+    dirty_new = np.flatnonzero(~unchanged)
+    dirty_old = old[~old['member'].isin(unchanged_keys)]
+
+    if len(dirty_new) == 0 and len(dirty_old) == 0:
+        print(f"-> No changes in the {len(new)} points, keeping the {len(state.entities)} stored entities.")
+        return _to_points(state.entities, new.assign(entity_id=old.set_index('member').loc[new['member'], 'entity_id'].to_numpy()), distance_threshold_m)
+
+    # seeds: changed points, plus the neighbours of the old positions of removed/moved points
+    from scipy.spatial import cKDTree
+
+    xy = new[['x', 'y']].to_numpy()
+    seeds = [dirty_new]
+    if len(dirty_old) and len(xy):
+        seeds += [np.asarray(n, dtype=np.int64) for n in cKDTree(xy).query_ball_point(dirty_old[['x', 'y']].to_numpy(), r=distance_threshold_m)]
+    affected = _eps_closure(xy, np.concatenate(seeds), distance_threshold_m) if len(xy) else np.empty(0, dtype=np.int64)
+
+    # entities touching the affected or removed points are rebuilt, the rest is kept
+    touched = set(old.loc[old['member'].isin(set(new['member'].to_numpy()[affected]) | set(dirty_old['member'])), 'entity_id'])
+    kept_entities = state.entities[~state.entities['entity_id'].isin(touched)]
+    kept_mapping = old.loc[~old['entity_id'].isin(touched), ['member', 'entity_id']]
+
+    print(f"-> {len(dirty_new)} new/edited and {len(dirty_old)} removed/edited points: re-deduplicating {len(affected)} of {len(new)} points...")
+    if len(affected):
+        entities_gdf, mapping = dedup(points_gdf.iloc[affected])
+        entities = pd.concat([kept_entities, _entities_frame(entities_gdf)], ignore_index=True)
+        mapping = pd.concat([kept_mapping, mapping], ignore_index=True)
+    else:
+        entities, mapping = kept_entities.reset_index(drop=True), kept_mapping
+
+    members = new.assign(entity_id=new['member'].map(mapping.set_index('member')['entity_id']).to_numpy())
+    DedupState(members, entities, params).save(state_dir)
+    print(f"-> Kept {len(kept_entities)} entities, rebuilt {len(entities) - len(kept_entities)} ({len(entities)} in total).")
+    return _to_points(entities, members, distance_threshold_m)
+
+
+# === 4. PARTITIONED DEDUPLICATION ===
+
+# extra halo width on top of eps: the partition outlines are straight lines between the H3 vertices (not the exact cell edges)
+HALO_SLACK_M = 10.0
+
+def _spatial_labels(xy: np.ndarray, eps: float) -> np.ndarray:
+    """
+    DBSCAN (min_samples=1) cluster labels of one partition and its halo (runs in the worker processes).
+    """
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=eps, min_samples=1).fit(xy).labels_
+
+def _deduplicate_part(points_gdf: "gpd.GeoDataFrame", eps: float, metric_crs: str, similarity_threshold: float, semantic_clustering: bool):
+    return deduplicate_points(points_gdf, eps, metric_crs, similarity_threshold, semantic_clustering, return_members=True)
+
+def _map_partitions(func, jobs: list, workers: int) -> list:
+    """
+    Runs func(*job) for every job, in a process pool when workers > 1 (results in job order).
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return [func(*job) for job in jobs]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(func, *job) for job in jobs]
+        return [future.result() for future in futures]
+
+def _partition_members(lats: np.ndarray, lons: np.ndarray, xy: np.ndarray, resolution: int, halo_m: float, metric_crs: str) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Coarse H3 partition of every point, and the points of every partition: the ones inside it plus its halo
+    (points within halo_m of its outline), in input order.
+    """
+    import geopandas as gpd
+    import shapely
+    import h3
+    from src.hexes import latlng_to_cells_int
+
+    cells = latlng_to_cells_int(lats, lons, resolution)
+    parents, part_of = np.unique(cells, return_inverse=True)
+
+    # buffered partition outlines in the metric CRS, queried once for every point
+    outlines = gpd.GeoSeries(
+        [shapely.Polygon([(lng, lat) for lat, lng in h3.cell_to_boundary(h3.int_to_str(int(cell)))]) for cell in parents],
+        crs = "EPSG:4326"
+    ).to_crs(metric_crs).buffer(halo_m)
+    point_idx, part_idx = shapely.STRtree(outlines.values).query(shapely.points(xy), predicate="intersects")
+
+    points = np.concatenate([np.arange(len(xy)), point_idx])
+    parts = np.concatenate([part_of, part_idx])
+    pairs = np.unique(np.stack([parts, points], axis=1), axis=0) # sorted by partition, then by input position
+    bounds = np.searchsorted(pairs[:, 0], np.arange(len(parents) + 1))
+    return part_of, [pairs[start:end, 1] for start, end in zip(bounds[:-1], bounds[1:])]
+
+@instrumented()
+def partitioned_deduplicate(
+    points_gdf: "gpd.GeoDataFrame",
+    distance_threshold_m: float,
+    metric_crs: str,
+    similarity_threshold: float = 0.6,
+    semantic_clustering: bool = True,
+    partition_resolution: int = 6,
+    workers: int = 1,
+    return_members: bool = False
+) -> Union["gpd.GeoDataFrame", tuple]:
+    """
+    deduplicate_points for region-scale point sets: split by a coarse H3 parent and processed partition by partition (in parallel).
+    Args:
+        points_gdf (gpd.GeoDataFrame): Points indexed by unique keys (e.g. (element, id), see fetch_points).
+        distance_threshold_m (float): Distance threshold in meters for spatial clustering (eps).
+        metric_crs (str): Local metric system.
+        similarity_threshold (float): Similarity threshold for semantic clustering.
+        semantic_clustering (bool): Whether to perform semantic clustering after spatial clustering.
+        partition_resolution (int): H3 resolution of the partitions.
+        workers (int): Processes running the partitions (1 = serial, in this process).
+        return_members (bool): Also return the member -> entity mapping.
+    Returns:
+        gpd.GeoDataFrame: Same rows, order and entity ids as deduplicate_points on the whole set (and the mapping with return_members).
+    Logic:
+        1. Every partition gets its own points plus a halo of the points within eps of its outline, so every eps-neighbour pair
+        lies entirely inside at least one partition.
+        2. DBSCAN (min_samples=1) per partition, in parallel. The local clusters overlap in the halos: merging every
+        local cluster with connected components (a union-find over the points) gives exactly the global DBSCAN clusters.
+        3. Each global cluster is assigned to the partition of its first point, and deduplicate_points runs on the
+        whole clusters of each partition, in parallel (the name matching never sees a cut cluster).
+        4. The entities are put back in the order of the unpartitioned run: clusters by their first point, then the
+        entities of a cluster by their first member.
+    """
+    import geopandas as gpd
+    import pandas as pd
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components
+
+    keys = member_keys(points_gdf)
+    if len(points_gdf) == 0 or len(set(keys)) != len(keys):
+        if len(points_gdf):
+            print("!! Partitioned deduplication needs unique point keys, deduplicating the points in one go.")
+        return deduplicate_points(points_gdf, distance_threshold_m, metric_crs, similarity_threshold, semantic_clustering, return_members)
+
+    lonlat = points_gdf.geometry.to_crs("EPSG:4326")
+    metric = points_gdf.geometry.to_crs(metric_crs)
+    xy = np.column_stack([metric.x.to_numpy(), metric.y.to_numpy()])
+    n = len(xy)
+
+    # 1. partitions with their halo
+    part_of, partitions = _partition_members(lonlat.y.to_numpy(), lonlat.x.to_numpy(), xy, partition_resolution, distance_threshold_m + HALO_SLACK_M, metric_crs)
+    halo = sum(len(members) for members in partitions) - n
+    print(f"-> Deduplicating {n} points in {len(partitions)} partitions (resolution {partition_resolution}, {halo} halo points) with {workers} workers...")
+
+    # 2. local clusters, merged across the halos
+    labels = _map_partitions(_spatial_labels, [(xy[members], distance_threshold_m) for members in partitions], workers)
+    heads, tails = [], []
+    for members, local in zip(partitions, labels):
+        _, first = np.unique(local, return_index=True)
+        heads.append(members[first[local]])
+        tails.append(members)
+    heads, tails = np.concatenate(heads), np.concatenate(tails)
+    graph = sparse.coo_matrix((np.ones(len(heads)), (heads, tails)), shape=(n, n))
+    _, component = connected_components(graph, directed=False)
+    component_first = pd.Series(np.arange(n)).groupby(component).min().to_numpy()[component]
+    print(f"-> {len(np.unique(component))} spatial clusters after merging the partitions.")
+
+    # 3. whole clusters, deduplicated in the partition of their first point
+    home = part_of[component_first]
+    jobs = [
+        (points_gdf.iloc[np.flatnonzero(home == part)], distance_threshold_m, metric_crs, similarity_threshold, semantic_clustering)
+        for part in np.unique(home)
+    ]
+    results = _map_partitions(_deduplicate_part, jobs, workers)
+
+    # 4. back to the unpartitioned order
+    entities = pd.concat([entities_gdf for entities_gdf, _ in results], ignore_index=True)
+    mapping = pd.concat([part_mapping for _, part_mapping in results], ignore_index=True)
+    position = pd.Series(np.arange(n), index=keys)
+    first_member = mapping.assign(position=position.loc[mapping['member']].to_numpy()).groupby('entity_id', sort=False)['position'].min()
+    member_position = first_member.loc[entities['entity_id']].to_numpy()
+    order = np.lexsort((member_position, component_first[member_position]))
+
+    entities_gdf = compact_frame(gpd.GeoDataFrame(entities.iloc[order].reset_index(drop=True), geometry="geometry", crs="EPSG:4326"))
+    print(f"-> Reduced to {len(entities_gdf)} deduplicated points across the partitions.")
+    if not return_members:
+        return entities_gdf
+    rank = pd.Series(np.arange(len(entities_gdf)), index=entities_gdf['entity_id'].to_numpy())
+    mapping = mapping.iloc[np.argsort(rank.loc[mapping['entity_id']].to_numpy(), kind="stable")].reset_index(drop=True)
+    return entities_gdf, mapping
+
+def deduplicate_layer_points(
+    points_gdf: "gpd.GeoDataFrame",
+    name: str,
+    config: Dict[str, Any],
+    distance_threshold_m: float,
+    metric_crs: str,
+    similarity_threshold: float = 0.6,
+    semantic_clustering: bool = True
+) -> "gpd.GeoDataFrame":
+    """
+    Deduplicates the points of one layer group (e.g. "l2_food_nighlife"): incrementally when fetch.refresh.incremental is set
+    (state next to the raw OSM elements), partitioned when deduplication.partitioned is set and the set is large enough,
+    with a full deduplicate_points otherwise.
+    """
+    refresh_cfg = config.get('fetch', {}).get('refresh', {})
+    partition_cfg = config.get('deduplication', {})
+    if not refresh_cfg.get('incremental', False):
+        if partition_cfg.get('partitioned', False) and len(points_gdf) >= partition_cfg.get('min_points', 0):
+            return partitioned_deduplicate(
+                points_gdf,
+                distance_threshold_m,
+                metric_crs,
+                similarity_threshold,
+                semantic_clustering,
+                partition_resolution = partition_cfg.get('partition_resolution', 6),
+                workers = partition_cfg.get('workers', 1)
+            )
+        return deduplicate_points(points_gdf, distance_threshold_m, metric_crs, similarity_threshold, semantic_clustering)
+
+    state_dir = Path(config['paths']['processed']) / refresh_cfg.get('store', "osm_raw") / "dedup" / name
+    return incremental_deduplicate(points_gdf, state_dir, distance_threshold_m, metric_crs, similarity_threshold, semantic_clustering)
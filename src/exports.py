@@ -0,0 +1,265 @@
+# src/exports.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+# internal (geopandas and the viz modules are imported lazily, exports are often not run at all)
+from src.utils import load_config, configure_osm_cache, fetch_boundary, buffer_boundary
+from src.instrument import start_run, print_summary, end_run
+from src.layer_io import layer_path, layer_mtime, read_layer
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+
+# === 2. SHARED LOADERS ===
+
+def _is_stale(source: Path, targets: List[Path]) -> bool:
+    """
+    An export is stale when any of its targets is missing or older than the Parquet (file or dataset) it is built from.
+    """
+    return any(not t.exists() or t.stat().st_mtime < layer_mtime(source) for t in targets)
+
+def _read_layer(path: Path) -> "gpd.GeoDataFrame":
+    import geopandas as gpd
+
+    if not path.exists():
+        raise FileNotFoundError(f"!! Layer not found at: {path}. Run its pipeline first.")
+    return gpd.read_parquet(path)
+
+def load_buffered_boundary(config: Dict[str, Any]) -> "gpd.GeoDataFrame":
+    """
+    Loads the buffered boundary saved by Layer 0, or rebuilds it from OSM if Layer 0 hasn't run.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+    Returns:
+        gpd.GeoDataFrame: The buffered boundary in EPSG:4326.
+    """
+    import geopandas as gpd
+
+    boundary_path = Path(config['paths']['processed']) / "l0_boundary.parquet"
+    if boundary_path.exists():
+        return gpd.read_parquet(boundary_path)
+
+    print(f"!! No saved boundary at {boundary_path}. Fetching it again...")
+    configure_osm_cache(config['paths'].get('cache', "cache"))
+    return buffer_boundary(
+        fetch_boundary(config['project']['city_name']),
+        config['grid']['buffer_dist_m'],
+        metric_crs = config['crs']['metric'],
+        target_crs = config['crs']['global'],
+        simplify_tolerance_m = config['grid'].get('simplify_tolerance_m')
+    )
+
+
+# === 3. LAYER EXPORTS ===
+
+def export_layer0(config: Dict[str, Any], force: bool = False) -> List[str]:
+    """
+    Exports Layer 0 from its Parquet artifact: grid GeoJSON, optional tiles and the Folium map.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        force (bool): Rewrite the exports even if they are newer than the Parquet.
+    Returns:
+        List[str]: Paths written (empty if everything was up to date).
+    """
+    from src.tiles import export_h3_tiles
+    from src.viz_layer0 import plot_boundary_and_grid
+
+    paths = config['paths']
+    source = Path(paths['processed']) / "l0_grid.parquet"
+    geojson_path = Path(paths['viz']) / "l0_grid.geojson"
+    map_path = Path(paths['maps']) / "layer0_map.html"
+    if not force and not _is_stale(source, [geojson_path, map_path]):
+        print("-> Layer 0 exports are up to date.")
+        return []
+
+    grid_gdf = _read_layer(source)
+    boundary_gdf = load_buffered_boundary(config)
+
+    # save GeoJSON
+    grid_gdf.to_file(geojson_path, driver="GeoJSON")
+    print(f"-> Saved H3 grid as GeoJSON at: {geojson_path}")
+
+    # save tiles (the map then loads the grid on demand)
+    tiles_dir = None
+    if config.get('tiles', {}).get('enabled', False):
+        tiles_dir = Path(paths['tiles']) / "l0_grid"
+        export_h3_tiles(
+            grid_gdf[['h3_index']],
+            tiles_dir,
+            zoom_resolutions = config['tiles']['zoom_resolutions']
+        )
+        print(f"-> Saved H3 grid tiles at: {tiles_dir}")
+
+    # save Folium HTML map
+    plot_boundary_and_grid(boundary_gdf, grid_gdf, save_path = map_path, tiles_dir = tiles_dir)
+
+    return [str(geojson_path), str(map_path)]
+
+def export_layer1(config: Dict[str, Any], force: bool = False) -> List[str]:
+    """
+    Exports Layer 1 from its Parquet artifacts: transport GeoJSON, the transport map and the per-mode cleaning comparison maps.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        force (bool): Rewrite the exports even if they are newer than the Parquet.
+    Returns:
+        List[str]: Paths written (empty if everything was up to date).
+    """
+    from src.viz_layer1 import plot_transport, plot_cleaned_comparison
+
+    paths = config['paths']
+    maps_dir = Path(paths['maps'])
+    source = Path(paths['processed']) / "l1_transport.parquet"
+    raw_source = Path(paths['processed']) / "l1_transport_raw.parquet"
+    geojson_path = Path(paths['viz']) / "l1_transport.geojson"
+    map_path = maps_dir / "layer1_map.html"
+    modes = ['metro', 'tram', 'train']
+    comparison_paths = [maps_dir / f"cleaned_{mode}_comparison_map.html" for mode in modes]
+    if not force and not _is_stale(source, [geojson_path, map_path] + comparison_paths):
+        print("-> Layer 1 exports are up to date.")
+        return []
+
+    transport_gdf = _read_layer(source)
+    boundary_gdf = load_buffered_boundary(config)
+
+    # save GeoJSON
+    transport_gdf.to_file(geojson_path, driver="GeoJSON")
+    print(f"-> Saved transport points as GeoJSON at: {geojson_path}")
+
+    # save Folium HTML maps
+    plot_transport(boundary_gdf, transport_gdf, save_path = map_path)
+    written = [str(geojson_path), str(map_path)]
+
+    if raw_source.exists():
+        raw_gdf = _read_layer(raw_source)
+        for mode, comparison_path in zip(modes, comparison_paths):
+            plot_cleaned_comparison(
+                raw_gdf[raw_gdf['type'] == mode],
+                transport_gdf[transport_gdf['type'] == mode],
+                boundary_gdf,
+                mode.title(),
+                save_path = comparison_path
+            )
+            written.append(str(comparison_path))
+    else:
+        print(f"!! No raw transport layer at {raw_source}. Skipping the comparison maps.")
+
+    return written
+
+def export_layer2(config: Dict[str, Any], force: bool = False) -> List[str]:
+    """
+    Exports Layer 2 from its Parquet artifact: POI GeoJSON and the Folium map.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        force (bool): Rewrite the exports even if they are newer than the Parquet.
+    Returns:
+        List[str]: Paths written (empty if everything was up to date).
+    """
+    from src.viz_layer2 import plot_poi
+
+    paths = config['paths']
+    source = layer_path(paths['processed'], "l2_poi")
+    geojson_path = Path(paths['viz']) / "l2_poi.geojson"
+    map_path = Path(paths['maps']) / "layer2_map.html"
+    if not force and not _is_stale(source, [geojson_path, map_path]):
+        print("-> Layer 2 exports are up to date.")
+        return []
+
+    poi_gdf = read_layer(source)
+    boundary_gdf = load_buffered_boundary(config)
+
+    # save GeoJSON
+    poi_gdf.to_file(geojson_path, driver="GeoJSON")
+    print(f"-> Saved POI points as GeoJSON at: {geojson_path}")
+
+    # save Folium HTML map
+    plot_poi(boundary_gdf, poi_gdf, save_path = map_path)
+
+    return [str(geojson_path), str(map_path)]
+
+EXPORTERS: Dict[str, Callable[..., List[str]]] = {
+    'l0': export_layer0,
+    'l1': export_layer1,
+    'l2': export_layer2,
+}
+
+
+# === 4. EXPORT STAGE ===
+
+def start_exports(
+    config: Dict[str, Any],
+    layers: Optional[List[str]] = None,
+    force: bool = False,
+    max_workers: Optional[int] = None
+) -> Tuple[ProcessPoolExecutor, Dict[str, Future]]:
+    """
+    Starts the exports in a background worker pool and returns immediately.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        layers (Optional[List[str]]): Layers to export ('l0', 'l1', 'l2'). Defaults to all.
+        force (bool): Rewrite the exports even if they are up to date.
+        max_workers (Optional[int]): Size of the worker pool. Defaults to exports.max_workers in settings.yaml.
+    Returns:
+        Tuple[ProcessPoolExecutor, Dict[str, Future]]: The pool (call shutdown() when done) and one future per layer.
+    """
+    layers = layers or list(EXPORTERS)
+    unknown = [layer for layer in layers if layer not in EXPORTERS]
+    if unknown:
+        raise ValueError(f"!! Unknown export layers: {unknown}. Choose from {list(EXPORTERS)}.")
+
+    for dir_key in ['viz', 'maps']:
+        Path(config['paths'][dir_key]).mkdir(parents=True, exist_ok=True)
+
+    workers = max_workers or config.get('exports', {}).get('max_workers', 2)
+    pool = ProcessPoolExecutor(max_workers=workers)
+    futures = {layer: pool.submit(EXPORTERS[layer], config, force) for layer in layers}
+    print(f"-> Started exports for {layers} in the background ({workers} workers)...")
+
+    return pool, futures
+
+def run_exports(
+    config: Dict[str, Any],
+    layers: Optional[List[str]] = None,
+    force: bool = False,
+    max_workers: Optional[int] = None
+) -> Dict[str, List[str]]:
+    """
+    Runs the exports in a worker pool and waits for them.
+    Args:
+        config (Dict[str, Any]): Configuration dictionary.
+        layers (Optional[List[str]]): Layers to export ('l0', 'l1', 'l2'). Defaults to all.
+        force (bool): Rewrite the exports even if they are up to date.
+        max_workers (Optional[int]): Size of the worker pool.
+    Returns:
+        Dict[str, List[str]]: Paths written per layer.
+    """
+    pool, futures = start_exports(config, layers, force, max_workers)
+    try:
+        written = {layer: future.result() for layer, future in futures.items()}
+    finally:
+        pool.shutdown()
+
+    print("-> Exports completed.")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export GeoJSON/HTML from the layer Parquet artifacts.")
+    parser.add_argument("layers", nargs="*", help=f"Layers to export {list(EXPORTERS)}. Defaults to all.")
+    parser.add_argument("--config", default="config/settings.yaml", help="Path to the settings file.")
+    parser.add_argument("--force", action="store_true", help="Rewrite exports even if up to date.")
+    parser.add_argument("--workers", type=int, default=None, help="Size of the worker pool.")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    owns_run = start_run(config['paths']['logs'], run_name="exports")
+    run_exports(config, args.layers or None, args.force, args.workers)
+    if owns_run:
+        print_summary()
+        end_run()
@@ -0,0 +1,290 @@
+# src/feature_store.py
+
+# === 1. IMPORTS ===
+
+# general
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+# third party
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import h3
+
+# internal
+from src.instrument import instrumented
+
+
+# === 2. FEATURE STORE ===
+
+# the matrix is stored as a single FixedSizeList<float> column, so its values buffer is the row-major matrix itself
+MATRIX_COLUMN = "features"
+INDEX_COLUMN = "h3"
+METADATA_KEY = b"feature_store"
+COMPRESSIONS = (None, "lz4")
+
+@dataclass
+class FeatureStore:
+    """
+    A feature matrix loaded from an Arrow IPC file. With an uncompressed file, `h3` and `matrix` are read-only views on the memory-mapped file.
+    """
+    h3: np.ndarray # uint64 H3 cells, one per row
+    matrix: np.ndarray # (n_cells, n_features)
+    columns: List[str] # feature names
+    source: pa.Table # keeps the mapped buffers alive as long as the views are used
+
+    def h3_index(self) -> pd.Index:
+        """
+        The H3 cells as hex strings (the index used by the Parquet features).
+        """
+        return pd.Index([h3.int_to_str(int(cell)) for cell in self.h3], name="h3_index")
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Materializes the store as the DataFrame written by build_features (copies the matrix).
+        """
+        return pd.DataFrame(np.array(self.matrix), index=self.h3_index(), columns=self.columns)
+
+@instrumented()
+def write_feature_store(
+    df: pd.DataFrame,
+    path: Union[str, Path],
+    compression: Optional[str] = None,
+    dtype: str = "float64"
+) -> Path:
+    """
+    Writes a feature matrix (rows = H3 cells, columns = features) as an Arrow IPC (Feather v2) file.
+    Args:
+        df (pd.DataFrame): Feature matrix indexed by H3 cell (hex strings).
+        path (Union[str, Path]): Output path (.arrow).
+        compression (Optional[str]): None (zero-copy reads) or "lz4" (smaller file, decompressed on load).
+        dtype (str): Storage dtype of the matrix ("float64" or "float32").
+    Returns:
+        Path: The written file.
+    Logic:
+        1. The H3 index is stored as uint64 and the matrix as one FixedSizeList column, both fixed-width.
+        2. Everything is written as a single record batch, so each column is one contiguous buffer.
+        3. The feature names go in the schema metadata.
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"!! Unknown feature store compression: {compression}. Choose from {COMPRESSIONS}.")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n_rows, n_features = df.shape
+
+    cells = np.fromiter((h3.str_to_int(cell) for cell in df.index), dtype=np.uint64, count=n_rows)
+    values = np.ascontiguousarray(df.to_numpy(dtype=dtype)).reshape(-1)
+    matrix = pa.FixedSizeListArray.from_arrays(pa.array(values), n_features)
+
+    metadata = {METADATA_KEY: json.dumps({"columns": [str(col) for col in df.columns], "dtype": dtype}).encode()}
+    batch = pa.record_batch([pa.array(cells), matrix], names=[INDEX_COLUMN, MATRIX_COLUMN], metadata=metadata)
+
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, batch.schema, options=options) as writer:
+            writer.write_batch(batch)
+
+    print(f"-> Saved feature store ({n_rows} x {n_features}, compression={compression}) at: {path}")
+    return path
+
+def load_feature_store(path: Union[str, Path]) -> FeatureStore:
+    """
+    Memory-maps an Arrow IPC feature store and exposes the matrix as NumPy views, without copying.
+    Args:
+        path (Union[str, Path]): Path of the .arrow file written by write_feature_store.
+    Returns:
+        FeatureStore: The H3 cells, the matrix and the feature names.
+    Logic:
+        1. The file is memory-mapped, so processes loading the same file share its pages through the page cache.
+        2. Uncompressed: the NumPy arrays point into the mapping (read-only), nothing is read until it is touched.
+        3. LZ4: the buffers are decompressed into memory once.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"!! Feature store not found at: {path}. Run build_features first.")
+
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    meta = json.loads(table.schema.metadata[METADATA_KEY])
+    columns = meta["columns"]
+
+    cells_col = table.column(INDEX_COLUMN)
+    matrix_col = table.column(MATRIX_COLUMN)
+    if cells_col.num_chunks != 1 or matrix_col.num_chunks != 1:
+        raise ValueError(f"!! Feature store at {path} has {matrix_col.num_chunks} record batches, expected 1.")
+
+    cells = cells_col.chunk(0).to_numpy(zero_copy_only=True)
+    # flatten() honours the slice offset of the list array, values would not
+    flat = matrix_col.chunk(0).flatten().to_numpy(zero_copy_only=True)
+    matrix = flat.reshape(len(cells), len(columns))
+
+    return FeatureStore(h3=cells, matrix=matrix, columns=columns, source=table)
+
+
+# === 3. SPARSE GRID-ALIGNED MATRICES ===
+
+@dataclass
+class SparseFeatures:
+    """
+    A feature matrix aligned to the L0 grid: one row per grid cell (sorted uint64 H3), empty cells are implicit zero rows.
+    """
+    h3: np.ndarray # sorted uint64 H3 cells of the grid
+    matrix: Any # scipy.sparse.csr_matrix (n_grid_cells, n_features)
+    columns: List[str]
+
+    def nonempty_rows(self) -> np.ndarray:
+        return np.flatnonzero(np.diff(self.matrix.indptr) > 0)
+
+    def to_frame(self, dtype: Optional[str] = None) -> pd.DataFrame:
+        """
+        Dense DataFrame of the non-empty cells only, indexed by H3 hex strings (the layout of the Parquet features).
+        """
+        rows = self.nonempty_rows()
+        values = self.matrix[rows].toarray()
+        index = pd.Index([h3.int_to_str(int(cell)) for cell in self.h3[rows]], name="h3_index")
+        return pd.DataFrame(values if dtype is None else values.astype(dtype), index=index, columns=pd.Index(self.columns, name="sub_category"))
+
+@instrumented()
+def write_sparse_features(features: SparseFeatures, path: Union[str, Path]) -> Path:
+    """
+    Saves a grid-aligned sparse matrix as an uncompressed .npz (CSR arrays, grid cells and feature names, no pickles).
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    matrix = features.matrix.tocsr()
+    np.savez(
+        path,
+        data = matrix.data,
+        indices = matrix.indices,
+        indptr = matrix.indptr,
+        shape = np.array(matrix.shape),
+        h3 = features.h3,
+        columns = np.array(features.columns, dtype=str)
+    )
+    print(f"-> Saved sparse features ({matrix.shape[0]} grid cells x {matrix.shape[1]}, {matrix.nnz} non-zeros) at: {path}")
+    return path
+
+def load_sparse_features(path: Union[str, Path]) -> SparseFeatures:
+    """
+    Loads a matrix saved by write_sparse_features.
+    """
+    from scipy import sparse
+
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"!! Sparse features not found at: {path}. Run build_features first.")
+
+    with np.load(path, allow_pickle=False) as npz:
+        matrix = sparse.csr_matrix((npz['data'], npz['indices'], npz['indptr']), shape=tuple(npz['shape']))
+        return SparseFeatures(h3=npz['h3'], matrix=matrix, columns=npz['columns'].tolist())
+
+
+# === 4. INVERTED H3 -> POINTS INDEX ===
+
+POINTS_H3_COLUMN = "h3"
+POINTS_METADATA_KEY = b"point_index"
+
+@dataclass
+class PointIndex:
+    """
+    The points behind the features (POIs, stops) sorted by their uint64 H3 cell, from a memory-mapped Arrow IPC file:
+    the points of a cell are one contiguous slice, found with two binary searches (CSR offsets, see offsets()).
+    """
+    h3: np.ndarray # sorted uint64 cell of every point
+    table: pa.Table # one row per point (layer, name, sub_category, entity_id, lon, lat), same order as h3
+
+    @property
+    def resolution(self) -> int:
+        return h3.get_resolution(h3.int_to_str(int(self.h3[0]))) if len(self.h3) else -1
+
+    def offsets(self, cells: np.ndarray) -> np.ndarray:
+        """
+        CSR offsets of sorted uint64 cells (e.g. the L0 grid rows of SparseFeatures): the points of cells[i] are rows offsets[i]:offsets[i + 1].
+        Every indexed point must fall in one of the cells (build_features only indexes the points inside the grid).
+        """
+        cells = np.asarray(cells, dtype=np.uint64)
+        return np.append(np.searchsorted(self.h3, cells, side="left"), np.searchsorted(self.h3, cells[-1:], side="right")) if len(cells) else np.zeros(1, dtype=np.int64)
+
+    def counts(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Points per cell (any cells, sorted or not).
+        """
+        cells = np.asarray(cells, dtype=np.uint64)
+        return np.searchsorted(self.h3, cells, side="right") - np.searchsorted(self.h3, cells, side="left")
+
+    def table_in(self, cells: Union[str, int, List[Union[str, int]]]) -> pa.Table:
+        """
+        The points of one cell or a list of cells (e.g. a k-ring) as an Arrow table with an h3_index column.
+        Cost proportional to the result: two binary searches and a zero-copy slice per cell.
+        """
+        from src.hexes import cells_to_int
+
+        cells = cells_to_int([cells] if isinstance(cells, (str, int, np.integer)) else cells)
+        starts = np.searchsorted(self.h3, cells, side="left")
+        ends = np.searchsorted(self.h3, cells, side="right")
+        slices = [self.table.slice(start, end - start) for start, end in zip(starts, ends) if end > start]
+        table = pa.concat_tables(slices) if slices else self.table.schema.empty_table()
+        return table.append_column('h3_index', pa.array([h3.int_to_str(int(cell)) for cell in np.repeat(cells, ends - starts)], type=pa.string()))
+
+    def points_in(self, cells: Union[str, int, List[Union[str, int]]]) -> pd.DataFrame:
+        """
+        The points of one cell or a list of cells as a DataFrame (see table_in).
+        """
+        return self.table_in(cells).to_pandas()
+
+    def points_in_ring(self, cell: Union[str, int], k: int = 1) -> pd.DataFrame:
+        """
+        The points of a cell and of its neighbours up to k steps away.
+        """
+        cell = h3.int_to_str(int(cell)) if not isinstance(cell, str) else cell
+        return self.points_in(sorted(h3.grid_disk(cell, k)))
+
+@instrumented()
+def write_point_index(cells: np.ndarray, points: pd.DataFrame, path: Union[str, Path]) -> Path:
+    """
+    Saves points sorted by their uint64 H3 cell as an uncompressed Arrow IPC file (one record batch, so slices are zero-copy).
+    Args:
+        cells (np.ndarray): uint64 cell of every point.
+        points (pd.DataFrame): Point attributes (e.g. layer, name, sub_category, entity_id, lon, lat), same order as cells.
+        path (Union[str, Path]): Output path (.arrow).
+    Returns:
+        Path: The written file.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cells = np.asarray(cells, dtype=np.uint64)
+    order = np.argsort(cells, kind="stable")
+
+    table = pa.Table.from_pandas(points.iloc[order].reset_index(drop=True), preserve_index=False)
+    table = table.append_column(POINTS_H3_COLUMN, pa.array(cells[order])).combine_chunks()
+    metadata = {POINTS_METADATA_KEY: json.dumps({"points": len(cells), "cells": int(len(np.unique(cells)))}).encode()}
+    table = table.replace_schema_metadata(metadata)
+
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=max(len(table), 1))
+
+    print(f"-> Saved point index ({len(cells)} points in {len(np.unique(cells))} hexagons) at: {path}")
+    return path
+
+def load_point_index(path: Union[str, Path]) -> PointIndex:
+    """
+    Memory-maps a point index written by write_point_index (nothing is read until a slice is used).
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"!! Point index not found at: {path}. Run build_features first.")
+
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    cells_col = table.column(POINTS_H3_COLUMN)
+    if cells_col.num_chunks > 1:
+        raise ValueError(f"!! Point index at {path} has {cells_col.num_chunks} record batches, expected 1.")
+    cells = cells_col.chunk(0).to_numpy(zero_copy_only=True) if cells_col.num_chunks else np.empty(0, dtype=np.uint64)
+    return PointIndex(h3=cells, table=table.drop_columns([POINTS_H3_COLUMN]))
@@ -5,14 +5,19 @@
 # general
 import os
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
-# third party
+# third party (scipy/sklearn are imported lazily in build_features, geopandas only for the GeoJSON fallback)
+import numpy as np
 import pandas as pd
-import geopandas as gpd
-from sklearn.feature_extraction.text import TfidfTransformer
 
 # internal
-from src.utils import load_config, assign_h3
+from src.config import load_config
+from src.hexes import latlng_to_cells_int, cells_to_int
+from src.schema import compact_frame
+from src.feature_store import SparseFeatures, write_feature_store, write_sparse_features, write_point_index
+from src.layer_io import layer_path, layer_columns, read_points
+from src.instrument import instrumented, span, start_run, print_summary, end_run
 
 
 # === 2. LAYER CONVERSION UTIL ===
@@ -43,71 +48,168 @@ def normalize_transport_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-# === 3. FEATURES PIPELINE ===
+# === 3. LAYER LOADING ===
 
-def build_features():
+# columns a transport layer may carry its sub-category in (see normalize_transport_columns)
+TRANSPORT_COLUMNS = ['sub_category', 'station', 'railway', 'highway', 'public_transport']
+# point attributes kept in the inverted H3 -> points index (see write_point_index)
+INDEX_COLUMNS = ['name', 'entity_id']
+
+def load_layer_points(
+    processed_dir: Path,
+    name: str,
+    columns: List[str],
+    allow_geojson: bool = False
+) -> pd.DataFrame:
+    """
+    Loads the points of a layer with only the columns the features need, plus lon/lat.
+    Args:
+        processed_dir (Path): Folder of the processed layers.
+        name (str): Layer name (e.g. "l2_poi").
+        columns (List[str]): Wanted attribute columns (the ones missing from the layer are skipped).
+        allow_geojson (bool): Fall back to <name>.geojson if there is no Parquet (slow, reads every column and builds geometries).
+    Returns:
+        pd.DataFrame: The available columns plus 'lon' and 'lat' in EPSG:4326.
+    """
+    path = layer_path(processed_dir, name)
+    if path.exists():
+        available = set(layer_columns(path))
+        return read_points(path, columns=[col for col in columns if col in available])
+
+    geojson_path = processed_dir / f"{name}.geojson"
+    if not allow_geojson or not geojson_path.exists():
+        raise FileNotFoundError(f"!! No Parquet layer at {path}. Run its pipeline first (or set features.allow_geojson to read {geojson_path}).")
+
+    import geopandas as gpd
+
+    print(f"!! No Parquet layer at {path}. Falling back to the (slow) GeoJSON at {geojson_path}...")
+    gdf = gpd.read_file(geojson_path).to_crs("EPSG:4326")
+    df = pd.DataFrame(gdf[[col for col in columns if col in gdf.columns]])
+    df['lon'] = gdf.geometry.x.to_numpy()
+    df['lat'] = gdf.geometry.y.to_numpy()
+    return df
+
+
+def load_grid_cells(processed_dir: Path) -> np.ndarray:
+    """
+    Loads the L0 grid index as a sorted uint64 array (only the h3_index column is read).
+    Args:
+        processed_dir (Path): Folder of the processed layers.
+    Returns:
+        np.ndarray: Sorted, unique uint64 H3 cells of the grid.
+    """
+    import pyarrow.parquet as pq
+
+    grid_path = processed_dir / "l0_grid.parquet"
+    if not grid_path.exists():
+        raise FileNotFoundError(f"!! L0 grid not found at: {grid_path}. Run Layer 0 first.")
+    return np.unique(cells_to_int(pq.read_table(grid_path, columns=['h3_index']).column('h3_index').to_pylist()))
+
+
+# === 4. FEATURES PIPELINE ===
+
+@instrumented()
+def build_features(config: Optional[Dict[str, Any]] = None):
     """
     Builds the features for our model. Loads Layer 1 (transport) and Layer 2 (POis), assigns to them H3 indices, and applies TF-IDF normalization.
+    Rows are aligned to the L0 grid: points outside it are dropped and empty hexagons are implicit zero rows of a sparse matrix.
+    The matrices are saved as grid-aligned sparse .npz, and their non-empty rows as Parquet and memory-mappable Arrow feature stores (see src/feature_store.py).
+    The points themselves are saved sorted by hexagon (inverted H3 -> points index), to list the points behind any hexagon.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
     """
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfTransformer
+
     print("-> Starting feature matrix generation...")
 
     # load data
-    config = load_config()
+    if config is None:
+        config = load_config()
     paths = config['paths']
     res = config['grid']['resolution']
     processed_dir = Path(paths['processed'])
-    viz_dir = Path(paths['viz'])
     out_path = processed_dir / "l3_features_tfidf.parquet"
+    allow_geojson = config.get('features', {}).get('allow_geojson', False)
 
-    # load layers
+    # load layers (only the sub-category columns and the coordinates)
     print("-> Loading Layer 1 - Transport and Layer 2 - POIs...")
-    if (processed_dir / "l2_poi.parquet").exists():
-        poi_gdf = gpd.read_parquet(processed_dir / "l2_poi.parquet") 
-    else:
-        poi_gdf = gpd.read_file(processed_dir / "l2_poi.geojson") 
-
-    if (processed_dir / "l1_transport.parquet").exists():
-        transport_gdf = gpd.read_parquet(processed_dir / "l1_transport.parquet") 
-    else:
-        transport_gdf = gpd.read_file(processed_dir / "l1_transport.geojson") 
-
-    # extract coordinates
-    poi_gdf = poi_gdf.to_crs("EPSG:4326") 
-    poi_gdf['latitude'] = poi_gdf.geometry.y
-    poi_gdf['longitude'] = poi_gdf.geometry.x
-
-    transport_gdf = transport_gdf.to_crs("EPSG:4326")
-    transport_gdf['latitude'] = transport_gdf.geometry.y
-    transport_gdf['longitude'] = transport_gdf.geometry.x
-
-    # map to h3
-    print(f"-> Mapping points to h3 resolution {res}...")
-    poi_df = assign_h3(poi_gdf, 'latitude', 'longitude', res)
-    poi_df = poi_df[['h3_index', 'sub_category']].copy()
-    transport_df = assign_h3(transport_gdf,'latitude', 'longitude', res)
-    transport_df = normalize_transport_columns(transport_df)
-    transport_df = transport_df[['h3_index', 'sub_category']].copy()
+    with span("features.load_layers") as record:
+        poi_df = load_layer_points(processed_dir, "l2_poi", ['sub_category'] + INDEX_COLUMNS, allow_geojson)
+        transport_df = load_layer_points(processed_dir, "l1_transport", TRANSPORT_COLUMNS + INDEX_COLUMNS, allow_geojson)
+        record['rows_out'] = len(poi_df) + len(transport_df)
 
-    # merge dataframes
+    # map to h3 (uint64 cells) and align to the L0 grid with a sorted-integer join
+    print(f"-> Mapping points to h3 resolution {res} and aligning them to the L0 grid...")
+    transport_df = normalize_transport_columns(transport_df)
+    points_df = pd.concat([
+        poi_df.reindex(columns=['lat', 'lon', 'sub_category'] + INDEX_COLUMNS).assign(layer="l2_poi"),
+        transport_df.reindex(columns=['lat', 'lon', 'sub_category'] + INDEX_COLUMNS).assign(layer="l1_transport")
+    ], ignore_index=True)
+    points_df = compact_frame(points_df, report="feature points") # categorical sub-categories
+    grid_cells = load_grid_cells(processed_dir)
+
+    with span("features.grid_join", rows_in=len(points_df)) as record:
+        cells = latlng_to_cells_int(points_df['lat'].to_numpy(), points_df['lon'].to_numpy(), res)
+        rows = np.searchsorted(grid_cells, cells)
+        in_grid = grid_cells[np.minimum(rows, len(grid_cells) - 1)] == cells
+        record['rows_out'] = int(in_grid.sum())
+    print(f"-> Dropped {int((~in_grid).sum())} of {len(points_df)} points outside the L0 grid.")
+
+    # sparse counts: rows = every grid cell (empty ones are implicit), cols = POI amenities
     print("-> Creating H3-points matrix...")
-    master_df = pd.concat([poi_df, transport_df])
-
-    # pivot table such that rows = h3, cols = POI amenities, values = counts
-    raw_counts_matrix = pd.crosstab(master_df['h3_index'], master_df['sub_category'])
-    print(f"-> Matrix Shape: {raw_counts_matrix.shape} (hexagons x features)")
-
-    # apply TF-IDF normalization
+    with span("features.counts", rows_in=int(in_grid.sum())) as record:
+        # columns from the categorical codes (missing sub-categories are counted as "nan", sorted like the category names)
+        sub_category = points_df['sub_category']
+        if sub_category.isna().any():
+            sub_category = sub_category.cat.add_categories("nan").fillna("nan")
+        used, code_idx = np.unique(sub_category.cat.codes.to_numpy()[in_grid], return_inverse=True)
+        names = np.asarray(sub_category.cat.categories.astype(str), dtype=object)[used]
+        order = np.argsort(names, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        columns, col_idx = names[order], rank[code_idx]
+        raw_counts = sparse.csr_matrix(
+            (np.ones(len(col_idx), dtype=np.int64), (rows[in_grid], col_idx)),
+            shape = (len(grid_cells), len(columns))
+        )
+        raw_counts.sum_duplicates()
+        raw_features = SparseFeatures(h3=grid_cells, matrix=raw_counts, columns=columns.tolist())
+        nonempty = raw_features.nonempty_rows()
+        record['rows_out'] = len(nonempty)
+    print(f"-> Matrix Shape: {raw_counts.shape} (grid hexagons x features), {len(nonempty)} non-empty, {raw_counts.nnz} non-zeros")
+
+    # apply TF-IDF normalization (idf fitted on the non-empty hexagons, empty rows stay zero)
     print("Applying TD-IDF normalization (scarcity weighting)")
-    tfidf = TfidfTransformer(smooth_idf=True, norm='l2')
-    tfidf_matrix = pd.DataFrame(
-        tfidf.fit_transform(raw_counts_matrix).toarray(),
-        index = raw_counts_matrix.index,
-        columns = raw_counts_matrix.columns
-    )
+    with span("features.tfidf", rows_in=len(nonempty)) as record:
+        tfidf = TfidfTransformer(smooth_idf=True, norm='l2').fit(raw_counts[nonempty])
+        tfidf_features = SparseFeatures(h3=grid_cells, matrix=tfidf.transform(raw_counts).tocsr(), columns=columns.tolist())
+        record['rows_out'] = len(nonempty)
+
+    # dense views of the non-empty hexagons (previous outputs)
+    raw_counts_matrix = raw_features.to_frame()
+    tfidf_matrix = tfidf_features.to_frame()
 
     # save
-    tfidf_matrix.to_parquet(out_path)
-    raw_counts_matrix.to_parquet(processed_dir / "l3_features_raw.parquet")
+    with span("features.save", rows_in=len(tfidf_matrix)):
+        tfidf_matrix.to_parquet(out_path)
+        raw_counts_matrix.to_parquet(processed_dir / "l3_features_raw.parquet")
+
+        # grid-aligned sparse matrices (every L0 hexagon, cost proportional to the non-zeros)
+        write_sparse_features(tfidf_features, processed_dir / "l3_features_tfidf_sparse.npz")
+        write_sparse_features(raw_features, processed_dir / "l3_features_raw_sparse.npz")
+
+        # arrow feature stores (memory-mapped, zero-copy reads for the clustering processes)
+        compression = config.get('features', {}).get('store_compression')
+        write_feature_store(tfidf_matrix, processed_dir / "l3_features_tfidf.arrow", compression=compression)
+        write_feature_store(raw_counts_matrix, processed_dir / "l3_features_raw.arrow", compression=compression)
+
+        # inverted index: the points of every hexagon as one contiguous slice (drill-down, lookup service)
+        write_point_index(
+            cells[in_grid],
+            points_df.loc[in_grid, ['layer', 'sub_category'] + INDEX_COLUMNS + ['lon', 'lat']],
+            processed_dir / "l3_point_index.arrow"
+        )
 
     # check
     print("\nTop 5 most important features across the city:")
@@ -115,4 +217,9 @@ def build_features():
 
 
 if __name__ == '__main__':
-    build_features()
+    config = load_config()
+    owns_run = start_run(config['paths']['logs'], run_name="features")
+    build_features(config)
+    if owns_run:
+        print_summary()
+        end_run()
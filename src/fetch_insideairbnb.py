@@ -3,27 +3,28 @@
 
 # === 1. IMPORTS ===
 
-import requests
-import gzip
-import shutil
+# only light imports here: this step must not pay for osmnx/geopandas/sklearn
 import pandas as pd
-import h3
-from typing import Union
+from typing import Any, Dict, Optional, Union
 from pathlib import Path
-from src.utils import load_config, assign_h3
+from src.config import load_config
+from src.hexes import assign_h3, cells_to_int, CompactCellSet
+from src.schema import compact_frame
 
 
 # === 2. FUNCTION TO FETCH AND PROCESS INSIDE AIRBNB DATA ===
 
 def process_str_data(
         file_path: Union[str, Path],
-        h3_resolution: int
+        h3_resolution: int,
+        config: Optional[Dict[str, Any]] = None
 ) -> pd.DataFrame:
     """
     Processes Inside Airbnb data for Milan by extracting listings, cleaning, and assigning H3 indices.
     Args:
         file_path (Union[str, Path]): Path to the Inside Airbnb CSV data file.
         h3_resolution (int): H3 resolution level for indexing.
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
 
     Returns:
         pd.DataFrame: Processed DataFrame with H3 indices.
@@ -32,12 +33,13 @@ def process_str_data(
         2. Filter listings based on specified criteria from settings.yaml.
         3. Assign H3 indices to each listing based on latitude and longitude.
         4. Compute per person per night price for each H3 cell.
-        5. Return the processed DataFrame.
+        5. Save the per-cell statistics and the filtered listings with compact dtypes (see src/schema.py), and return the statistics.
     """
     print(f"-> Processing Inside Airbnb data from {file_path}...")
 
     # load data and settings
-    config = load_config()
+    if config is None:
+        config = load_config()
     paths = config['paths']
     filters = config['data_sources']['inside_airbnb']['filters']
     filename = config['data_sources']['inside_airbnb']['filename']
@@ -49,7 +51,7 @@ def process_str_data(
     # load data
     print(f"-> Loading {filename} data from {input_path}...")
     cols = ['id', 'latitude', 'longitude', 'price', 'accommodates', 'room_type', 'minimum_nights', 'number_of_reviews', 'last_review']
-    df = pd.read_csv(input_path, usecols=cols)
+    df = pd.read_csv(input_path, usecols=cols, dtype={'room_type': "category"})
     original_len = len(df)
     
     # clean price column
@@ -93,6 +95,16 @@ def process_str_data(
     # assign H3 indices
     df = assign_h3(df, 'latitude', 'longitude', h3_resolution)
 
+    # keep only listings inside the study area (compacted L0 cells, no polygon test)
+    area_path = Path(paths['processed']) / "l0_area_cells.npy"
+    if filters.get('study_area_only') and area_path.exists():
+        area_cells = CompactCellSet.load(area_path)
+        inside = area_cells.contains_cells(cells_to_int(df['h3_index']))
+        print(f"-> Dropped {int((~inside).sum())} listings outside the study area.")
+        df = df[inside]
+    elif filters.get('study_area_only'):
+        print(f"!! No study area at {area_path} (run Layer 0 first). Keeping every listing.")
+
     # compute per hexagon statistics
     h3_stats = df.groupby('h3_index').agg(
         listings_count=('id', 'count'),
@@ -100,11 +112,18 @@ def process_str_data(
         avg_capacity=('accommodates', 'mean'),
         avg_price_original=('price', 'mean')
     ).reset_index()
+    h3_stats = compact_frame(h3_stats, report="Inside Airbnb hexagon statistics")
 
     # save processed data
     h3_stats.to_csv(output_path, index=False)
     h3_stats.to_parquet(output_path.with_suffix('.parquet'), index=False)
     print(f"-> Processed data saved to {output_path} and {output_path.with_suffix('.parquet')}.")
+
+    # filtered listings (coordinates and prices), used by the price surface of src/price_surface.py
+    listings_path = Path(paths['processed']) / "insideairbnb_listings.parquet"
+    listings = compact_frame(df[['id', 'latitude', 'longitude', 'price_pp', 'accommodates', 'h3_index']], h3="uint64", report="Inside Airbnb listings")
+    listings.to_parquet(listings_path, index=False)
+    print(f"-> Filtered listings saved to {listings_path}.")
     print("Processing complete.")
     return h3_stats
 
@@ -3,45 +3,39 @@
 
 # === 1. IMPORTS ===
 
+# geopandas/shapely are imported inside the functions, so the pipeline runner can import this module cheaply
+from __future__ import annotations
+
 # general
-from typing import List, Set, Union
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple, Union
 
 # geospatial 
-import geopandas as gpd
+import numpy as np
 import h3
-from shapely.geometry import Polygon, MultiPolygon
-from shapely.geometry.base import BaseGeometry
 
+# internal
+from src.instrument import instrumented
 
-# === 2. GENERATE H3 HEXAGON GRID ===
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from shapely.geometry import Polygon, MultiPolygon
+    from shapely.geometry.base import BaseGeometry
 
-def generate_h3_grid(
-    area: Union[Polygon, MultiPolygon, BaseGeometry],
-    resolution: int
-    ) -> gpd.GeoDataFrame:
+
+# === 2. POLYFILL HELPERS ===
+
+def _polyfill(area: Union[Polygon, MultiPolygon, BaseGeometry], resolution: int) -> Set[str]:
     """
-    Generates an H3 hexagon grid covering a boundary of a given area.
-    Args:
-        area (gpd.GeoDataFrame): GeoDataFrame containing the boundary geometry.
-        resolution (int): H3 resolution level (0-15).
-    Returns:
-        gpd.GeoDataFrame: A df containing the H3 hexagon grid covering the area.
+    Fills every polygon part of an area with H3 cells (cells whose centre falls inside the area).
     Logic:
-        1. Extract the geometry of the area. It might be a Polygon or MultiPolygon. 
-        2. Coordinates must be swapped from (Lon, Lat) of Shapely/Geopandas to (Lat, Lon) of H3. 
-        We must make sure we don't miss any interior gap.
-        3. Fill the are with H3 hexagons at the specified resolution.
-        4. Convert H3 hexagons to Shapely polygons and create a GeoDataFrame. Convert (Lat, Lon) back to (Lon, Lat).
+        1. Extract the polygon parts of the area (MultiPolygon, or GeometryCollection after a clip).
+        2. Coordinates must be swapped from (Lon, Lat) of Shapely/Geopandas to (Lat, Lon) of H3, keeping the interior holes.
+        3. Fill each part and union the cells (a Set avoids duplicates if parts overlap slightly).
     """
-    print(f"-> Generating H3 grid at resolution {resolution}...")
+    # extract the polygon parts of the area
+    polys = [geom for geom in getattr(area, "geoms", [area]) if geom.geom_type in ("Polygon", "MultiPolygon")]
+    polys = [part for geom in polys for part in getattr(geom, "geoms", [geom]) if not part.is_empty]
 
-    # extract the geometry of the area (convert MultiPolygon to list of Polygons if needed)
-    if isinstance(area, MultiPolygon):
-        polys = list(area.geoms)
-    else:
-        polys = [area]
-    
-    # use a Set to avoid duplicates if polygons overlap slightly
     hex_ids: Set[str] = set()
 
     # coordinate swap 
@@ -58,31 +52,126 @@ def generate_h3_grid(
         try:
             # create a LatLngPoly object as H3 requires
             poly_obj = h3.LatLngPoly(exterior_coords, *interior_coords)
-            # fill the polygon with hexagons
-            filled_hexes = h3.polygon_to_cells(poly_obj, resolution)
-            # add to the Set
-            hex_ids.update(filled_hexes)
+            # fill the polygon with hexagons and add them to the Set
+            hex_ids.update(h3.polygon_to_cells(poly_obj, resolution))
         except Exception as e:
             print(f"!! Warning: Couldn't fill a polygon part: {e}")
-    
-    print(f"-> Generated {len(hex_ids)} hexagons covering the area.")
-
-    # reconstruct geometry and convert back to (Lon, Lat)
-    hex_data = []
-    for hex_id in hex_ids:
-        hex_boundary_latlon = h3.cell_to_boundary(hex_id) # returns list of (Lat, Lon)
-        # swap back to (Lon, Lat)
-        hex_boundary_lonlat = [(lon, lat) for lat, lon in hex_boundary_latlon]
-        # create Shapely polygon
-        hex_polygon = Polygon(hex_boundary_lonlat)
-        hex_data.append(
-            {
-                "h3_index": hex_id,
-                "geometry": hex_polygon
-            }
-        )
+
+    return hex_ids
+
+def _cell_boundaries(cells: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Boundaries of the cells as one flat (Lon, Lat) vertex array plus the number of vertices of each cell.
+    """
+    rings = [h3.cell_to_boundary(cell) for cell in cells] # returns list of (Lat, Lon)
+    lengths = np.fromiter(map(len, rings), dtype=np.int64, count=len(rings))
+    if len(rings) and (lengths == lengths[0]).all():
+        latlng = np.asarray(rings, dtype=float).reshape(-1, 2)
+    else:
+        latlng = np.array([vertex for ring in rings for vertex in ring], dtype=float).reshape(-1, 2)
+    # swap back to (Lon, Lat)
+    return latlng[:, ::-1], lengths
+
+def _cells_to_polygons(coords: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Builds the hexagon polygons from their boundary vertices in one vectorised call (one ring per cell).
+    """
+    import shapely
+
+    if len(lengths) == 0:
+        return np.empty(0, dtype=object)
+    rings = shapely.linearrings(coords, indices=np.repeat(np.arange(len(lengths)), lengths))
+    return shapely.polygons(rings)
+
+def _fill_strip(
+    area_wkb: bytes,
+    resolution: int,
+    lon_min: float,
+    lon_max: float,
+    margin: float
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Fills one longitude strip of the area (runs in a worker process).
+    The area is clipped to the strip widened by `margin`, and only cells whose centre longitude falls in [lon_min, lon_max) are kept,
+    so every cell belongs to exactly one strip and the union over the strips equals the serial fill.
+    Returns:
+        Tuple[List[str], np.ndarray, np.ndarray]: The strip's cells, their boundary vertices and vertex counts.
+    """
+    import shapely
+
+    area = shapely.from_wkb(area_wkb)
+    _, min_lat, _, max_lat = area.bounds
+    clip = shapely.box(max(lon_min - margin, -180), min_lat - margin, min(lon_max + margin, 180), max_lat + margin)
+
+    cells = sorted(
+        cell for cell in _polyfill(area.intersection(clip), resolution)
+        if lon_min <= h3.cell_to_latlng(cell)[1] < lon_max
+    )
+    coords, lengths = _cell_boundaries(cells)
+    return cells, coords, lengths
+
+def _strip_edges(min_lon: float, max_lon: float, partitions: int) -> List[Tuple[float, float]]:
+    edges = np.linspace(min_lon, max_lon, partitions + 1)
+    edges[0], edges[-1] = -np.inf, np.inf # the outer strips take every centre beyond the bounds
+    return list(zip(edges[:-1], edges[1:]))
+
+
+# === 3. GENERATE H3 HEXAGON GRID ===
+
+@instrumented()
+def generate_h3_grid(
+    area: Union[Polygon, MultiPolygon, BaseGeometry],
+    resolution: int,
+    workers: int = 1,
+    partitions: Optional[int] = None
+    ) -> gpd.GeoDataFrame:
+    """
+    Generates an H3 hexagon grid covering a boundary of a given area.
+    Args:
+        area (gpd.GeoDataFrame): GeoDataFrame containing the boundary geometry.
+        resolution (int): H3 resolution level (0-15).
+        workers (int): Processes filling the area in parallel (1 = serial fill in this process).
+        partitions (Optional[int]): Longitude strips the area is split into when workers > 1. Defaults to 4 per worker.
+    Returns:
+        gpd.GeoDataFrame: A df containing the H3 hexagon grid covering the area, sorted by h3_index.
+    Logic:
+        1. Serial: fill every polygon part of the area (see _polyfill) and compute the cell boundaries.
+        2. Parallel: split the area into longitude strips, fill each strip (and its boundaries) in a process pool and concatenate.
+        Each cell is kept only by the strip holding its centre, so the result is identical to the serial fill.
+        3. Build the hexagon polygons with vectorised calls and create a GeoDataFrame in (Lon, Lat).
+    """
+    import geopandas as gpd
+    import shapely
+
+    print(f"-> Generating H3 grid at resolution {resolution}...")
+
+    if workers <= 1:
+        cells = sorted(_polyfill(area, resolution))
+        geometries = _cells_to_polygons(*_cell_boundaries(cells))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        partitions = partitions or 4 * workers
+        min_lon, _, max_lon, _ = area.bounds
+        # clip margin of ~2 cell edges, so clip edges never sit next to a kept cell centre
+        margin = 2 * h3.average_hexagon_edge_length(resolution, unit="km") / 111.0
+        strips = _strip_edges(min_lon, max_lon, partitions)
+        area_wkb = shapely.to_wkb(area)
+
+        print(f"-> Filling {partitions} strips with {workers} workers...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_fill_strip, area_wkb, resolution, lon_min, lon_max, margin) for lon_min, lon_max in strips]
+            results = [future.result() for future in futures]
+
+        # strips are disjoint: concatenate, then sort to match the serial order
+        cells = [cell for strip_cells, _, _ in results for cell in strip_cells]
+        geometries = np.concatenate([_cells_to_polygons(coords, lengths) for _, coords, lengths in results])
+        order = np.argsort(np.array(cells, dtype=object), kind="stable")
+        cells, geometries = [cells[i] for i in order], geometries[order]
+
+    print(f"-> Generated {len(cells)} hexagons covering the area.")
 
     # create GeoDataFrame
-    hex_gdf = gpd.GeoDataFrame(hex_data, geometry="geometry", crs="EPSG:4326")
+    hex_gdf = gpd.GeoDataFrame({"h3_index": cells}, geometry=geometries, crs="EPSG:4326")
 
-    return hex_gdf
\ No newline at end of file
+    return hex_gdf
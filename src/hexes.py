@@ -0,0 +1,184 @@
+# src/hexes.py
+
+# === 1. IMPORTS ===
+
+# kept light on purpose: pandas is only needed for type hints here
+from __future__ import annotations
+
+# general
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, Tuple, Union
+
+# third party
+import numpy as np
+import h3
+import h3.api.basic_int as h3_int
+
+# internal
+from src.instrument import instrumented
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+# === 2. H3 UTILS ===
+
+@instrumented()
+def assign_h3(
+        df: pd.DataFrame,
+        lat_col: str,
+        lon_col: str,
+        res: int
+) -> pd.DataFrame:
+    """
+    Assigns H3 hexagonal grid indices to each listing based on latitude and longitude. Handles different versions of the h3 library for safety.
+    Args:
+        df (pd.DataFrame): DataFrame containing listing data with latitude and longitude columns.
+        lat_col (str): Name of the latitude column.
+        lon_col (str): Name of the longitude column.
+        res (int): H3 resolution level.
+    Returns:
+        pd.DataFrame: DataFrame with an additional 'h3_index' column.
+    """
+    try:
+        df['h3_index'] = df.apply(lambda x: h3.latlng_to_cell(x[lat_col], x[lon_col], res), axis=1)
+    except AttributeError:
+        df['h3_index'] = df.apply(lambda row: h3.geo_to_h3(row[lat_col], row[lon_col], res), axis=1)
+    return df
+
+def latlng_to_cells(lats: Iterable[float], lons: Iterable[float], res: int) -> List[str]:
+    """
+    Maps coordinate arrays to H3 cells in one pass (no row-wise DataFrame.apply).
+    Args:
+        lats (Iterable[float]): Latitudes.
+        lons (Iterable[float]): Longitudes.
+        res (int): H3 resolution level.
+    Returns:
+        List[str]: One H3 cell per coordinate pair.
+    """
+    to_cell = h3.latlng_to_cell
+    return [to_cell(lat, lon, res) for lat, lon in zip(lats, lons)]
+
+
+# === 3. INTEGER H3 UTILS ===
+
+# 64-bit H3 cell layout: resolution in bits 52-55, then 15 digits of 3 bits (digit k at bits 3 * (15 - k)), unused digits set to 7
+H3_RES_SHIFT = 52
+H3_RES_MASK = np.uint64(0xF << H3_RES_SHIFT)
+
+def latlng_to_cells_int(lats: Iterable[float], lons: Iterable[float], res: int) -> np.ndarray:
+    """
+    Maps coordinate arrays to H3 cells as uint64 (no hex strings are built).
+    """
+    to_cell = h3_int.latlng_to_cell
+    return np.fromiter((to_cell(lat, lon, res) for lat, lon in zip(lats, lons)), dtype=np.uint64)
+
+def cells_to_int(cells: Iterable[Union[str, int]]) -> np.ndarray:
+    """
+    Converts H3 cells (hex strings or integers) to a uint64 array.
+    """
+    return np.fromiter((h3.str_to_int(c) if isinstance(c, str) else c for c in cells), dtype=np.uint64)
+
+def cells_to_latlng(cells: Iterable[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Centre (Lat, Lon) arrays of uint64 H3 cells.
+    """
+    to_latlng = h3_int.cell_to_latlng
+    latlng = np.array([to_latlng(int(c)) for c in cells], dtype=float).reshape(-1, 2)
+    return latlng[:, 0], latlng[:, 1]
+
+def cell_resolutions(cells: np.ndarray) -> np.ndarray:
+    """
+    Resolution of each uint64 H3 cell, read from its resolution bits.
+    """
+    return ((np.asarray(cells, dtype=np.uint64) & H3_RES_MASK) >> np.uint64(H3_RES_SHIFT)).astype(np.int8)
+
+def cells_to_parents(cells: np.ndarray, res: int) -> np.ndarray:
+    """
+    Parents of uint64 H3 cells at a coarser resolution, with bit operations only (cells must have a resolution >= res).
+    Logic:
+        1. Overwrite the resolution bits with `res`.
+        2. Set the digits finer than `res` to 7 (unused).
+    """
+    unused_digits = sum(7 << (3 * (15 - digit)) for digit in range(res + 1, 16))
+    cells = np.asarray(cells, dtype=np.uint64)
+    return (cells & ~H3_RES_MASK) | np.uint64(res << H3_RES_SHIFT) | np.uint64(unused_digits)
+
+def isin_sorted(values: np.ndarray, sorted_array: np.ndarray) -> np.ndarray:
+    """
+    Vectorised membership test against a sorted array (binary search, no hashing).
+    """
+    if len(sorted_array) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.searchsorted(sorted_array, values)
+    return sorted_array[np.minimum(pos, len(sorted_array) - 1)] == values
+
+
+# === 4. COMPACTED CELL SETS ===
+
+class CompactCellSet:
+    """
+    An area as a compacted set of H3 cells (mixed resolutions from h3.compact_cells), answering containment by parent lookups.
+    A cell is inside the area if its parent at one of the set's resolutions is in the set: one lookup per resolution level,
+    instead of a point-in-polygon test against thousands of boundary vertices.
+    """
+
+    def __init__(self, compacted: np.ndarray):
+        compacted = np.asarray(compacted, dtype=np.uint64)
+        resolutions = cell_resolutions(compacted)
+
+        # sorted arrays for batch queries, hash sets for single lookups
+        self.levels: Dict[int, np.ndarray] = {int(r): np.sort(compacted[resolutions == r]) for r in np.unique(resolutions)}
+        self.level_sets: Dict[int, FrozenSet[int]] = {r: frozenset(arr.tolist()) for r, arr in self.levels.items()}
+        self.max_resolution = max(self.levels, default=0)
+
+    @classmethod
+    def from_cells(cls, cells: Iterable[Union[str, int]]) -> "CompactCellSet":
+        """
+        Builds the set from cells of one resolution (e.g. the L0 grid), compacting them.
+        """
+        cells = [h3.int_to_str(int(c)) if not isinstance(c, str) else c for c in cells]
+        return cls(cells_to_int(h3.compact_cells(cells)) if cells else np.empty(0, dtype=np.uint64))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "CompactCellSet":
+        """
+        Loads a set saved with save() (a .npy array of compacted uint64 cells).
+        """
+        return cls(np.load(path))
+
+    def save(self, path: Union[str, Path]) -> None:
+        np.save(path, self.cells())
+
+    def cells(self) -> np.ndarray:
+        """
+        The compacted cells (uint64, mixed resolutions).
+        """
+        return np.concatenate(list(self.levels.values())) if self.levels else np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return sum(len(arr) for arr in self.levels.values())
+
+    def __contains__(self, cell: Union[str, int]) -> bool:
+        cell = h3.str_to_int(cell) if isinstance(cell, str) else int(cell)
+        cell_res = h3_int.get_resolution(cell)
+        return any(
+            h3_int.cell_to_parent(cell, r) in cells
+            for r, cells in self.level_sets.items() if r <= cell_res
+        )
+
+    def contains_cells(self, cells: np.ndarray) -> np.ndarray:
+        """
+        Batch containment for uint64 cells of any resolution >= max_resolution.
+        """
+        cells = np.asarray(cells, dtype=np.uint64)
+        inside = np.zeros(len(cells), dtype=bool)
+        for r, level in self.levels.items():
+            inside |= isin_sorted(cells_to_parents(cells, r), level)
+        return inside
+
+    def contains_latlng(self, lats: Iterable[float], lons: Iterable[float]) -> np.ndarray:
+        """
+        Batch point-in-area test: points are mapped to cells at the finest resolution of the set, then looked up level by level.
+        """
+        return self.contains_cells(latlng_to_cells_int(lats, lons, self.max_resolution))
@@ -0,0 +1,190 @@
+# src/instrument.py
+
+# === 1. IMPORTS ===
+
+# general
+import functools
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+
+# === 2. RUN LOG ===
+
+# the run is identified through environment variables so that worker processes (pipeline, exports) log into the same file
+RUN_LOG_ENV = "PROXY_RUN_LOG"
+RUN_ID_ENV = "PROXY_RUN_ID"
+
+def start_run(log_dir: Union[str, Path], run_name: str = "run") -> bool:
+    """
+    Starts a run log (JSON lines) unless one is already active in this process or a parent process.
+    Args:
+        log_dir (Union[str, Path]): Directory of the run logs.
+        run_name (str): Prefix of the log file name.
+    Returns:
+        bool: True if a new run was started (the caller should then call print_summary at the end).
+    """
+    if os.environ.get(RUN_LOG_ENV):
+        return False
+
+    run_id = f"{run_name}_{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    log_path = Path(log_dir) / f"{run_id}.jsonl"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    os.environ[RUN_LOG_ENV] = str(log_path)
+    os.environ[RUN_ID_ENV] = run_id
+    print(f"-> Logging run {run_id} to {log_path}")
+    return True
+
+def end_run() -> None:
+    """
+    Detaches the current process from the active run log.
+    """
+    os.environ.pop(RUN_LOG_ENV, None)
+    os.environ.pop(RUN_ID_ENV, None)
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set size of the current process in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return peak / (1024 ** 2) if sys.platform == "darwin" else peak / 1024
+
+def _count_rows(obj: Any) -> Optional[int]:
+    """
+    Number of rows of a DataFrame-like object (None for anything else).
+    """
+    if hasattr(obj, "shape") and hasattr(obj, "__len__"):
+        return len(obj)
+    return None
+
+def _write_record(record: Dict[str, Any]) -> None:
+    log_path = os.environ.get(RUN_LOG_ENV)
+    if not log_path:
+        return
+    # one short line per write, appends from several processes don't interleave
+    with open(log_path, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+# === 3. SPANS ===
+
+@contextmanager
+def span(name: str, rows_in: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Times a block of code and records wall time, peak RSS and row counts in the run log.
+    Args:
+        name (str): Name of the span.
+        rows_in (Optional[int]): Number of input rows.
+    Yields:
+        Dict[str, Any]: The span record. Set record['rows_out'] (or 'rows_in') inside the block.
+    Example:
+        with span("features.crosstab", rows_in=len(df)) as record:
+            matrix = pd.crosstab(...)
+            record['rows_out'] = len(matrix)
+    """
+    record: Dict[str, Any] = {
+        "run_id": os.environ.get(RUN_ID_ENV),
+        "span": name,
+        "pid": os.getpid(),
+        "start": time.time(),
+        "rows_in": rows_in,
+        "rows_out": None,
+        "status": "ok"
+    }
+    rss_before = peak_rss_mb()
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException:
+        record["status"] = "error"
+        raise
+    finally:
+        record["wall_s"] = round(time.perf_counter() - t0, 4)
+        record["peak_rss_mb"] = peak_rss_mb()
+        if rss_before is not None:
+            record["rss_growth_mb"] = round(record["peak_rss_mb"] - rss_before, 2)
+        _write_record(record)
+
+def instrumented(name: Optional[str] = None) -> Callable:
+    """
+    Decorator version of span(). Input rows are taken from the first DataFrame-like argument, output rows from the result.
+    Args:
+        name (Optional[str]): Name of the span. Defaults to the function name.
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = next(
+                (n for n in map(_count_rows, list(args) + list(kwargs.values())) if n is not None),
+                None
+            )
+            with span(span_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = _count_rows(result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+# === 4. SUMMARY ===
+
+def load_run(log_path: Optional[Union[str, Path]] = None) -> List[Dict[str, Any]]:
+    """
+    Reads the span records of a run log (defaults to the active run).
+    """
+    log_path = log_path or os.environ.get(RUN_LOG_ENV)
+    if not log_path or not Path(log_path).exists():
+        return []
+    with open(log_path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def print_summary(log_path: Optional[Union[str, Path]] = None) -> None:
+    """
+    Prints an end-of-run table aggregated per span: calls, total/max wall time, max peak RSS and rows in/out.
+    Args:
+        log_path (Optional[Union[str, Path]]): Run log to summarise. Defaults to the active run.
+    """
+    records = load_run(log_path)
+    if not records:
+        print("-> No instrumentation records for this run.")
+        return
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    for rec in records:
+        row = summary.setdefault(rec["span"], {"calls": 0, "total_s": 0.0, "max_s": 0.0, "peak_mb": 0.0, "rows_in": 0, "rows_out": 0, "errors": 0})
+        row["calls"] += 1
+        row["total_s"] += rec["wall_s"]
+        row["max_s"] = max(row["max_s"], rec["wall_s"])
+        row["peak_mb"] = max(row["peak_mb"], rec.get("peak_rss_mb") or 0.0)
+        row["rows_in"] += rec.get("rows_in") or 0
+        row["rows_out"] += rec.get("rows_out") or 0
+        row["errors"] += rec["status"] != "ok"
+
+    header = f"{'span':<32} {'calls':>5} {'total_s':>9} {'max_s':>8} {'peak_MB':>8} {'rows_in':>9} {'rows_out':>9} {'err':>4}"
+    print("\n-> RUN SUMMARY (slowest first)")
+    print(header)
+    print("-" * len(header))
+    for name, row in sorted(summary.items(), key=lambda item: -item[1]["total_s"]):
+        print(
+            f"{name[:32]:<32} {row['calls']:>5} {row['total_s']:>9.2f} {row['max_s']:>8.2f} "
+            f"{row['peak_mb']:>8.0f} {row['rows_in']:>9} {row['rows_out']:>9} {row['errors']:>4}"
+        )
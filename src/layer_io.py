@@ -0,0 +1,381 @@
+# src/layer_io.py
+
+# === 1. IMPORTS ===
+
+# general
+import json
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# third party (geopandas and shapely are only needed to convert to/from GeoDataFrames)
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import h3
+
+# internal
+from src.hexes import latlng_to_cells
+from src.instrument import instrumented
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+
+# === 2. PARTITIONED LAYER WRITER ===
+
+PARTITION_COLUMN = "h3_parent"
+GEOMETRY_COLUMN = "geometry"
+PARTITIONING = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive")
+
+# GeoParquet metadata (WKB points in lon/lat, the default OGC:CRS84 so no crs entry is needed)
+GEO_METADATA = {
+    "version": "1.0.0",
+    "primary_column": GEOMETRY_COLUMN,
+    "columns": {GEOMETRY_COLUMN: {"encoding": "WKB", "geometry_types": ["Point"]}}
+}
+
+class PartitionedLayerWriter:
+    """
+    Streams point layers into a GeoParquet dataset partitioned by a coarse H3 parent (hive layout: <root>/h3_parent=<cell>/part-0.parquet).
+    Every write() call (e.g. one POI category) becomes one row group per partition, with min/max statistics on every column,
+    so readers can skip partitions (h3_parent) and row groups (category, lon/lat) they don't need.
+    The dataset is written to <root>.tmp and swapped in on close(), so a failed run never leaves a half-written layer.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        partition_resolution: int = 6,
+        compression: str = "brotli"
+    ):
+        self.root = Path(root)
+        self.tmp_root = self.root.with_name(self.root.name + ".tmp")
+        self.partition_resolution = partition_resolution
+        self.compression = compression
+        self.schema: Optional[pa.Schema] = None
+        self.writers: Dict[str, pq.ParquetWriter] = {}
+        self.rows_written = 0
+
+        if self.tmp_root.exists():
+            shutil.rmtree(self.tmp_root)
+        self.tmp_root.mkdir(parents=True)
+
+    def __enter__(self) -> "PartitionedLayerWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _to_table(self, gdf: "gpd.GeoDataFrame", constants: Dict[str, Any]) -> pa.Table:
+        """
+        Converts points to an Arrow table: attributes, lon/lat, WKB geometry and the H3 parent (partition key).
+        """
+        import shapely
+
+        gdf = gdf.to_crs("EPSG:4326") if gdf.crs is not None and not gdf.crs.equals("EPSG:4326") else gdf
+        lons, lats = gdf.geometry.x.to_numpy(), gdf.geometry.y.to_numpy()
+
+        df = gdf.drop(columns=GEOMETRY_COLUMN).reset_index(drop=True)
+        for key, value in constants.items():
+            df[key] = value
+        df['lon'] = lons
+        df['lat'] = lats
+        df[PARTITION_COLUMN] = latlng_to_cells(lats, lons, self.partition_resolution)
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.append_column(GEOMETRY_COLUMN, pa.array(shapely.to_wkb(gdf.geometry.values), type=pa.binary()))
+
+        # sort by latitude so each row group's lat statistics are as tight as possible
+        return table.sort_by([(PARTITION_COLUMN, "ascending"), ("lat", "ascending")])
+
+    def _conform(self, table: pa.Table) -> pa.Table:
+        """
+        Aligns a table to the dataset schema (fixed by the first write): missing columns become nulls, extra ones are dropped.
+        The partition column lives in the directory names, not in the files.
+        """
+        columns = [
+            table.column(f.name).cast(f.type) if f.name in table.column_names else pa.nulls(len(table), type=f.type)
+            for f in self.schema
+        ]
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    @instrumented("layer_io.write")
+    def write(self, gdf: "gpd.GeoDataFrame", **constants: Any) -> int:
+        """
+        Appends a batch of points to the dataset.
+        Args:
+            gdf (gpd.GeoDataFrame): Points to append.
+            **constants (Any): Columns with one value for the whole batch (e.g. category="food_nighlife").
+        Returns:
+            int: Number of rows written.
+        """
+        if len(gdf) == 0:
+            return 0
+
+        table = self._to_table(gdf, constants)
+        if self.schema is None:
+            # categorical/Arrow string columns are stored as plain strings (Parquet dictionary-encodes them anyway),
+            # so batches with different category sets conform to the same schema
+            fields = [
+                f.with_type(pa.string()) if pa.types.is_large_string(f.type) or pa.types.is_dictionary(f.type) else f
+                for f in table.schema if f.name != PARTITION_COLUMN
+            ]
+            self.schema = pa.schema(fields, metadata={b"geo": json.dumps(GEO_METADATA).encode()})
+
+        parents = table.column(PARTITION_COLUMN).to_pylist()
+
+        # rows are sorted by parent, so each partition is a contiguous slice
+        start = 0
+        while start < len(parents):
+            parent = parents[start]
+            end = start
+            while end < len(parents) and parents[end] == parent:
+                end += 1
+
+            writer = self.writers.get(parent)
+            if writer is None:
+                part_dir = self.tmp_root / f"{PARTITION_COLUMN}={parent}"
+                part_dir.mkdir()
+                writer = pq.ParquetWriter(part_dir / "part-0.parquet", self.schema, compression=self.compression, write_statistics=True)
+                self.writers[parent] = writer
+
+            writer.write_table(self._conform(table.slice(start, end - start)), row_group_size=end - start)
+            start = end
+
+        self.rows_written += len(table)
+        return len(table)
+
+    def close(self) -> Path:
+        """
+        Finalizes every partition file and swaps the new dataset in place of the old one.
+        Returns:
+            Path: The dataset root.
+        """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+        if self.root.is_dir():
+            shutil.rmtree(self.root)
+        elif self.root.exists():
+            self.root.unlink()
+        self.tmp_root.rename(self.root)
+        print(f"-> Saved {self.rows_written} points in {len(list(self.root.iterdir()))} partitions at: {self.root}")
+        return self.root
+
+    def abort(self) -> None:
+        """
+        Discards the partially written dataset (the previous one, if any, is left untouched).
+        """
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+        shutil.rmtree(self.tmp_root, ignore_errors=True)
+
+
+# === 3. READER ===
+
+def parents_for_bbox(bbox: Tuple[float, float, float, float], resolution: int) -> List[str]:
+    """
+    H3 parents that overlap a (minx, miny, maxx, maxy) lon/lat box, i.e. every partition that can hold a point inside it.
+    """
+    minx, miny, maxx, maxy = bbox
+    shape = h3.LatLngPoly([(miny, minx), (miny, maxx), (maxy, maxx), (maxy, minx)])
+    return list(h3.h3shape_to_cells_experimental(shape, resolution, contain="overlap"))
+
+def _partition_resolution(root: Path) -> Optional[int]:
+    part = next((p for p in root.iterdir() if p.name.startswith(f"{PARTITION_COLUMN}=")), None)
+    return h3.get_resolution(part.name.split("=", 1)[1]) if part else None
+
+@instrumented()
+def read_layer(
+    path: Union[str, Path],
+    categories: Optional[Sequence[str]] = None,
+    parents: Optional[Sequence[str]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    columns: Optional[List[str]] = None,
+    category_col: str = "category"
+) -> "gpd.GeoDataFrame":
+    """
+    Reads a point layer, pushing the category and spatial filters down to the partitions and row-group statistics.
+    Args:
+        path (Union[str, Path]): Partitioned dataset directory (or a single GeoParquet file written before partitioning).
+        categories (Optional[Sequence[str]]): Keep only these values of `category_col`.
+        parents (Optional[Sequence[str]]): Keep only these H3 partitions.
+        bbox (Optional[Tuple[float, float, float, float]]): Keep only points inside (minx, miny, maxx, maxy) in lon/lat.
+        columns (Optional[List[str]]): Attribute columns to read (geometry is always read). Defaults to all.
+        category_col (str): Column the categories filter applies to.
+    Returns:
+        gpd.GeoDataFrame: The selected points in EPSG:4326.
+    """
+    import geopandas as gpd
+
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"!! Layer not found at: {path}. Run its pipeline first.")
+
+    # single-file layers: no pushdown, filter after reading
+    if path.is_file():
+        gdf = gpd.read_parquet(path, columns=None if columns is None else columns + [GEOMETRY_COLUMN]).to_crs("EPSG:4326")
+        if categories is not None:
+            gdf = gdf[gdf[category_col].isin(categories)]
+        if bbox is not None:
+            gdf = gdf.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+        return gdf
+
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING)
+
+    filters = []
+    if categories is not None:
+        filters.append(ds.field(category_col).isin(list(categories)))
+    if bbox is not None:
+        resolution = _partition_resolution(path)
+        if resolution is not None:
+            bbox_parents = parents_for_bbox(bbox, resolution)
+            parents = bbox_parents if parents is None else [p for p in parents if p in set(bbox_parents)]
+        minx, miny, maxx, maxy = bbox
+        filters.append((ds.field('lon') >= minx) & (ds.field('lon') <= maxx) & (ds.field('lat') >= miny) & (ds.field('lat') <= maxy))
+    if parents is not None:
+        filters.append(ds.field(PARTITION_COLUMN).isin(list(parents)))
+
+    expression = None
+    for f in filters:
+        expression = f if expression is None else expression & f
+
+    read_columns = None if columns is None else list(dict.fromkeys(columns + [GEOMETRY_COLUMN]))
+    table = dataset.to_table(columns=read_columns, filter=expression)
+
+    df = table.drop_columns([GEOMETRY_COLUMN]).to_pandas()
+    geometry = gpd.GeoSeries.from_wkb(table.column(GEOMETRY_COLUMN).to_numpy(zero_copy_only=False), crs="EPSG:4326")
+    return gpd.GeoDataFrame(df, geometry=geometry.values, crs="EPSG:4326")
+
+# === 4. ARROW-NATIVE POINT READER ===
+
+# little-endian 2D WKB point: byte order (1) + geometry type (4) + x, y (2 x 8)
+WKB_POINT_SIZE = 21
+LONLAT_CRS = {"EPSG:4326", "OGC:CRS84"}
+
+def wkb_points_to_xy(wkb: Union[pa.Array, pa.ChunkedArray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes WKB points to coordinate arrays in bulk, reading the Arrow buffer directly (no Shapely objects).
+    Args:
+        wkb (Union[pa.Array, pa.ChunkedArray]): Binary column of WKB geometries (no nulls).
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: x and y coordinates.
+    Logic:
+        1. If every value is a 21-byte little-endian 2D point, the data buffer is viewed as an (n, 21) byte matrix and the doubles are read from it.
+        2. Anything else (big endian, Z/M points, polygons) falls back to Shapely, using the centroid of non-point geometries.
+    """
+    arr = wkb.combine_chunks() if isinstance(wkb, pa.ChunkedArray) else wkb
+    n = len(arr)
+    if n == 0:
+        return np.empty(0), np.empty(0)
+
+    if arr.null_count == 0 and (pa.types.is_binary(arr.type) or pa.types.is_large_binary(arr.type)):
+        offset_type = np.int64 if pa.types.is_large_binary(arr.type) else np.int32
+        _, offsets_buf, data_buf = arr.buffers()
+        offsets = np.frombuffer(offsets_buf, dtype=offset_type, count=n + 1, offset=arr.offset * np.dtype(offset_type).itemsize)
+
+        if offsets[-1] - offsets[0] == n * WKB_POINT_SIZE and np.all(np.diff(offsets) == WKB_POINT_SIZE):
+            records = np.frombuffer(data_buf, dtype=np.uint8, count=n * WKB_POINT_SIZE, offset=int(offsets[0])).reshape(n, WKB_POINT_SIZE)
+            little_endian = (records[:, 0] == 1).all()
+            point_type = (np.ascontiguousarray(records[:, 1:5]).view("<u4").ravel() == 1).all()
+            if little_endian and point_type:
+                xy = np.ascontiguousarray(records[:, 5:]).view("<f8")
+                return xy[:, 0].copy(), xy[:, 1].copy()
+
+    import shapely
+
+    geoms = shapely.from_wkb(arr.to_numpy(zero_copy_only=False))
+    geoms = np.where(shapely.get_type_id(geoms) == 0, geoms, shapely.centroid(geoms))
+    return shapely.get_x(geoms), shapely.get_y(geoms)
+
+def _geo_metadata(schema: pa.Schema) -> Tuple[str, Optional[str]]:
+    """
+    Primary geometry column and its CRS ("AUTHORITY:CODE", None when absent i.e. OGC:CRS84) from the GeoParquet metadata.
+    """
+    meta = json.loads(schema.metadata[b"geo"]) if schema.metadata and b"geo" in schema.metadata else {}
+    column = meta.get("primary_column", GEOMETRY_COLUMN)
+    crs = meta.get("columns", {}).get(column, {}).get("crs")
+    if isinstance(crs, dict):
+        crs_id = crs.get("id", {})
+        crs = f"{crs_id['authority']}:{crs_id['code']}" if crs_id else json.dumps(crs)
+    return column, crs
+
+def layer_columns(path: Union[str, Path]) -> List[str]:
+    """
+    Attribute columns available in a layer (file or partitioned dataset), read from the schema only.
+    """
+    path = Path(path)
+    schema = ds.dataset(path, format="parquet", partitioning=PARTITIONING if path.is_dir() else None).schema
+    return schema.names
+
+@instrumented()
+def read_points(
+    path: Union[str, Path],
+    columns: Optional[List[str]] = None,
+    categories: Optional[Sequence[str]] = None,
+    category_col: str = "category"
+) -> pd.DataFrame:
+    """
+    Reads only the needed columns of a point layer plus lon/lat arrays, through pyarrow and without building geometries.
+    Args:
+        path (Union[str, Path]): Partitioned dataset directory or single GeoParquet file.
+        columns (Optional[List[str]]): Attribute columns to read (besides lon/lat). Defaults to none.
+        categories (Optional[Sequence[str]]): Keep only these values of `category_col` (pushed down to the row groups).
+        category_col (str): Column the categories filter applies to.
+    Returns:
+        pd.DataFrame: The requested columns plus 'lon' and 'lat' in EPSG:4326.
+    Logic:
+        1. Partitioned datasets already store lon/lat, so the geometry column is never read.
+        2. Single files: only the WKB column is read and decoded in bulk, reprojected with pyproj if not in lon/lat.
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"!! Layer not found at: {path}. Run its pipeline first.")
+
+    columns = list(columns or [])
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING if path.is_dir() else None)
+    expression = ds.field(category_col).isin(list(categories)) if categories is not None else None
+
+    if {'lon', 'lat'}.issubset(dataset.schema.names):
+        return dataset.to_table(columns=list(dict.fromkeys(columns + ['lon', 'lat'])), filter=expression).to_pandas()
+
+    geometry_col, crs = _geo_metadata(pq.read_schema(path) if path.is_file() else dataset.schema)
+    table = dataset.to_table(columns=list(dict.fromkeys(columns + [geometry_col])), filter=expression)
+    table = table.filter(table.column(geometry_col).is_valid())
+
+    x, y = wkb_points_to_xy(table.column(geometry_col))
+    if crs is not None and crs not in LONLAT_CRS:
+        from pyproj import Transformer
+
+        x, y = Transformer.from_crs(crs, "EPSG:4326", always_xy=True).transform(x, y)
+
+    df = table.drop_columns([geometry_col]).to_pandas()
+    df['lon'] = x
+    df['lat'] = y
+    return df
+
+# === 5. LAYER PATHS ===
+
+def layer_path(processed_dir: Union[str, Path], name: str) -> Path:
+    """
+    Location of a layer: the partitioned dataset <processed_dir>/<name> if present, else the single file <name>.parquet.
+    """
+    dataset_path = Path(processed_dir) / name
+    return dataset_path if dataset_path.is_dir() else Path(processed_dir) / f"{name}.parquet"
+
+def layer_mtime(path: Union[str, Path]) -> float:
+    """
+    Last modification time of a layer (the newest file for a partitioned dataset).
+    """
+    path = Path(path)
+    if path.is_dir():
+        return max((p.stat().st_mtime for p in path.rglob("*.parquet")), default=path.stat().st_mtime)
+    return path.stat().st_mtime
@@ -0,0 +1,354 @@
+# src/lookup.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+# third party (no pandas: tables are read with pyarrow and queried as NumPy arrays)
+import numpy as np
+
+# internal
+from src.config import load_config
+from src.hexes import latlng_to_cells_int, cells_to_int, cells_to_parents, cell_resolutions
+
+if TYPE_CHECKING:
+    from src.feature_store import PointIndex
+
+
+# === 2. LOOKUP TABLES ===
+
+def _is_null(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind == "O":
+        return np.array([v is None for v in values], dtype=bool)
+    return np.zeros(len(values), dtype=bool)
+
+def _missing(dtype: np.dtype) -> Any:
+    # value of a cell without a label: NaN (floats), -1 (integers, e.g. cluster ids), None (strings)
+    if dtype.kind == "f":
+        return np.nan
+    if dtype.kind in "iu":
+        return -1
+    return None
+
+def _aggregate(groups: np.ndarray, n_groups: int, values: np.ndarray) -> np.ndarray:
+    """
+    One value per group: mean of the non-null floats, most frequent non-null value otherwise (ties go to the smallest).
+    """
+    valid = ~_is_null(values)
+    if values.dtype.kind == "f":
+        sums = np.bincount(groups[valid], weights=values[valid], minlength=n_groups)
+        counts = np.bincount(groups[valid], minlength=n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return sums / counts
+
+    out = np.full(n_groups, _missing(values.dtype), dtype=values.dtype if values.dtype.kind in "iu" else object)
+    if not valid.any():
+        return out
+    uniques, codes = np.unique(values[valid].astype(str) if values.dtype.kind == "O" else values[valid], return_inverse=True)
+    pair, counts = np.unique(groups[valid].astype(np.int64) * len(uniques) + codes, return_counts=True)
+    group, code = pair // len(uniques), pair % len(uniques)
+    best = np.lexsort((code, -counts, group)) # per group: highest count first, then smallest value
+    first = np.ones(len(best), dtype=bool)
+    first[1:] = group[best][1:] != group[best][:-1]
+    out[group[best][first]] = uniques[code[best][first]]
+    return out
+
+class LookupTable:
+    """
+    Hexagon values (e.g. cluster labels, prices) as sorted uint64 H3 arrays, queried with binary searches.
+    Coarser copies of the table (parents of the labelled cells, values aggregated) answer the cells that have no label.
+    """
+
+    def __init__(self, name: str, cells: np.ndarray, columns: Dict[str, np.ndarray], parent_levels: int = 1):
+        cells = np.asarray(cells, dtype=np.uint64)
+        if len(cells) == 0:
+            raise ValueError(f"!! Lookup table {name} has no labelled cells.")
+
+        # rows without any value are not labels
+        labelled = ~np.logical_and.reduce([_is_null(values) for values in columns.values()]) if columns else np.ones(len(cells), dtype=bool)
+        order = np.argsort(cells[labelled], kind="stable")
+        cells = cells[labelled][order]
+        columns = {col: values[labelled][order] for col, values in columns.items()}
+
+        self.name = name
+        self.resolution = int(cell_resolutions(cells[:1])[0])
+        self.columns = list(columns)
+        self.dtypes = {col: values.dtype for col, values in columns.items()}
+
+        # level 0 = the table itself, level i = parents at resolution - i
+        self.levels: List[Tuple[np.ndarray, Dict[str, np.ndarray]]] = [(cells, columns)]
+        for level in range(1, min(parent_levels, self.resolution) + 1):
+            parents, groups = np.unique(cells_to_parents(cells, self.resolution - level), return_inverse=True)
+            self.levels.append((parents, {col: _aggregate(groups, len(parents), values) for col, values in columns.items()}))
+
+    @classmethod
+    def from_parquet(cls, path: Union[str, Path], columns: Sequence[str], name: Optional[str] = None, parent_levels: int = 1) -> "LookupTable":
+        """
+        Loads the h3_index column (index or column) and the given columns of a Parquet table with pyarrow.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"!! Lookup table not found at: {path}.")
+
+        table = pq.read_table(path, columns=['h3_index'] + list(columns))
+        cells = cells_to_int(table.column('h3_index').to_pylist())
+        values = {}
+        for col in columns:
+            array = table.column(col)
+            if pa.types.is_floating(array.type) or pa.types.is_integer(array.type):
+                values[col] = array.to_numpy() # integers with nulls come back as floats with NaN
+            else:
+                values[col] = np.array(array.to_pylist(), dtype=object)
+        return cls(name or path.stem, cells, values, parent_levels)
+
+    def lookup_cells(self, cells: np.ndarray) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Values of uint64 cells at the table resolution.
+        Returns:
+            Tuple[Dict[str, np.ndarray], np.ndarray]: The values per column and the level that answered
+            (0 = the cell itself, i = its parent i resolutions up, -1 = no label).
+        """
+        n = len(cells)
+        out = {col: np.full(n, _missing(dtype), dtype=dtype if dtype.kind in "fiu" else object) for col, dtype in self.dtypes.items()}
+        level = np.full(n, -1, dtype=np.int8)
+        pending = np.arange(n)
+
+        for i, (keys, columns) in enumerate(self.levels):
+            query = cells[pending] if i == 0 else cells_to_parents(cells[pending], self.resolution - i)
+            pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+            hit = keys[pos] == query
+            rows, found = pending[hit], pos[hit]
+            for col, values in columns.items():
+                out[col][rows] = values[found]
+            level[rows] = i
+            pending = pending[~hit]
+            if len(pending) == 0:
+                break
+
+        return out, level
+
+
+# === 3. LOOKUP SERVICE ===
+
+class LatencyRecorder:
+    """
+    Latencies of the last `window` requests (thread-safe), reported as percentiles.
+    """
+
+    def __init__(self, window: int = 10_000):
+        self.samples: deque = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.points = 0
+
+    def record(self, seconds: float, points: int) -> None:
+        with self.lock:
+            self.samples.append(seconds)
+            self.requests += 1
+            self.points += points
+
+    def summary(self) -> Dict[str, Any]:
+        with self.lock:
+            samples = np.array(self.samples)
+            requests, points = self.requests, self.points
+        stats: Dict[str, Any] = {"requests": requests, "points": points}
+        if len(samples):
+            p50, p90, p99 = np.percentile(samples, [50, 90, 99]) * 1000
+            stats.update(p50_ms=round(p50, 3), p90_ms=round(p90, 3), p99_ms=round(p99, 3), max_ms=round(samples.max() * 1000, 3))
+        return stats
+
+class LookupService:
+    """
+    Answers (lat, lon) -> hexagon values for every table, in batches: one H3 index per resolution, then binary searches.
+    """
+
+    def __init__(self, tables: List[LookupTable], point_index: Optional["PointIndex"] = None):
+        if not tables:
+            raise ValueError("!! The lookup service needs at least one table.")
+        self.tables = tables
+        self.point_index = point_index
+        self.latency = LatencyRecorder()
+
+    def query(self, lats: Sequence[float], lons: Sequence[float]) -> Dict[str, np.ndarray]:
+        """
+        Batch lookup.
+        Args:
+            lats (Sequence[float]): Latitudes.
+            lons (Sequence[float]): Longitudes.
+        Returns:
+            Dict[str, np.ndarray]: 'h3' (uint64 cells at the finest table resolution), every table column,
+            and '<table>_level' (0 = own cell, i = parent fallback, -1 = no label).
+        """
+        start = time.perf_counter()
+        lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+
+        # one latlng_to_cell per point and resolution, coarser resolutions come from the bits of the finest
+        finest = max(table.resolution for table in self.tables)
+        cells = latlng_to_cells_int(lats.tolist(), lons.tolist(), finest)
+
+        result: Dict[str, np.ndarray] = {'h3': cells}
+        for table in self.tables:
+            table_cells = cells if table.resolution == finest else cells_to_parents(cells, table.resolution)
+            values, level = table.lookup_cells(table_cells)
+            result.update(values)
+            result[f"{table.name}_level"] = level
+
+        self.latency.record(time.perf_counter() - start, len(lats))
+        return result
+
+    def points(self, lat: float, lon: float, k: int = 0) -> List[Dict[str, Any]]:
+        """
+        The indexed points (POIs, stops) of the hexagon holding (lat, lon) and of its k-ring, read from the inverted index.
+        """
+        if self.point_index is None or len(self.point_index.h3) == 0:
+            raise ValueError("!! The lookup service has no point index.")
+        start = time.perf_counter()
+        import h3
+
+        cell = h3.int_to_str(int(latlng_to_cells_int([lat], [lon], self.point_index.resolution)[0]))
+        points = self.point_index.table_in(sorted(h3.grid_disk(cell, k)) if k > 0 else cell).to_pylist()
+        self.latency.record(time.perf_counter() - start, 1)
+        # NaN (missing floats) is not valid JSON
+        return [{key: (None if isinstance(value, float) and value != value else value) for key, value in point.items()} for point in points]
+
+def service_from_config(config: Dict[str, Any]) -> LookupService:
+    """
+    Builds the service from the lookup section of settings.yaml (tables inside paths.processed, missing ones are skipped).
+    """
+    lookup_cfg = config.get('lookup', {})
+    processed_dir = Path(config['paths']['processed'])
+    parent_levels = lookup_cfg.get('parent_levels', 1)
+
+    tables = []
+    for spec in lookup_cfg.get('tables', []):
+        path = processed_dir / spec['path']
+        if not path.exists():
+            print(f"!! Lookup table {path} not found, skipping it.")
+            continue
+        table = LookupTable.from_parquet(path, spec['columns'], name=spec.get('name'), parent_levels=parent_levels)
+        print(f"-> Loaded lookup table {table.name}: {len(table.levels[0][0])} cells at resolution {table.resolution}, columns {table.columns}.")
+        tables.append(table)
+
+    # optional inverted H3 -> points index (GET /points)
+    point_index = None
+    if lookup_cfg.get('point_index'):
+        index_path = processed_dir / lookup_cfg['point_index']
+        if index_path.exists():
+            from src.feature_store import load_point_index
+
+            point_index = load_point_index(index_path)
+            print(f"-> Loaded point index: {len(point_index.h3)} points at resolution {point_index.resolution}.")
+        else:
+            print(f"!! Point index {index_path} not found, /points is disabled.")
+    return LookupService(tables, point_index)
+
+
+# === 4. HTTP ENDPOINT ===
+
+def _to_json(values: np.ndarray) -> List[Any]:
+    if values.dtype.kind == "f":
+        return [None if v != v else v for v in values.tolist()]
+    if values.dtype == np.uint64:
+        import h3
+        return [h3.int_to_str(v) for v in values.tolist()]
+    return values.tolist()
+
+def make_handler(service: LookupService):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, payload: Dict[str, Any]) -> None:
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _answer(self, lats: List[float], lons: List[float], single: bool) -> None:
+            if len(lats) != len(lons):
+                self._send(400, {"error": "lat and lon must have the same length"})
+                return
+            result = {key: _to_json(values) for key, values in service.query(lats, lons).items()}
+            self._send(200, {key: values[0] for key, values in result.items()} if single else result)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self._send(200, service.latency.summary())
+            elif url.path == "/health":
+                self._send(200, {"status": "ok", "tables": [table.name for table in service.tables]})
+            elif url.path == "/lookup":
+                params = parse_qs(url.query)
+                try:
+                    self._answer([float(params["lat"][0])], [float(params["lon"][0])], single=True)
+                except (KeyError, ValueError):
+                    self._send(400, {"error": "expected /lookup?lat=<float>&lon=<float>"})
+            elif url.path == "/points":
+                params = parse_qs(url.query)
+                if service.point_index is None:
+                    self._send(404, {"error": "no point index loaded"})
+                    return
+                try:
+                    lat, lon, k = float(params["lat"][0]), float(params["lon"][0]), int(params.get("k", ["0"])[0])
+                except (KeyError, ValueError):
+                    self._send(400, {"error": "expected /points?lat=<float>&lon=<float>[&k=<int>]"})
+                    return
+                self._send(200, {"points": service.points(lat, lon, k)})
+            else:
+                self._send(404, {"error": f"unknown path {url.path}"})
+
+        def do_POST(self):
+            # batch: {"lat": [...], "lon": [...]}
+            if urlparse(self.path).path != "/lookup":
+                self._send(404, {"error": f"unknown path {self.path}"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                self._answer([float(v) for v in body["lat"]], [float(v) for v in body["lon"]], single=False)
+            except (KeyError, TypeError, ValueError):
+                self._send(400, {"error": 'expected a JSON body {"lat": [...], "lon": [...]}'})
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def serve(service: LookupService, host: str = "127.0.0.1", port: int = 8787) -> ThreadingHTTPServer:
+    """
+    Starts the HTTP endpoint in a background thread (call shutdown() on the returned server to stop it).
+    GET /lookup?lat=&lon= (one point), POST /lookup {"lat": [...], "lon": [...]} (batch), GET /points?lat=&lon=&k= (points of the
+    hexagon and its k-ring), GET /stats (latency percentiles), GET /health.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local lat/lon -> hexagon cluster/feature lookup service.")
+    parser.add_argument("--config", default="config/settings.yaml", help="Path to the settings file.")
+    parser.add_argument("--host", default=None, help="Host to bind. Defaults to lookup.host.")
+    parser.add_argument("--port", type=int, default=None, help="Port to listen on. Defaults to lookup.port.")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    lookup_cfg = config.get('lookup', {})
+    server = serve(service_from_config(config), args.host or lookup_cfg.get('host', "127.0.0.1"), args.port or lookup_cfg.get('port', 8787))
+    print(f"-> Lookup service listening at: http://{server.server_address[0]}:{server.server_address[1]}/lookup")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,356 @@
+# src/osm_refresh.py
+
+# === 1. IMPORTS ===
+
+# general
+import argparse
+import asyncio
+import hashlib
+import json
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple, Union
+
+# third party (geopandas and shapely are imported inside the functions)
+import pandas as pd
+
+# internal
+from src.config import load_config
+from src.overpass import (
+    ELEMENT_COLUMNS,
+    OverpassClient,
+    boundary_tiles,
+    build_query,
+    client_from_config,
+    elements_to_frame,
+    frame_to_points,
+    merge_elements,
+    response_timestamp,
+    sub_category_of
+)
+from src.instrument import instrumented, start_run, print_summary, end_run
+
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from shapely.geometry import Polygon, MultiPolygon
+
+
+# === 2. RAW ELEMENT STORE ===
+
+def tagset_key(tags: Dict[str, Union[str, bool, List[str]]]) -> str:
+    """
+    Stable key of a tag set (the file name of its raw elements).
+    """
+    return hashlib.sha1(json.dumps(tags, sort_keys=True).encode()).hexdigest()[:16]
+
+def boundary_key(boundary: Union["Polygon", "MultiPolygon"]) -> str:
+    """
+    Hash of the (normalized) boundary: a different boundary needs a full download.
+    """
+    import shapely
+
+    return hashlib.sha1(shapely.to_wkb(shapely.normalize(boundary))).hexdigest()[:16]
+
+class RawElementStore:
+    """
+    The raw OSM elements of every tag set (one Parquet file each, ELEMENT_COLUMNS) and their sync state
+    (tags, boundary, osm3s.timestamp_osm_base of the last sync) in sync_state.json.
+    """
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.state_path = self.root / "sync_state.json"
+        self.state: Dict[str, Dict[str, Any]] = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+
+    def path(self, key: str) -> Path:
+        return self.root / f"{key}.parquet"
+
+    def entry(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.state.get(key) if self.path(key).exists() else None
+
+    def load(self, key: str) -> pd.DataFrame:
+        if not self.path(key).exists():
+            return pd.DataFrame(columns=ELEMENT_COLUMNS)
+        return pd.read_parquet(self.path(key))
+
+    def save(self, key: str, frame: pd.DataFrame, tags: Dict[str, Any], boundary: str, timestamp: Optional[str]) -> None:
+        """
+        Replaces the elements of a tag set and records its sync state (both written to temporary files first).
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path(key).with_suffix(".tmp")
+        frame[ELEMENT_COLUMNS].reset_index(drop=True).to_parquet(tmp_path, index=False)
+        tmp_path.replace(self.path(key))
+
+        self.state[key] = {"tags": tags, "boundary": boundary, "timestamp": timestamp, "elements": len(frame)}
+        tmp_state = self.state_path.with_suffix(".tmp")
+        tmp_state.write_text(json.dumps(self.state, indent=2, sort_keys=True))
+        tmp_state.replace(self.state_path)
+
+def patch_frame(stored: pd.DataFrame, upserts: pd.DataFrame, removed: Set[Tuple[str, int]]) -> pd.DataFrame:
+    """
+    Applies a delta to stored elements: rows of `upserts` replace (or add) the rows with the same (element, id), `removed` rows are dropped.
+    """
+    keys = pd.MultiIndex.from_arrays([stored['element'], stored['id']])
+    upsert_keys = set(zip(upserts['element'], upserts['id']))
+    drop = keys.isin(list(upsert_keys | removed)) if len(stored) else []
+    kept = stored[~drop] if len(stored) else stored
+    return pd.concat([kept, upserts[ELEMENT_COLUMNS]], ignore_index=True) if len(upserts) else kept.reset_index(drop=True)
+
+
+# === 3. INCREMENTAL OVERPASS SYNC ===
+
+def _inside(frame: pd.DataFrame, boundary: Union["Polygon", "MultiPolygon"]) -> pd.DataFrame:
+    import shapely
+
+    if len(frame) == 0:
+        return frame
+    return frame[shapely.contains_xy(boundary, frame['lon'].to_numpy(), frame['lat'].to_numpy())]
+
+@instrumented()
+def sync_tagset(
+    boundary: Union["Polygon", "MultiPolygon"],
+    tags: Dict[str, Union[str, bool, List[str]]],
+    store: RawElementStore,
+    client: Optional[OverpassClient] = None,
+    tile_resolution: int = 7,
+    full: bool = False
+) -> pd.DataFrame:
+    """
+    Brings the raw elements of a tag set up to date, downloading only what changed since the last sync.
+    Args:
+        boundary (Union[Polygon, MultiPolygon]): Area to fetch (EPSG:4326).
+        tags (Dict[str, Union[str, bool, List[str]]]): OSM tags (OSMNX format).
+        store (RawElementStore): Persisted raw elements and sync state.
+        client (Optional[OverpassClient]): Configured client (its on-disk cache must be off, see refresh_client).
+        tile_resolution (int): H3 resolution of the query tiles.
+        full (bool): Force a full download.
+    Returns:
+        pd.DataFrame: The up-to-date elements inside the boundary (ELEMENT_COLUMNS).
+    Logic:
+        1. No previous sync (or another boundary): download every tile in full and record the oldest osm3s.timestamp_osm_base.
+        2. Otherwise, per tile: a (newer:"timestamp") query returns the elements created or edited since the last sync,
+        and an ids-only query lists the elements still matching the tags, so deleted or re-tagged elements can be dropped.
+        3. Patch the stored elements with the delta and move the sync timestamp forward.
+    """
+    client = client or OverpassClient()
+    key, area = tagset_key(tags), boundary_key(boundary)
+    entry = store.entry(key)
+    tiles = boundary_tiles(boundary, tile_resolution)
+
+    if full or entry is None or entry.get("boundary") != area or not entry.get("timestamp"):
+        print(f"-> Full sync of tags {tags} ({len(tiles)} tiles)...")
+        responses = asyncio.run(client.fetch_all([build_query(tags, cell, client.timeout_s) for cell in tiles]))
+        frame = _inside(elements_to_frame(merge_elements(responses), tags), boundary)
+        store.save(key, frame, tags, area, response_timestamp(responses))
+        print(f"-> {len(frame)} elements stored (timestamp {store.state[key]['timestamp']}).")
+        return frame
+
+    since = entry["timestamp"]
+    print(f"-> Incremental sync of tags {tags} since {since} ({len(tiles)} tiles)...")
+    changed_queries = [build_query(tags, cell, client.timeout_s, newer=since) for cell in tiles]
+    ids_queries = [build_query(tags, cell, client.timeout_s, out="ids") for cell in tiles]
+    responses = asyncio.run(client.fetch_all(changed_queries + ids_queries))
+    changed, current = responses[:len(tiles)], responses[len(tiles):]
+
+    stored = store.load(key)
+    current_ids = {(e["type"], e["id"]) for e in merge_elements(current)}
+    upserts = elements_to_frame(merge_elements(changed), tags)
+    stored_ids = set(zip(stored['element'], stored['id']))
+    removed = stored_ids - current_ids
+
+    # edited elements that moved out of the boundary are removed too
+    inside = _inside(upserts, boundary)
+    removed |= set(zip(upserts['element'], upserts['id'])) - set(zip(inside['element'], inside['id']))
+
+    frame = patch_frame(stored, inside, removed)
+    store.save(key, frame, tags, area, response_timestamp(responses) or since)
+    print(f"-> {len(inside)} created/edited and {len(removed & stored_ids)} removed elements, {len(frame)} stored ({client.stats}).")
+    return frame
+
+def refresh_client(config: Dict[str, Any]) -> OverpassClient:
+    """
+    Overpass client of settings.yaml without the response cache (a cached answer would hide the new edits).
+    """
+    client = client_from_config(config)
+    client.cache_dir = None
+    return client
+
+def store_from_config(config: Dict[str, Any]) -> RawElementStore:
+    return RawElementStore(Path(config['paths']['processed']) / config.get('fetch', {}).get('refresh', {}).get('store', "osm_raw"))
+
+def refresh_points(
+    boundary: Union["gpd.GeoDataFrame", "Polygon", "MultiPolygon"],
+    tags: Dict[str, Union[str, bool, List[str]]],
+    config: Dict[str, Any]
+) -> "gpd.GeoDataFrame":
+    """
+    fetch_points backend of the incremental mode: syncs the tag set and returns its points like fetch_overpass_points.
+    """
+    import geopandas as gpd
+
+    search_geometry = boundary.union_all() if isinstance(boundary, gpd.GeoDataFrame) else boundary
+    frame = sync_tagset(
+        search_geometry,
+        tags,
+        store_from_config(config),
+        client = refresh_client(config),
+        tile_resolution = config.get('fetch', {}).get('overpass', {}).get('tile_resolution', 7)
+    )
+    return frame_to_points(frame, search_geometry)
+
+
+# === 4. LOCAL DIFF FILES (osmChange) ===
+
+def matches_tags(element_tags: Dict[str, str], tags: Dict[str, Union[str, bool, List[str]]]) -> bool:
+    """
+    Whether an element matches any of the tags (OSMNX format, same semantics as the Overpass filters).
+    """
+    for key, value in tags.items():
+        if key not in element_tags:
+            continue
+        if value is True or (isinstance(value, str) and element_tags[key] == value) or (isinstance(value, list) and element_tags[key] in value):
+            return True
+    return False
+
+def parse_osc(path: Union[str, Path]) -> Tuple[List[Dict[str, Any]], Set[Tuple[str, int]], Optional[str]]:
+    """
+    Reads an osmChange (.osc) file.
+    Returns:
+        Tuple[List[Dict[str, Any]], Set[Tuple[str, int]], Optional[str]]: Created/modified elements (Overpass JSON layout, the last version wins),
+        deleted (type, id) pairs and the newest element timestamp.
+    """
+    edits: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    deleted: Set[Tuple[str, int]] = set()
+    newest = None
+
+    for _, node in ET.iterparse(str(path), events=("end",)):
+        if node.tag not in ("create", "modify", "delete"):
+            continue
+        for child in node:
+            if child.tag not in ("node", "way", "relation"):
+                continue
+            key = (child.tag, int(child.get("id")))
+            stamp = child.get("timestamp")
+            newest = max(newest, stamp) if newest and stamp else (stamp or newest)
+            if node.tag == "delete":
+                deleted.add(key)
+                edits.pop(key, None)
+                continue
+            element = {"type": child.tag, "id": key[1], "tags": {t.get("k"): t.get("v") for t in child.findall("tag")}}
+            if child.get("lat") is not None:
+                element.update(lat=float(child.get("lat")), lon=float(child.get("lon")))
+            edits[key] = element
+            deleted.discard(key)
+        node.clear()
+
+    return list(edits.values()), deleted, newest
+
+@instrumented()
+def apply_osc(
+    path: Union[str, Path],
+    boundary: Union["Polygon", "MultiPolygon"],
+    store: RawElementStore,
+    timestamp: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Patches every synced tag set with a local osmChange diff, without contacting Overpass.
+    Args:
+        path (Union[str, Path]): The .osc file (e.g. a replication diff or an osmium derive-changes output).
+        boundary (Union[Polygon, MultiPolygon]): Area of the stored elements (EPSG:4326).
+        store (RawElementStore): Persisted raw elements and sync state.
+        timestamp (Optional[str]): Database timestamp the diff brings the data to. Defaults to its newest element timestamp.
+    Returns:
+        Dict[str, int]: Number of stored elements per tag set key.
+    Logic:
+        1. Deleted elements, and edited elements that no longer match the tags or left the boundary, are removed.
+        2. Created/edited nodes matching the tags are upserted. Ways and relations carry no coordinates in a diff:
+        edited ones keep their stored location, new ones are skipped until the next Overpass sync.
+    """
+    edits, deleted, newest = parse_osc(path)
+    timestamp = timestamp or newest
+    area = boundary_key(boundary)
+    print(f"-> Applying {path}: {len(edits)} created/modified and {len(deleted)} deleted elements...")
+
+    sizes = {}
+    for key, entry in list(store.state.items()):
+        if entry.get("boundary") != area:
+            print(f"!! Tag set {entry['tags']} was synced for another boundary, skipping it.")
+            continue
+        tags = entry["tags"]
+        stored = store.load(key)
+        located = stored.set_index(['element', 'id'])[['lon', 'lat']]
+
+        removed = set(deleted)
+        rows, skipped = [], 0
+        for element in edits:
+            element_key = (element["type"], element["id"])
+            if not matches_tags(element["tags"], tags):
+                removed.add(element_key)
+                continue
+            if "lat" in element:
+                lon, lat = element["lon"], element["lat"]
+            elif element_key in located.index:
+                lon, lat = located.loc[element_key]
+            else:
+                skipped += 1
+                continue
+            rows.append((element["type"], element["id"], element["tags"].get("name"), sub_category_of(element["tags"], tags), lon, lat))
+
+        upserts = pd.DataFrame(rows, columns=ELEMENT_COLUMNS).astype({'id': "int64", 'lon': float, 'lat': float})
+        inside = _inside(upserts, boundary)
+        removed |= set(zip(upserts['element'], upserts['id'])) - set(zip(inside['element'], inside['id']))
+
+        frame = patch_frame(stored, inside, removed)
+        store.save(key, frame, tags, area, max(filter(None, [entry.get("timestamp"), timestamp]), default=None))
+        sizes[key] = len(frame)
+        print(f"-> Tags {tags}: {len(frame) - len(stored):+d} elements ({skipped} new ways/relations without coordinates skipped).")
+
+    return sizes
+
+
+# === 5. REFRESH CLI ===
+
+def layer_tagsets(config: Dict[str, Any]) -> List[Dict[str, Union[str, bool, List[str]]]]:
+    """
+    Tag sets fetched by the layer pipelines (Layer 1 transport modes and Layer 2 categories).
+    """
+    return list(config['transport']['tags'].values()) + list(config['poi']['categories'].values())
+
+def main_refresh():
+    """
+    Refreshes the raw OSM elements of every layer tag set (Overpass deltas, or a local .osc diff with --diff).
+    The layer pipelines then read them through fetch_points when fetch.refresh.incremental is set.
+    """
+    import geopandas as gpd
+
+    parser = argparse.ArgumentParser(description="Incrementally refresh the raw OSM elements of the layers.")
+    parser.add_argument("--config", default="config/settings.yaml", help="Path to the settings file.")
+    parser.add_argument("--diff", default=None, help="Apply a local osmChange (.osc) file instead of querying Overpass.")
+    parser.add_argument("--full", action="store_true", help="Download every tag set in full.")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    owns_run = start_run(config['paths']['logs'], run_name="osm_refresh")
+
+    boundary_path = Path(config['paths']['processed']) / "l0_boundary.parquet"
+    if not boundary_path.exists():
+        raise FileNotFoundError(f"!! Buffered boundary not found at: {boundary_path}. Run Layer 0 first.")
+    boundary = gpd.read_parquet(boundary_path).to_crs("EPSG:4326").union_all()
+    store = store_from_config(config)
+
+    if args.diff:
+        apply_osc(args.diff, boundary, store)
+    else:
+        client = refresh_client(config)
+        tile_resolution = config.get('fetch', {}).get('overpass', {}).get('tile_resolution', 7)
+        for tags in layer_tagsets(config):
+            sync_tagset(boundary, tags, store, client=client, tile_resolution=tile_resolution, full=args.full)
+
+    if owns_run:
+        print_summary()
+        end_run()
+
+
+if __name__ == "__main__":
+    main_refresh()
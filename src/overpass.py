@@ -0,0 +1,328 @@
+# src/overpass.py
+
+# === 1. IMPORTS ===
+
+# general
+import asyncio
+import hashlib
+import json
+import random
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+# third party (aiohttp, geopandas and shapely are imported lazily, the osmnx backend doesn't need them)
+import h3
+
+# internal
+from src.instrument import instrumented
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import geopandas as gpd
+    from shapely.geometry import Polygon, MultiPolygon
+
+
+# === 2. QUERIES AND TILES ===
+
+DEFAULT_ENDPOINT = "https://overpass-api.de/api/interpreter"
+RETRY_STATUSES = {429, 502, 503, 504}
+ELEMENT_COLUMNS = ['element', 'id', 'name', 'sub_category', 'lon', 'lat']
+
+def _tag_filters(tags: Dict[str, Union[str, bool, List[str]]]) -> List[str]:
+    """
+    Converts OSMNX-style tags ({"amenity": ["bar", "cafe"], "shop": True}) to Overpass tag filters.
+    """
+    filters = []
+    for key, value in tags.items():
+        if value is True:
+            filters.append(f'["{key}"]')
+        elif isinstance(value, str):
+            filters.append(f'["{key}"="{value}"]')
+        else:
+            filters.append(f'["{key}"~"^({"|".join(value)})$"]')
+    return filters
+
+def build_query(
+    tags: Dict[str, Union[str, bool, List[str]]],
+    cell: str,
+    timeout_s: int = 180,
+    newer: Optional[str] = None,
+    out: str = "center tags"
+) -> str:
+    """
+    Builds the Overpass QL query of one tile: every node/way/relation matching any of the tags inside the H3 cell.
+    Args:
+        tags (Dict[str, Union[str, bool, List[str]]]): OSM tags (OSMNX format, the union of the tags is fetched).
+        cell (str): H3 cell used as the tile polygon.
+        timeout_s (int): Server-side timeout of the query.
+        newer (Optional[str]): Only elements edited after this timestamp (ISO 8601, e.g. a previous osm3s.timestamp_osm_base).
+        out (str): Output mode: "center tags" (default) or "ids" (type and id only, for deletion checks).
+    Returns:
+        str: The query ('out center' gives ways and relations a representative point).
+    """
+    poly = " ".join(f"{lat:.7f} {lon:.7f}" for lat, lon in h3.cell_to_boundary(cell))
+    since = f'(newer:"{newer}")' if newer else ""
+    statements = "".join(f'nwr{f}{since}(poly:"{poly}");' for f in _tag_filters(tags))
+    return f"[out:json][timeout:{timeout_s}];({statements});out {out};"
+
+def boundary_tiles(boundary: Union["Polygon", "MultiPolygon"], resolution: int) -> List[str]:
+    """
+    H3 cells (tiles) overlapping the boundary. Tiles don't overlap each other, so only features on a shared edge are fetched twice.
+    Args:
+        boundary (Union[Polygon, MultiPolygon]): Area to cover (EPSG:4326).
+        resolution (int): H3 resolution of the tiles (6 = ~36 km2, 7 = ~5 km2).
+    Returns:
+        List[str]: The tiles.
+    """
+    shape = h3.geo_to_h3shape(boundary.__geo_interface__)
+    return sorted(h3.h3shape_to_cells_experimental(shape, resolution, contain="overlap"))
+
+
+# === 3. ASYNC CLIENT ===
+
+class RateLimiter:
+    """
+    Global rate limit shared by every request of a client: requests start at least 1/rate seconds apart.
+    """
+
+    def __init__(self, rate_per_s: float):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class OverpassClient:
+    """
+    Asyncio Overpass client: one HTTP session (connection reuse), bounded concurrency, a global rate limit,
+    retries with exponential backoff (honouring Retry-After) and an on-disk response cache.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = DEFAULT_ENDPOINT,
+        max_concurrency: int = 2,
+        rate_per_s: float = 1.0,
+        max_retries: int = 5,
+        backoff_s: float = 2.0,
+        timeout_s: int = 180,
+        cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.rate_per_s = rate_per_s
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.timeout_s = timeout_s
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.stats = {"requests": 0, "cached": 0, "retries": 0}
+
+    def _cache_path(self, query: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        key = hashlib.sha1(f"{self.endpoint}\n{query}".encode()).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    async def _fetch(self, session, semaphore: asyncio.Semaphore, limiter: RateLimiter, query: str) -> Dict[str, Any]:
+        """
+        Runs one query (from the cache if possible), retrying on rate limits, gateway errors and timeouts.
+        """
+        import aiohttp
+
+        cache_path = self._cache_path(query)
+        if cache_path is not None and cache_path.exists():
+            self.stats["cached"] += 1
+            with open(cache_path, "r") as f:
+                return json.load(f)
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            async with semaphore:
+                await limiter.wait()
+                self.stats["requests"] += 1
+                try:
+                    async with session.post(self.endpoint, data={"data": query}) as response:
+                        if response.status == 200:
+                            result = await response.json(content_type=None)
+                            break
+                        if response.status not in RETRY_STATUSES:
+                            raise RuntimeError(f"!! Overpass returned HTTP {response.status}: {(await response.text())[:200]}")
+                        retry_after = response.headers.get("Retry-After")
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+
+            if attempt == self.max_retries:
+                raise RuntimeError(f"!! Overpass query failed after {self.max_retries + 1} attempts ({error}).")
+
+            # exponential backoff with jitter, or the server's Retry-After
+            self.stats["retries"] += 1
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff_s * 2 ** attempt
+            delay *= 1 + 0.25 * random.random()
+            print(f"!! Overpass {error}, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})...")
+            await asyncio.sleep(delay)
+
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(result, f)
+            tmp_path.replace(cache_path)
+        return result
+
+    async def fetch_all(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """
+        Runs the queries concurrently through one session and returns the responses in the same order.
+        """
+        import aiohttp
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.rate_per_s)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout_s + 30)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            return await asyncio.gather(*(self._fetch(session, semaphore, limiter, q) for q in queries))
+
+
+# === 4. TILED FETCH ===
+
+def merge_elements(responses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges the elements of every tile, keeping one copy per OSM (type, id).
+    """
+    merged: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for response in responses:
+        for element in response.get("elements", []):
+            merged.setdefault((element["type"], element["id"]), element)
+    return list(merged.values())
+
+def response_timestamp(responses: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Oldest osm3s.timestamp_osm_base of the responses: every edit up to it is reflected in all of them.
+    """
+    stamps = [r["osm3s"]["timestamp_osm_base"] for r in responses if r.get("osm3s", {}).get("timestamp_osm_base")]
+    return min(stamps) if stamps else None
+
+def sub_category_of(element_tags: Dict[str, str], tags: Dict[str, Union[str, bool, List[str]]]) -> str:
+    """
+    Same rule as fetch_osmnx_points: the last queried key present on the element wins.
+    """
+    sub_category = "unknown"
+    for key in tags:
+        if key in element_tags:
+            sub_category = element_tags[key]
+    return sub_category
+
+def elements_to_frame(elements: List[Dict[str, Any]], tags: Dict[str, Union[str, bool, List[str]]]) -> "pd.DataFrame":
+    """
+    Flattens Overpass elements to one row each: element, id, name, sub_category, lon, lat (elements without a location are skipped).
+    """
+    import pandas as pd
+
+    rows = []
+    for element in elements:
+        point = element if "lat" in element else element.get("center")
+        if point is None:
+            continue
+        element_tags = element.get("tags", {})
+        rows.append((element["type"], element["id"], element_tags.get('name'), sub_category_of(element_tags, tags), point["lon"], point["lat"]))
+
+    return pd.DataFrame(rows, columns=ELEMENT_COLUMNS).astype({'id': "int64", 'lon': float, 'lat': float})
+
+def frame_to_points(frame: "pd.DataFrame", boundary: Union["Polygon", "MultiPolygon"]) -> "gpd.GeoDataFrame":
+    """
+    Converts element rows (see elements_to_frame) to the same points fetch_osmnx_points returns (name, geometry, sub_category, indexed by element/id).
+    Points outside the boundary (fetched by edge tiles) are dropped.
+    """
+    import pandas as pd
+    import geopandas as gpd
+    import shapely
+
+    frame = frame[shapely.contains_xy(boundary, frame['lon'].to_numpy(), frame['lat'].to_numpy())] if len(frame) else frame
+    if len(frame) == 0:
+        return gpd.GeoDataFrame(columns=['name', 'geometry', 'sub_category'], geometry='geometry', crs='EPSG:4326')
+
+    gdf = gpd.GeoDataFrame(
+        {'name': frame['name'].to_numpy(), 'sub_category': frame['sub_category'].to_numpy()},
+        geometry = gpd.points_from_xy(frame['lon'], frame['lat']),
+        crs = "EPSG:4326",
+        index = pd.MultiIndex.from_arrays([frame['element'], frame['id']], names=["element", "id"])
+    )[['name', 'geometry', 'sub_category']]
+
+    if gdf['name'].isna().all():
+        gdf['name'] = "Unnamed POI"
+    return gdf.dropna(subset=['name'])
+
+def elements_to_points(
+    elements: List[Dict[str, Any]],
+    tags: Dict[str, Union[str, bool, List[str]]],
+    boundary: Union["Polygon", "MultiPolygon"]
+) -> "gpd.GeoDataFrame":
+    """
+    Converts Overpass elements to the same points fetch_osmnx_points returns (name, geometry, sub_category, indexed by element/id).
+    Args:
+        elements (List[Dict[str, Any]]): Merged Overpass elements ('out center' format).
+        tags (Dict[str, Union[str, bool, List[str]]]): The queried tags (their values become the sub_category).
+        boundary (Union[Polygon, MultiPolygon]): Points outside the boundary (fetched by edge tiles) are dropped.
+    Returns:
+        gpd.GeoDataFrame: Points in EPSG:4326.
+    """
+    return frame_to_points(elements_to_frame(elements, tags), boundary)
+
+@instrumented()
+def fetch_overpass_points(
+    boundary: Union["gpd.GeoDataFrame", "Polygon", "MultiPolygon"],
+    tags: Dict[str, Union[str, bool, List[str]]],
+    tile_resolution: int = 7,
+    client: Optional[OverpassClient] = None
+) -> "gpd.GeoDataFrame":
+    """
+    Fetches points with the given OSM tags by tiling the boundary into H3 cells and querying the tiles concurrently.
+    Args:
+        boundary (Union[gpd.GeoDataFrame, Polygon, MultiPolygon]): Area to fetch (EPSG:4326).
+        tags (Dict[str, Union[str, bool, List[str]]]): OSM tags (OSMNX format).
+        tile_resolution (int): H3 resolution of the tiles.
+        client (Optional[OverpassClient]): Configured client. Defaults to the public endpoint without cache.
+    Returns:
+        gpd.GeoDataFrame: Points (name, geometry, sub_category) indexed by (element, id), like fetch_osmnx_points.
+    Logic:
+        1. Cover the boundary with H3 tiles and build one query per tile.
+        2. Run the queries concurrently (shared session, semaphore, global rate limit, retries with backoff).
+        3. Merge the tiles, de-duplicate by OSM (type, id) and drop points outside the boundary.
+    """
+    import geopandas as gpd
+
+    search_geometry = boundary.union_all() if isinstance(boundary, gpd.GeoDataFrame) else boundary
+    client = client or OverpassClient()
+
+    tiles = boundary_tiles(search_geometry, tile_resolution)
+    queries = [build_query(tags, cell, client.timeout_s) for cell in tiles]
+    print(f"-> Fetching Overpass points with tags {tags} in {len(tiles)} tiles (res {tile_resolution})...")
+
+    responses = asyncio.run(client.fetch_all(queries))
+    elements = merge_elements(responses)
+    print(f"-> {sum(len(r.get('elements', [])) for r in responses)} elements fetched, {len(elements)} unique ({client.stats}).")
+
+    return elements_to_points(elements, tags, search_geometry)
+
+def client_from_config(config: Dict[str, Any]) -> OverpassClient:
+    """
+    Builds an Overpass client from the fetch.overpass section of settings.yaml (cache inside paths.cache).
+    """
+    overpass_cfg = config.get('fetch', {}).get('overpass', {})
+    return OverpassClient(
+        endpoint = overpass_cfg.get('endpoint', DEFAULT_ENDPOINT),
+        max_concurrency = overpass_cfg.get('max_concurrency', 2),
+        rate_per_s = overpass_cfg.get('rate_per_s', 1.0),
+        max_retries = overpass_cfg.get('max_retries', 5),
+        backoff_s = overpass_cfg.get('backoff_s', 2.0),
+        timeout_s = overpass_cfg.get('timeout_s', 180),
+        cache_dir = Path(config['paths'].get('cache', "cache")) / "overpass"
+    )
@@ -0,0 +1,169 @@
+# src/pipeline.py
+
+# === 1. IMPORTS ===
+
+# general
+import json
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+# internal
+from src.config import config_fingerprint, file_fingerprint
+
+
+# === 2. STEP DEFINITION ===
+
+@dataclass
+class Step:
+    """
+    A node of the pipeline DAG.
+    Attributes:
+        name (str): Unique step name.
+        func (Callable): Top-level function called as func(config). Must be picklable (it runs in a worker process).
+        config_keys (List[str]): Dotted config keys the step depends on (e.g. "grid.resolution").
+        inputs (List[str]): Files read by the step (raw data or upstream artifacts).
+        outputs (List[str]): Files written by the step.
+        deps (List[str]): Names of the upstream steps that must finish first.
+    """
+    name: str
+    func: Callable
+    config_keys: List[str] = field(default_factory=list)
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+
+
+# === 3. FRESHNESS ===
+
+def step_fingerprint(step: Step, config: Dict[str, Any]) -> str:
+    """
+    Fingerprints a step from its config sections and the content of its inputs.
+    Args:
+        step (Step): The step to fingerprint.
+        config (Dict[str, Any]): The configuration dictionary.
+    Returns:
+        str: JSON string combining the config hash and the input hashes (missing inputs hash to None).
+    """
+    return json.dumps({
+        "config": config_fingerprint(config, step.config_keys),
+        "inputs": {path: file_fingerprint(path) for path in sorted(step.inputs)}
+    }, sort_keys=True)
+
+def is_fresh(step: Step, fingerprint: str, state: Dict[str, str]) -> bool:
+    """
+    A step is fresh when all of its outputs exist and it last ran with the same fingerprint.
+    """
+    outputs_exist = all(Path(path).exists() for path in step.outputs)
+    return outputs_exist and state.get(step.name) == fingerprint
+
+
+# === 4. DAG RUNNER ===
+
+def _load_state(state_path: Path) -> Dict[str, str]:
+    if state_path.exists():
+        with open(state_path, "r") as f:
+            return json.load(f)
+    return {}
+
+def _save_state(state_path: Path, state: Dict[str, str]) -> None:
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+def run_dag(
+    steps: List[Step],
+    config: Dict[str, Any],
+    state_path: Union[str, Path],
+    targets: Optional[List[str]] = None,
+    force: bool = False,
+    max_workers: int = 4
+) -> Dict[str, str]:
+    """
+    Runs the pipeline DAG, skipping steps whose outputs are fresh and running independent steps concurrently.
+    Args:
+        steps (List[Step]): Steps of the pipeline.
+        config (Dict[str, Any]): Configuration dictionary passed to every step.
+        state_path (Union[str, Path]): JSON file storing the fingerprint of the last successful run of each step.
+        targets (Optional[List[str]]): Steps to run (their upstream steps are included). Defaults to all steps.
+        force (bool): Re-run the selected steps even if fresh.
+        max_workers (int): Maximum number of steps running at the same time.
+    Returns:
+        Dict[str, str]: Status of each selected step ("ran", "fresh", "failed" or "blocked").
+    Logic:
+        1. Select the target steps and all of their upstream steps.
+        2. When all dependencies of a step are done, fingerprint its config sections and inputs (upstream outputs included).
+        3. Skip the step if its outputs exist and the fingerprint matches the last run, otherwise submit it to the process pool.
+        4. Persist the fingerprint after every successful step, so an interrupted run resumes where it stopped.
+    """
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        unknown = [dep for dep in step.deps if dep not in by_name]
+        if unknown:
+            raise ValueError(f"!! Step {step.name} depends on unknown steps: {unknown}")
+
+    # select targets + upstream closure
+    selected: Set[str] = set()
+    stack = list(targets or by_name)
+    while stack:
+        name = stack.pop()
+        if name not in by_name:
+            raise ValueError(f"!! Unknown pipeline step: {name}")
+        if name not in selected:
+            selected.add(name)
+            stack.extend(by_name[name].deps)
+
+    state_path = Path(state_path)
+    state = _load_state(state_path)
+    status: Dict[str, str] = {}
+    running = {}
+
+    print(f"-> Running pipeline steps: {sorted(selected)} (max {max_workers} in parallel)...")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while len(status) < len(selected):
+            # schedule every step whose dependencies are resolved
+            resolved_before = len(status)
+            for name in sorted(selected - set(status) - set(running.values())):
+                step = by_name[name]
+                dep_status = [status.get(dep) for dep in step.deps]
+                if any(s in ("failed", "blocked") for s in dep_status):
+                    status[name] = "blocked"
+                    print(f"!! Step {name} blocked by a failed upstream step.")
+                    continue
+                if not all(s in ("ran", "fresh") for s in dep_status):
+                    continue
+
+                fingerprint = step_fingerprint(step, config)
+                if not force and is_fresh(step, fingerprint, state):
+                    status[name] = "fresh"
+                    print(f"-> Step {name} is fresh. Skipping.")
+                    continue
+
+                print(f"-> Submitting step {name}...")
+                running[pool.submit(step.func, config)] = name
+
+            if not running:
+                if len(status) == resolved_before and len(status) < len(selected):
+                    raise ValueError(f"!! Dependency cycle among steps: {sorted(selected - set(status))}")
+                continue
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    status[name] = "failed"
+                    print(f"!! Step {name} failed: {e}")
+                    continue
+
+                # fingerprint again after the run so the state matches what the step actually consumed
+                status[name] = "ran"
+                state[name] = step_fingerprint(by_name[name], config)
+                _save_state(state_path, state)
+                print(f"-> Step {name} completed.")
+
+    print(f"-> Pipeline finished: {status}")
+    return status
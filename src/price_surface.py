@@ -0,0 +1,150 @@
+# src/price_surface.py
+
+# === 1. IMPORTS ===
+
+# general
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# third party (scipy is imported inside the functions)
+import numpy as np
+import pandas as pd
+import h3
+
+# internal
+from src.config import load_config
+from src.accessibility import grid_centroids, to_metric
+from src.instrument import instrumented, span, start_run, print_summary, end_run
+
+
+# === 2. INVERSE DISTANCE WEIGHTING ===
+
+def idw_surface(
+    targets: np.ndarray,
+    sources: np.ndarray,
+    values: np.ndarray,
+    k: int = 16,
+    max_dist_m: float = 1000,
+    power: float = 2.0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Inverse distance weighted average of the k nearest sources within a radius, for every target at once.
+    Args:
+        targets (np.ndarray): (n, 2) metric coordinates to estimate (e.g. hexagon centres).
+        sources (np.ndarray): (m, 2) metric coordinates of the observations (e.g. listings).
+        values (np.ndarray): (m,) observed values.
+        k (int): Maximum neighbours per target (bounds the cost of every query).
+        max_dist_m (float): Neighbours farther than this are ignored.
+        power (float): Distance exponent of the weights (weights = 1 / distance ** power).
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Estimates (NaN without neighbours), neighbours used (support) and nearest distance.
+    Logic:
+        1. One bounded KD-tree query for all the targets: k neighbours at most, within max_dist_m (missing ones come back as inf).
+        2. Weighted average over the (n, k) neighbour matrix, with distances floored at 1 m so co-located sources don't dominate to infinity.
+    """
+    from scipy.spatial import cKDTree
+
+    n = len(targets)
+    if len(sources) == 0:
+        return np.full(n, np.nan), np.zeros(n, dtype=np.int32), np.full(n, np.nan)
+
+    k = min(k, len(sources))
+    distances, idx = cKDTree(sources).query(targets, k=k, distance_upper_bound=max_dist_m)
+    distances, idx = distances.reshape(n, k), idx.reshape(n, k)
+
+    found = np.isfinite(distances)
+    weights = np.where(found, 1.0 / np.maximum(distances, 1.0) ** power, 0.0)
+    neighbour_values = np.where(found, values[np.minimum(idx, len(sources) - 1)], 0.0)
+
+    support = found.sum(axis=1).astype(np.int32)
+    weight_sum = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        estimate = (weights * neighbour_values).sum(axis=1) / weight_sum
+    estimate[support == 0] = np.nan
+    nearest = np.where(found[:, 0], distances[:, 0], np.nan)
+
+    return estimate, support, nearest
+
+
+# === 3. PRICE SURFACE PIPELINE ===
+
+@instrumented()
+def build_price_surface(config: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    """
+    Fills avg_price_pp for every L0 hexagon from the filtered Inside Airbnb listings.
+    Args:
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to config/settings.yaml.
+    Returns:
+        pd.DataFrame: One row per L0 hexagon indexed by h3_index, with avg_price_pp, price_source ("observed", "interpolated" or None),
+        price_support (listings behind the value) and nearest_listing_m.
+    Logic:
+        1. Load the L0 cell centres, the filtered listings (see process_str_data) and the observed per-hexagon averages.
+        2. Estimate every hexagon with an inverse distance weighted average of the nearest listings (see idw_surface).
+        3. Hexagons with their own listings keep the observed average, cells with less than min_support neighbours stay empty.
+        4. Save the surface as Parquet.
+    """
+    print("-> Starting Airbnb price surface...")
+
+    if config is None:
+        config = load_config()
+    processed_dir = Path(config['paths']['processed'])
+    metric_crs = config['crs']['metric']
+    surface_cfg = config['data_sources']['inside_airbnb'].get('surface', {})
+    min_support = surface_cfg.get('min_support', 3)
+
+    listings_path = processed_dir / "insideairbnb_listings.parquet"
+    stats_path = processed_dir / "insideairbnb_h3.parquet"
+    for path in (listings_path, stats_path):
+        if not path.exists():
+            raise FileNotFoundError(f"!! Inside Airbnb output not found at: {path}. Run process_str_data first.")
+
+    with span("price_surface.load") as record:
+        cells, centroids = grid_centroids(processed_dir, metric_crs)
+        listings = pd.read_parquet(listings_path, columns=['latitude', 'longitude', 'price_pp'])
+        listings_xy = to_metric(listings['longitude'].to_numpy(), listings['latitude'].to_numpy(), metric_crs)
+        observed = pd.read_parquet(stats_path, columns=['h3_index', 'listings_count', 'avg_price_pp']).set_index('h3_index')
+        record['rows_out'] = len(cells)
+    print(f"-> {len(cells)} hexagons, {len(listings)} listings in {len(observed)} hexagons.")
+
+    with span("price_surface.idw", rows_in=len(cells)) as record:
+        estimate, support, nearest = idw_surface(
+            centroids,
+            listings_xy,
+            listings['price_pp'].to_numpy(dtype=float),
+            k = surface_cfg.get('k', 16),
+            max_dist_m = surface_cfg.get('max_dist_m', 1000),
+            power = surface_cfg.get('power', 2.0)
+        )
+        record['rows_out'] = int((support >= min_support).sum())
+
+    index = pd.Index([h3.int_to_str(int(cell)) for cell in cells], name="h3_index")
+    surface_df = pd.DataFrame({
+        'avg_price_pp': np.where(support >= min_support, estimate, np.nan),
+        'price_source': np.where(support >= min_support, "interpolated", None),
+        'price_support': support,
+        'nearest_listing_m': nearest
+    }, index=index)
+
+    # hexagons with listings keep their own average
+    observed = observed[observed.index.isin(surface_df.index)]
+    surface_df.loc[observed.index, 'avg_price_pp'] = observed['avg_price_pp']
+    surface_df.loc[observed.index, 'price_source'] = "observed"
+    surface_df.loc[observed.index, 'price_support'] = observed['listings_count'].astype(np.int32)
+
+    counts = surface_df['price_source'].value_counts(dropna=False)
+    print(f"-> Price surface: {counts.get('observed', 0)} observed, {counts.get('interpolated', 0)} interpolated, "
+          f"{int(surface_df['price_source'].isna().sum())} without enough listings (min support {min_support}).")
+
+    out_path = processed_dir / "insideairbnb_price_surface.parquet"
+    surface_df.to_parquet(out_path)
+    print(f"-> Saved price surface at: {out_path}")
+    return surface_df
+
+
+if __name__ == '__main__':
+    config = load_config()
+    owns_run = start_run(config['paths']['logs'], run_name="price_surface")
+    build_price_surface(config)
+    if owns_run:
+        print_summary()
+        end_run()
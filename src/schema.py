@@ -0,0 +1,103 @@
+# src/schema.py
+
+# === 1. IMPORTS ===
+
+# general
+from typing import Dict, Optional, TypeVar
+
+# third party
+import numpy as np
+import pandas as pd
+
+# internal
+from src.hexes import cells_to_int
+
+Frame = TypeVar("Frame", bound=pd.DataFrame)
+
+
+# === 2. COLUMN SCHEMA ===
+
+# compact dtype of every known layer column: "string" = Arrow-backed strings, "category" = dictionary-encoded strings,
+# numeric types are downcast (integers only when the column has no missing values, float32 otherwise).
+# coordinates (lat/lon, latitude/longitude, geometries) stay float64: float32 moves points by up to a metre and
+# can flip their H3 cell near the edges.
+COLUMN_DTYPES: Dict[str, str] = {
+    # OSM points (layers 1 and 2)
+    'name': "string",
+    'sub_category': "category",
+    'category': "category",
+    'type': "category",
+    'element': "category",
+    'layer': "category",
+    'entity_id': "string",
+    'node_count': "uint32",
+    # inside airbnb listings and per-hexagon statistics
+    'room_type': "category",
+    'price': "float32",
+    'price_pp': "float32",
+    'accommodates': "uint16",
+    'minimum_nights': "uint16",
+    'number_of_reviews': "uint32",
+    'listings_count': "uint32",
+    'avg_price_pp': "float32",
+    'avg_capacity': "float32",
+    'avg_price_original': "float32",
+}
+
+def string_dtype() -> pd.StringDtype:
+    """
+    Arrow-backed string dtype with NaN as missing value (same semantics as object strings), when pandas supports it.
+    """
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError: # pandas < 2.3
+        return pd.StringDtype("pyarrow")
+
+
+# === 3. COMPACTION ===
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """
+    Deep memory usage of a frame in MB (geometries are counted as their array of pointers).
+    """
+    return float(df.memory_usage(deep=True, index=True).sum()) / 1e6
+
+def _cast(values: pd.Series, dtype: str) -> pd.Series:
+    if dtype == "string":
+        return values if isinstance(values.dtype, pd.StringDtype) else values.astype(string_dtype())
+    if dtype == "category":
+        return values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype("category")
+    if dtype.startswith(("uint", "int")) and (values.isna().any() or not pd.api.types.is_numeric_dtype(values)):
+        return values.astype("float32") if pd.api.types.is_numeric_dtype(values) else values
+    return values.astype(dtype)
+
+def compact_frame(df: Frame, h3: Optional[str] = "string", report: Optional[str] = None) -> Frame:
+    """
+    Casts the known columns of a (Geo)DataFrame to the compact schema (see COLUMN_DTYPES), other columns are left as they are.
+    Args:
+        df (pd.DataFrame): Frame to compact (not modified).
+        h3 (Optional[str]): h3_index as "string" (Arrow-backed, for per-hexagon tables joined on the hex ids),
+        "uint64" (row-level frames, see src/hexes.py) or None to leave it untouched.
+        report (Optional[str]): Label of the memory report to print (skipped when None, deep memory usage is not free).
+    Returns:
+        pd.DataFrame: The compacted frame (same type, index and column order).
+    """
+    before = memory_mb(df) if report else None
+
+    casts = {col: _cast(df[col], dtype) for col, dtype in COLUMN_DTYPES.items() if col in df.columns}
+    if h3 is not None and 'h3_index' in df.columns:
+        if h3 == "uint64":
+            casts['h3_index'] = pd.Series(cells_to_int(df['h3_index']), index=df.index, name='h3_index')
+        elif h3 == "string":
+            casts['h3_index'] = _cast(df['h3_index'], "string")
+        else:
+            raise ValueError(f"!! Unknown h3_index dtype: {h3}. Choose from ['string', 'uint64', None].")
+
+    if casts:
+        df = df.assign(**casts)
+
+    if report:
+        after = memory_mb(df)
+        saved = 100 * (1 - after / before) if before else 0.0
+        print(f"-> Memory of {report}: {before:.2f} MB -> {after:.2f} MB ({saved:.0f}% smaller).")
+    return df
@@ -0,0 +1,167 @@
+# src/tiles.py
+
+# === 1. IMPORTS ===
+
+# general
+import json
+import math
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+# third party
+import numpy as np
+import pandas as pd
+import h3
+
+# internal
+from src.instrument import instrumented
+
+
+# === 2. TILE MATHS ===
+
+def latlng_to_tile(
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    zoom: int
+) -> np.ndarray:
+    """
+    Converts (Lat, Lon) coordinates to slippy map (XYZ) tile coordinates, the same scheme used by Leaflet.
+    Args:
+        lats (np.ndarray): Latitudes in degrees.
+        lngs (np.ndarray): Longitudes in degrees.
+        zoom (int): Map zoom level.
+    Returns:
+        np.ndarray: Array of shape (n, 2) with the tile (x, y) of each coordinate.
+    """
+    n_tiles = 2 ** zoom
+    lat_rad = np.radians(np.clip(lats, -85.0511, 85.0511))
+
+    x = np.floor((np.asarray(lngs) + 180.0) / 360.0 * n_tiles)
+    y = np.floor((1.0 - np.arcsinh(np.tan(lat_rad)) / math.pi) / 2.0 * n_tiles)
+
+    return np.clip(np.column_stack([x, y]), 0, n_tiles - 1).astype(np.int64)
+
+
+# === 3. H3 AGGREGATION ===
+
+def aggregate_to_parent(
+    df: pd.DataFrame,
+    resolution: int,
+    value_cols: Optional[List[str]] = None,
+    label_col: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Aggregates per-hexagon rows to their H3 parents at a coarser resolution.
+    Args:
+        df (pd.DataFrame): DataFrame with an 'h3_index' column (and optionally a 'cell_count' column from a previous aggregation).
+        resolution (int): Target (coarser or equal) H3 resolution.
+        value_cols (Optional[List[str]]): Numeric columns to aggregate with a cell-weighted mean.
+        label_col (Optional[str]): Categorical column (e.g. cluster labels) aggregated with the most frequent child label.
+    Returns:
+        pd.DataFrame: One row per parent cell with 'h3_index', 'cell_count' and the aggregated columns.
+    """
+    value_cols = value_cols or []
+
+    out = df[['h3_index'] + value_cols + ([label_col] if label_col else [])].copy()
+    out['cell_count'] = df['cell_count'] if 'cell_count' in df.columns else 1
+    out['h3_index'] = [h3.cell_to_parent(cell, resolution) for cell in out['h3_index']]
+
+    # weighted means (weights = number of children behind each row)
+    for col in value_cols:
+        out[col] = out[col] * out['cell_count']
+    grouped = out.groupby('h3_index')
+    agg = grouped[value_cols + ['cell_count']].sum()
+    for col in value_cols:
+        agg[col] = agg[col] / agg['cell_count']
+
+    # most frequent label among the children
+    if label_col:
+        agg[label_col] = grouped[label_col].agg(lambda s: s.mode().iloc[0])
+
+    return agg.reset_index()
+
+
+# === 4. TILE EXPORT ===
+
+def _cell_feature(cell: str, properties: Dict) -> Dict:
+    """
+    Builds a GeoJSON feature for a single H3 cell. Coordinates are rounded to ~10cm to keep tiles small.
+    """
+    ring = [[round(lng, 6), round(lat, 6)] for lat, lng in h3.cell_to_boundary(cell)]
+    ring.append(ring[0])
+    return {
+        "type": "Feature",
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": properties
+    }
+
+@instrumented()
+def export_h3_tiles(
+    df: pd.DataFrame,
+    out_dir: Union[str, Path],
+    zoom_resolutions: Dict[int, int],
+    value_cols: Optional[List[str]] = None,
+    label_col: Optional[str] = None
+) -> Dict:
+    """
+    Exports per-hexagon data as static, pre-generated GeoJSON tiles (out_dir/{z}/{x}/{y}.geojson) at several zoom levels.
+    Args:
+        df (pd.DataFrame): DataFrame with an 'h3_index' column (e.g. the L0 grid or a table of cluster labels).
+        out_dir (Union[str, Path]): Directory where the tile pyramid is written. Existing content is replaced.
+        zoom_resolutions (Dict[int, int]): Mapping map zoom -> H3 resolution served at that zoom.
+        value_cols (Optional[List[str]]): Numeric columns to carry into the tiles (averaged when aggregated).
+        label_col (Optional[str]): Label column to carry into the tiles (mode when aggregated).
+    Returns:
+        Dict: Tile metadata, also saved as out_dir/tiles.json (zooms, resolutions, fields and the list of existing tiles).
+    Logic:
+        1. For every zoom level, aggregate the hexagons to their parent at the configured resolution (coarser when zoomed out).
+        2. Assign each (parent) hexagon to the tile containing its centroid.
+        3. Write one GeoJSON FeatureCollection per non-empty tile plus a tiles.json index, so the map only requests tiles that exist.
+    """
+    out_dir = Path(out_dir)
+    value_cols = value_cols or []
+    base_res = h3.get_resolution(df['h3_index'].iloc[0])
+
+    print(f"-> Exporting {len(df)} hexagons as tiles at zooms {sorted(zoom_resolutions)} to {out_dir}...")
+
+    # start from a clean pyramid so stale tiles are never served
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    meta = {
+        "zooms": {},
+        "fields": ['h3_index', 'cell_count'] + value_cols + ([label_col] if label_col else [])
+    }
+
+    for zoom, res in sorted(zoom_resolutions.items()):
+        zoom, res = int(zoom), min(int(res), base_res)
+        level_df = aggregate_to_parent(df, res, value_cols, label_col)
+
+        # tile of each hexagon centroid
+        centroids = np.array([h3.cell_to_latlng(cell) for cell in level_df['h3_index']])
+        tiles = latlng_to_tile(centroids[:, 0], centroids[:, 1], zoom)
+        level_df['tile_x'] = tiles[:, 0]
+        level_df['tile_y'] = tiles[:, 1]
+
+        tile_keys = []
+        for (x, y), tile_df in level_df.groupby(['tile_x', 'tile_y']):
+            records = tile_df[meta['fields']].to_dict('records')
+            collection = {
+                "type": "FeatureCollection",
+                "features": [_cell_feature(rec['h3_index'], rec) for rec in records]
+            }
+            tile_path = out_dir / str(zoom) / str(x) / f"{y}.geojson"
+            tile_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tile_path, "w") as f:
+                json.dump(collection, f, separators=(',', ':'), default=float)
+            tile_keys.append(f"{x}/{y}")
+
+        meta['zooms'][str(zoom)] = {"resolution": res, "tiles": tile_keys}
+        print(f"-> Zoom {zoom}: {len(level_df)} hexagons at resolution {res} in {len(tile_keys)} tiles.")
+
+    with open(out_dir / "tiles.json", "w") as f:
+        json.dump(meta, f)
+
+    return meta
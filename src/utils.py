@@ -2,50 +2,28 @@
 
 # === 1.IMPORTS ===
 
+# heavy dependencies (osmnx, geopandas, shapely, sklearn) are imported inside the functions that need them,
+# so that importing this module (or the config/H3 helpers it re-exports) stays cheap
+from __future__ import annotations
+
 # general
-import yaml
 from pathlib import Path
-from typing import Dict, Any, Union, List
-import os
-import re
-import numpy as np
-
-# geospatial
-import geopandas as gpd
-import osmnx as ox
-from shapely.geometry import Point, Polygon, MultiPolygon
-import h3
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any, Optional, Union, List
 
 # semantic
 from difflib import SequenceMatcher
 
-# ml
-from sklearn.cluster import DBSCAN
-
+# internal
+from src.instrument import instrumented
+from src.config import load_config, get_config_value, config_fingerprint, file_fingerprint # re-exported
+from src.hexes import assign_h3 # re-exported
 
-# === 2. CONFIGURATION UTILS ===
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from shapely.geometry import Polygon, MultiPolygon
 
-def load_config(config_path: Union[str, Path] = "config/settings.yaml") -> Dict[str, Any]:
-    """
-    Loads the project configuration from a YAML file.
-    Args:
-        config_path (Union[str, Path]): Path to the YAML file containing the settings.
-    Returns:
-        Dict[str, Any]: The configuration dictionary.
-    """
-    # convert string to Path object
-    path_obj = Path(config_path)
 
-    # check if file exists
-    if not path_obj.exists():
-        raise FileNotFoundError(f"!! Config file not found at: {config_path}")
-    
-    # load the YAML file
-    with open(path_obj, "r") as f:
-        config = yaml.safe_load(f)
-    
-    return config
+# === 2. CONFIGURATION UTILS ===
 
 def names_are_similar(name_a: str, name_b: str, threshold: float) -> bool:
     """
@@ -61,6 +39,18 @@ def names_are_similar(name_a: str, name_b: str, threshold: float) -> bool:
 
 # === 3. GEOSPATIAL UTILS ===
 
+def configure_osm_cache(cache_dir: Union[str, Path] = "cache") -> None:
+    """
+    Points the OSMNX request cache (Nominatim and Overpass responses) to a shared folder, so every layer, run and city reuses it.
+    Args:
+        cache_dir (Union[str, Path]): Folder of the cached responses.
+    """
+    import osmnx as ox
+
+    ox.settings.use_cache = True
+    ox.settings.cache_folder = str(cache_dir)
+
+@instrumented()
 def fetch_boundary(city_name: str) -> gpd.GeoDataFrame:
     """
     Downloads the administrative boundary of a specified city (YAML file) from OpenStreetMap.
@@ -69,6 +59,8 @@ def fetch_boundary(city_name: str) -> gpd.GeoDataFrame:
     Returns:
         gpd.GeoDataFrame: A df containing the city's boundary geometry in EPSG: 4326 coordinate system (Lat/Lon).
     """
+    import osmnx as ox
+
     print(f"-> Fetching boundary for {city_name} from OSMNX...")
 
     # download the city's boundary in a robust way
@@ -77,23 +69,27 @@ def fetch_boundary(city_name: str) -> gpd.GeoDataFrame:
     except Exception as e:
         raise ValueError(F"!! Couldn't fetch boundary for {city_name}. Error: {e}")
     
+@instrumented()
 def buffer_boundary(
     gdf: gpd.GeoDataFrame,
     meters: int,
     metric_crs: str,
-    target_crs: str = "EPSG:4326"
+    target_crs: str = "EPSG:4326",
+    simplify_tolerance_m: Optional[float] = None
     ) -> gpd.GeoDataFrame:
     """
     Buffers the geospatial boundary of a city by a specified distance in meters.
     Logic:
         1. Reproject the gdf to the local metric system.
         2. Apply the buffer in meters.
-        3. Reproject the buffered boundary back to the target CRS as a GeoDataFrame.
+        3. Optionally simplify the outline (topology preserving), so polyfill and OSM queries get far fewer vertices.
+        4. Reproject the buffered boundary back to the target CRS as a GeoDataFrame.
     Args:
         gdf (gdp.GeoDataFrame): GeoDataFrame containing the city's boundary geometry.
         meters (int): Distance in meters to buffer the boundary.
         metrics_crs (str): Local metric system (EPSG: "32632" for Italy)
         target_crs (str): Target coordinate reference system (default for H3 is "EPSG:4326").
+        simplify_tolerance_m (Optional[float]): Max distance in meters between the buffered and the simplified outline. None keeps every vertex.
     Returns:
         gpd.GeoDataFrame: A df containing the buffered city's boundary geometry in the target CRS.
     """
@@ -105,11 +101,18 @@ def buffer_boundary(
     # apply buffer
     gdf_metric["geometry"] = gdf_metric.geometry.buffer(meters)
 
+    # simplify the buffered outline
+    if simplify_tolerance_m:
+        n_before = gdf_metric.geometry.count_coordinates().sum()
+        gdf_metric["geometry"] = gdf_metric.geometry.simplify(simplify_tolerance_m, preserve_topology=True)
+        print(f"-> Simplified boundary from {n_before} to {gdf_metric.geometry.count_coordinates().sum()} vertices ({simplify_tolerance_m} m tolerance).")
+
     # reproject back to target CRS
     gdf_buffered = gdf_metric.to_crs(target_crs)
 
     return gdf_buffered
 
+@instrumented()
 def fetch_osmnx_points(
     boundary: Union[gpd.GeoDataFrame, Polygon, MultiPolygon],
     tags: Dict[str, Union[str, List[str]]]
@@ -122,6 +125,10 @@ def fetch_osmnx_points(
     Returns:
         gpd.GeoDataFrame: A df containing the fetched points within the boundary (name, geometry, sub_category).
     """
+    import geopandas as gpd
+    import osmnx as ox
+    from src.schema import compact_frame
+
     print(f"-> Fetching OSMNX points with tags {tags}...")
 
     # define the search geometry
@@ -161,19 +168,78 @@ def fetch_osmnx_points(
         else:
             points_gdf = points_gdf.dropna(subset=['name'])  # drop points without a name
 
-        return points_gdf
+        # compact dtypes (Arrow strings, categorical sub-categories)
+        return compact_frame(points_gdf, report="OSMNX points")
     
     except Exception as e:
         print(f"!! No data found for {tags}: {e}")
         return gpd.GeoDataFrame(columns=['name', 'geometry', 'sub_category'], geometry='geometry', crs='EPSG:4326')
 
+def fetch_points(
+    boundary: Union[gpd.GeoDataFrame, Polygon, MultiPolygon],
+    tags: Dict[str, Union[str, List[str]]],
+    config: Optional[Dict[str, Any]] = None
+) -> gpd.GeoDataFrame:
+    """
+    Fetches points with specified OSM tags through the backend selected in settings.yaml (fetch.backend).
+    Args:
+        boundary (gpd.GeoDataFrame): GeoDataFrame containing the boundary geometry.
+        tags (Dict[str, Union[str, List[str]]]): Dictionary of OSM tags to filter points.
+        config (Optional[Dict[str, Any]]): Configuration dictionary. Defaults to the OSMNX backend.
+    Returns:
+        gpd.GeoDataFrame: A df containing the fetched points within the boundary (name, geometry, sub_category).
+    """
+    fetch_cfg = (config or {}).get('fetch', {})
+    backend = fetch_cfg.get('backend', "osmnx")
+
+    # single request for the whole boundary
+    if backend == "osmnx":
+        return fetch_osmnx_points(boundary, tags)
+
+    # incremental refresh: only the elements edited since the last sync are downloaded (see src/osm_refresh.py)
+    if backend == "overpass" and fetch_cfg.get('refresh', {}).get('incremental', False):
+        from src.osm_refresh import refresh_points
+
+        return refresh_points(boundary, tags, config)
+
+    # tiled, concurrent requests (large boundaries)
+    if backend == "overpass":
+        from src.overpass import fetch_overpass_points, client_from_config
+
+        return fetch_overpass_points(
+            boundary,
+            tags,
+            tile_resolution = fetch_cfg.get('overpass', {}).get('tile_resolution', 7),
+            client = client_from_config(config)
+        )
+
+    raise ValueError(f"!! Unknown fetch backend: {backend}. Choose from ['osmnx', 'overpass'].")
+
+def member_keys(points_gdf: gpd.GeoDataFrame) -> List[str]:
+    """
+    OSM keys of the points ("node/123"), from their (element, id) index (fetch_points), or the index itself otherwise.
+    """
+    if points_gdf.index.nlevels == 2:
+        return [f"{element}/{osm_id}" for element, osm_id in points_gdf.index]
+    return [str(key) for key in points_gdf.index]
+
+def entity_id_of(members: List[str]) -> str:
+    """
+    Stable id of a deduplicated entity: hash of its sorted member OSM keys (same members, same id, in every run).
+    """
+    import hashlib
+
+    return hashlib.sha1("|".join(sorted(members)).encode()).hexdigest()[:16]
+
+@instrumented()
 def deduplicate_points(
     points_gdf: gpd.GeoDataFrame,
     distance_threshold_m: float,
     metric_crs: str,
     similarity_threshold: float = 0.6,
-    semantic_clustering: bool = True
-) -> gpd.GeoDataFrame:
+    semantic_clustering: bool = True,
+    return_members: bool = False
+) -> Union[gpd.GeoDataFrame, tuple]:
     """
     Deduplicates points in a GeoDataFrame using ENTITY RESOLUTION. Spatial clustering is done with DBSCAN. Semantic clustering is done after the spatial one if flag is TRUE.
     Args:
@@ -182,20 +248,32 @@ def deduplicate_points(
         metric_crs (str): Local metric system (EPSG: "32632" for Italy).    
         semantic_clustering (bool): Whether to perform semantic clustering after spatial clustering.
         similarity_threshold (float): Similarity threshold for semantic clustering (between 0 and 1).
+        return_members (bool): Also return the member -> entity mapping.
     Returns:
-        gpd.GeoDataFrame: A df containing the deduplicated points.
+        gpd.GeoDataFrame: A df containing the deduplicated points, each with a stable entity_id (see entity_id_of).
+        With return_members, a tuple (points, mapping DataFrame with 'member' and 'entity_id').
 
     """
+    import numpy as np
+    import pandas as pd
+    import geopandas as gpd
+    from sklearn.cluster import DBSCAN
+    from src.schema import compact_frame
+
     print(f"-> Deduplicating {len(points_gdf)} points using spatial clustering...")
     print(f"-> Semantic clustering is set to: {semantic_clustering}")
 
     # corner case
-    if len(points_gdf) <= 1:
+    if len(points_gdf) == 0:
         print("-> Not enough points to deduplicate. Returning original GeoDataFrame.")
-        return points_gdf
+        members = member_keys(points_gdf)
+        points_gdf = compact_frame(points_gdf.assign(node_count=1, entity_id=[entity_id_of([m]) for m in members]))
+        mapping = pd.DataFrame({'member': members, 'entity_id': points_gdf['entity_id'].tolist()})
+        return (points_gdf, mapping) if return_members else points_gdf
     
     # project to metric system
     points_metric = points_gdf.to_crs(metric_crs).copy()
+    points_metric['member'] = member_keys(points_gdf)
 
     # spatial clustering with DBSCAN
     coords = np.array(list(zip(points_metric.geometry.x, points_metric.geometry.y)))
@@ -224,7 +302,9 @@ def deduplicate_points(
                 'name': name,
                 'geometry': centroid,
                 'sub_category': sub_category,
-                'node_count': len(group)
+                'node_count': len(group),
+                'entity_id': entity_id_of(group['member'].tolist()),
+                'members': group['member'].tolist()
             })
             continue
 
@@ -266,36 +346,20 @@ def deduplicate_points(
             best_name = min(names, key=len)
             best_sub_category = max(set(sub_categories), key=sub_categories.count)
 
+            members = [d['member'] for d in current_subgroup]
             cleaned_rows.append({
                 'name': best_name,
                 'geometry': centroid,
                 'sub_category': best_sub_category,
-                'node_count': len(current_subgroup)
+                'node_count': len(current_subgroup),
+                'entity_id': entity_id_of(members),
+                'members': members
             })
 
     print(f"-> Reduced to {len(cleaned_rows)} deduplicated points after spatial and semantic clustering.")
     
-    # reconstruct cleaned gdf
-    return gpd.GeoDataFrame(cleaned_rows, crs=metric_crs).to_crs("EPSG:4326")
-
-def assign_h3(
-        df: pd.DataFrame,
-        lat_col: str,
-        lon_col: str,
-        res: int
-) -> pd.DataFrame:
-    """
-    Assigns H3 hexagonal grid indices to each listing based on latitude and longitude. Handles different versions of the h3 library for safety.
-    Args:
-        df (pd.DataFrame): DataFrame containing listing data with latitude and longitude columns.
-        lat_col (str): Name of the latitude column.
-        lon_col (str): Name of the longitude column.
-        res (int): H3 resolution level.
-    Returns:
-        pd.DataFrame: DataFrame with an additional 'h3_index' column.
-    """
-    try:
-        df['h3_index'] = df.apply(lambda x: h3.latlng_to_cell(x[lat_col], x[lon_col], res), axis=1)
-    except AttributeError:
-        df['h3_index'] = df.apply(lambda row: h3.geo_to_h3(row[lat_col], row[lon_col], res), axis=1)
-    return df
+    # reconstruct cleaned gdf (the member lists only go to the mapping)
+    cleaned_gdf = gpd.GeoDataFrame(cleaned_rows, crs=metric_crs).to_crs("EPSG:4326")
+    mapping = cleaned_gdf[['entity_id', 'members']].explode('members').rename(columns={'members': 'member'})[['member', 'entity_id']].reset_index(drop=True)
+    cleaned_gdf = compact_frame(cleaned_gdf.drop(columns='members'), report="deduplicated points")
+    return (cleaned_gdf, mapping) if return_members else cleaned_gdf
@@ -5,19 +5,89 @@
 # general
 from pathlib import Path
 import os
-from typing import Union
+import json
+from typing import Optional, Union
 
 # third party
 import geopandas as gpd
 import folium
+from branca.element import MacroElement
+from jinja2 import Template
 
+# internal
+from src.instrument import instrumented
 
-# === 2. VISUALISATION UTIL ===
 
+# === 2. TILED H3 LAYER ===
+
+class H3TileLayer(MacroElement):
+    """
+    Leaflet layer that loads pre-generated H3 GeoJSON tiles (see src/tiles.py) on demand for the visible area and zoom.
+    Tiles are fetched over HTTP, so the map must be served (e.g. `python -m http.server`) rather than opened as a local file.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var zooms = {{ this.zooms|tojson }};
+            var fields = {{ this.fields|tojson }};
+            var levels = Object.keys(zooms).map(Number).sort(function(a, b) { return a - b; });
+            var layer = L.geoJSON(null, {
+                style: function() { return {{ this.style|tojson }}; },
+                onEachFeature: function(feature, lyr) {
+                    lyr.bindTooltip(fields.map(function(k) { return k + ": " + feature.properties[k]; }).join("<br>"));
+                }
+            }).addTo(map);
+            var current = null, loaded = {};
+
+            function tileZoom(z) {
+                var tz = levels[0];
+                levels.forEach(function(l) { if (l <= z) { tz = l; } });
+                return tz;
+            }
+            function lng2x(lng, z) { return Math.floor((lng + 180) / 360 * Math.pow(2, z)); }
+            function lat2y(lat, z) {
+                var r = lat * Math.PI / 180;
+                return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * Math.pow(2, z));
+            }
+            function refresh() {
+                var tz = tileZoom(map.getZoom());
+                if (tz !== current) { layer.clearLayers(); loaded = {}; current = tz; }
+                var available = zooms[String(tz)].tiles, b = map.getBounds();
+                for (var x = lng2x(b.getWest(), tz); x <= lng2x(b.getEast(), tz); x++) {
+                    for (var y = lat2y(b.getNorth(), tz); y <= lat2y(b.getSouth(), tz); y++) {
+                        var key = x + "/" + y;
+                        if (loaded[key] || available.indexOf(key) < 0) { continue; }
+                        loaded[key] = true;
+                        fetch({{ this.url|tojson }} + "/" + tz + "/" + key + ".geojson")
+                            .then(function(r) { return r.ok ? r.json() : null; })
+                            .then((function(z) { return function(gj) { if (gj && z === current) { layer.addData(gj); } }; })(tz));
+                    }
+                }
+            }
+            map.on("moveend", refresh);
+            refresh();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, url: str, meta: dict, style: dict):
+        super().__init__()
+        self._name = "H3TileLayer"
+        self.url = url
+        self.zooms = meta['zooms']
+        self.fields = meta['fields']
+        self.style = style
+
+
+# === 3. VISUALISATION UTIL ===
+
+@instrumented()
 def plot_boundary_and_grid(
     buffered_boundary: gpd.GeoDataFrame,
     grid: gpd.GeoDataFrame,
-    save_path: Union[str, Path] = "outputs/maps/layer0_map.html"
+    save_path: Union[str, Path] = "outputs/maps/layer0_map.html",
+    tiles_dir: Optional[Union[str, Path]] = None
     ) -> None:
     """
     Plots the buffered boundary and H3 grid on a Folium map and saves it as an HTML file.
@@ -25,6 +95,8 @@ def plot_boundary_and_grid(
         buffered_boundary (gpd.GeoDataFrame): GeoDataFrame containing the buffered boundary geometry.
         grid (gpd.GeoDataFrame): GeoDataFrame containing the H3 hexagon grid.
         save_path (Union[str, Path]): Path to save the HTML map file.
+        tiles_dir (Optional[Union[str, Path]]): Directory of pre-generated grid tiles (src/tiles.py). If given, the grid is loaded
+            on demand from the tiles instead of being embedded in the page as one inline GeoJSON.
     Returns:
         None
     """
@@ -35,16 +107,24 @@ def plot_boundary_and_grid(
     m = folium.Map(location=[centroid.y, centroid.x], zoom_start=11, tiles="CartoDB positron")
 
     # add the grid (light blue, transparent)
-    folium.GeoJson(
-        grid,
-        name = "H3 Grid",
-        style_function = lambda x: {
-            'color': 'blue',
-            'weight': 0.5,
-            'fillOpacity': 0.1
-        },
-        tooltip=folium.GeoJsonTooltip(fields=['h3_index'])
-    ).add_to(m)
+    grid_style = {
+        'color': 'blue',
+        'weight': 0.5,
+        'fillOpacity': 0.1
+    }
+    if tiles_dir is not None:
+        # tiles are referenced relative to the HTML file so the output folder can be served as is
+        with open(Path(tiles_dir) / "tiles.json", "r") as f:
+            tiles_meta = json.load(f)
+        tiles_url = Path(os.path.relpath(tiles_dir, Path(save_path).parent)).as_posix()
+        H3TileLayer(tiles_url, tiles_meta, grid_style).add_to(m)
+    else:
+        folium.GeoJson(
+            grid,
+            name = "H3 Grid",
+            style_function = lambda x: grid_style,
+            tooltip=folium.GeoJsonTooltip(fields=['h3_index'])
+        ).add_to(m)
 
     # add the buffered boundary (red, transparent)
     folium.GeoJson(
@@ -11,9 +11,13 @@ from typing import Union
 import geopandas as gpd
 import folium
 
+# internal
+from src.instrument import instrumented
+
 
 # === 2. VISUALISATION UTIL ===
 
+@instrumented()
 def plot_transport(
     buffered_boundary: gpd.GeoDataFrame,
     transport_gdf: gpd.GeoDataFrame,
@@ -93,6 +97,7 @@ def plot_transport(
     return None
 
 
+@instrumented()
 def plot_cleaned_comparison(
     original_gdf: gpd.GeoDataFrame,
     cleaned_gdf: gpd.GeoDataFrame,
@@ -4,11 +4,18 @@
 
 # general
 from pathlib import Path
-from typing import Union, Dict
+from typing import TYPE_CHECKING, Union, Dict
 
 # third party
 import geopandas as gpd
 import folium
+import h3
+
+# internal
+from src.instrument import instrumented
+
+if TYPE_CHECKING:
+    from src.feature_store import PointIndex
 
 
 # === 2. VISUALISATION UTIL ===
@@ -22,6 +29,7 @@ CATEGORY_COLORS = {
     'unknown': '#95a5a6'  # grey (fallback)
 }
 
+@instrumented()
 def plot_poi(
     buffered_boundary: gpd.GeoDataFrame,
     poi_gdf: gpd.GeoDataFrame,
@@ -99,3 +107,72 @@ def plot_poi(
     print(f"-> Map saved at: {save_path}")
 
     return None
+
+
+# === 3. HEXAGON DRILL-DOWN ===
+
+LAYER_COLORS = {
+    'l2_poi': '#e74c3c', # red
+    'l1_transport': '#3498db', # blue
+}
+
+@instrumented()
+def plot_hexagon_points(
+    point_index: "PointIndex",
+    cell: str,
+    k: int = 1,
+    save_path: Union[str, Path] = "outputs/maps/hexagon_drilldown.html"
+    ) -> None:
+    """
+    Plots the points behind a hexagon and its k-ring ("why is this hexagon in this cluster?") from the inverted point index.
+    Args:
+        point_index (PointIndex): Inverted H3 -> points index (see load_point_index).
+        cell (str): H3 cell to drill into.
+        k (int): Neighbour rings shown around it.
+        save_path (Union[str, Path]): Path to save the HTML map file.
+    Returns:
+        None
+    Logic:
+        1. Read the points of the k-ring as slices of the index (no filtering of the full layers).
+        2. Hexagon outlines: the selected cell in black, its neighbours in grey, with their point counts.
+        3. Points coloured by layer, with name and sub_category in the tooltip.
+    """
+    ring = sorted(h3.grid_disk(cell, k))
+    points = point_index.points_in(ring)
+    counts = points['h3_index'].value_counts()
+    print(f"-> Plotting {len(points)} points in {len(ring)} hexagons around {cell}...")
+
+    lat, lon = h3.cell_to_latlng(cell)
+    m = folium.Map(location=[lat, lon], zoom_start=16, tiles="CartoDB positron", control_scale=True)
+
+    # hexagon outlines
+    for ring_cell in ring:
+        folium.Polygon(
+            locations = [list(vertex) for vertex in h3.cell_to_boundary(ring_cell)],
+            color = 'black' if ring_cell == cell else 'grey',
+            weight = 2 if ring_cell == cell else 0.8,
+            fill = False,
+            tooltip = f"{ring_cell}: {int(counts.get(ring_cell, 0))} points"
+        ).add_to(m)
+
+    # points by layer
+    for layer, subset in points.groupby('layer', observed=True):
+        color = LAYER_COLORS.get(layer, CATEGORY_COLORS['unknown'])
+        fg = folium.FeatureGroup(name = f"<span style='color: {color}'>.</span> {layer}")
+        for row in subset.itertuples():
+            folium.CircleMarker(
+                location = [row.lat, row.lon],
+                radius = 4,
+                color = color,
+                fill = True,
+                fill_opacity = 0.8,
+                weight = 0.0,
+                tooltip = f"<b>{row.name}</b><br><i>{row.sub_category}</i>"
+            ).add_to(fg)
+        fg.add_to(m)
+
+    folium.LayerControl(collapsed = False).add_to(m)
+    m.save(save_path)
+    print(f"-> Map saved at: {save_path}")
+
+    return None